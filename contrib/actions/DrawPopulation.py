@@ -100,7 +100,7 @@ class DrawPopulation(Action):
         # Get a list of the colors to use for each node
         cols = []
         for n in self.graph.nodes():
-            cols.append(self.colors[self.graph.node[n]['cell'].type])
+            cols.append(self.colors[self.experiment.population.get_cell_type(n)])
 
         plt.figure()
         nx.draw(self.graph, with_labels=False,
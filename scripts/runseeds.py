@@ -14,11 +14,18 @@ __credits__ = "Brian Connelly"
 
 import seeds as S
 from seeds.SEEDSError import *
+from seeds.utils.rng import derive_seed
+from seeds.utils.sweep import ResultStore, canonical_config, expand_sweep, point_key
 
 import argparse
+import csv
+import datetime
+import multiprocessing
 import os
 import re
+import shutil
 import sys
+import time
 
 
 class ProgressBar:
@@ -51,55 +58,61 @@ class ProgressBar:
         else:
             return "epoch: %d" % (self.amount)
 
-def main():
-    parser = argparse.ArgumentParser(prog='runseeds.py',
-                                      description='Run an experiment using SEEDS')
-    parser.add_argument("-c", "--config", default="seeds.cfg",
-                        help="read config file (default: seeds.cfg)")
-    parser.add_argument("-C", "--genconfig", action="store_true",
-                        help="write config file used (experiment.cfg)")
-    parser.add_argument("-d", "--data_dir", default="data",
-                        help="write data to this directory (default: data)")
-    parser.add_argument("-e", "--experiment", default=None,
-                        help="label of the experiment to run")
-    parser.add_argument("-p", "--param", action="append",
-                        help="Set config values. Semicolon-separated list of section.param=val")
-    parser.add_argument("-q", "--quiet", action="store_true", help="suppress all output messages")
-    parser.add_argument("-s", "--seed", type=int, default=0,
-                        help="set random seed (default: use clock)")
-    parser.add_argument("--version", action="version",
-                        version="%s (SEEDS Version %s)" % (__version__, S.__version__))
-    cmd_args = parser.parse_args()
+def parse_params(cmd_args):
+    """Return a list of (section, parameter, value) tuples for the config
+    values set on the command line with --param
 
-    if cmd_args.seed > 0:
-        random_seed = cmd_args.seed
-    else:
-        random_seed=-1
+    Parameters:
 
-    # Create the Experiment...
-    try:
-        experiment = S.Experiment(configfile=cmd_args.config, seed=random_seed,
-                                  label=cmd_args.experiment)
-    except SEEDSError as err:
-        print("Error: %s" % err)
-        sys.exit(1)
+    *cmd_args*
+        The parsed command line arguments
 
-    if cmd_args.data_dir:
-        experiment.config.set(experiment.config_section, 'data_dir', cmd_args.data_dir)
+    """
 
+    params = []
 
-    # Add command-line config options
     if cmd_args.param != None:
         for param_str in cmd_args.param:
-            options = re.split("\s*;\s*", param_str)
+            options = re.split(r"\s*;\s*", param_str)
             for opt in options:
                 # This is perhaps not the best regexp for comma-separated lists as values... need spaces.
                 m = re.match(r"(?P<section>[A-Za-z0-9:_]+)\.(?P<parameter>[A-Za-z0-9:_]+)\s*=\s*(?P<value>-?[A-Za-z0-9_\.\,]+)", opt)
                 if m != None:
-                    experiment.config.set(m.group("section"), m.group("parameter"), m.group("value"))
+                    params.append((m.group("section"), m.group("parameter"), m.group("value")))
                 else:
                     print("Error: Could not parse parameter setting", opt)
 
+    return params
+
+def create_experiment(cmd_args, seed, data_dir, overrides=[]):
+    """Create an Experiment, applying the settings given on the command line
+    and the plugin directories in $SEEDSPLUGINPATH.  SEEDSError is raised if
+    the Experiment can not be created.
+
+    Parameters:
+
+    *cmd_args*
+        The parsed command line arguments
+    *seed*
+        The seed for the Experiment (-1 to use the configured seed or clock)
+    *data_dir*
+        The directory to which the Experiment writes its data
+    *overrides*
+        A list of (section, parameter, value) tuples to apply after those
+        given on the command line (e.g., the values at a point in a sweep)
+
+    """
+
+    experiment = S.Experiment(configfile=cmd_args.config, seed=seed,
+                              label=cmd_args.experiment)
+
+    if data_dir:
+        experiment.config.set(experiment.config_section, 'data_dir', data_dir)
+
+    # Add command-line config options
+    for (section, parameter, value) in parse_params(cmd_args) + list(overrides):
+        experiment.config.set(section, parameter, value)
+
     # Get the current configured list of plugin directories
     cfg_plugindirs = experiment.config.get(section="Experiment", name="plugin_dirs")
     if cfg_plugindirs:
@@ -119,6 +132,288 @@ def main():
         pdirs = ",".join(plugindirs)
         experiment.config.set(section="Experiment", name="plugin_dirs", value=pdirs)
 
+    return experiment
+
+def run_replicate(job):
+    """Run one replicate of an experiment and return a dict describing the
+    outcome (replicate, seed, data_dir, runtime, status, error, and summary).  Any
+    error is caught and reported in the result, so that one failing
+    replicate does not affect the others.  This is run in worker processes.
+
+    Status is 0 if the replicate finished, 1 if the experiment could not be
+    created, 2 if a SEEDS error occurred while running, and 3 for any other
+    error.
+
+    Parameters:
+
+    *job*
+        A tuple (cmd_args, replicate, seed, data_dir, overrides), where
+        overrides is a list of (section, parameter, value) tuples to apply
+        to the configuration
+
+    """
+
+    (cmd_args, replicate, seed, data_dir, overrides) = job
+    result = {'replicate': replicate, 'seed': seed, 'data_dir': data_dir,
+              'status': 0, 'error': '', 'summary': None}
+    start = time.time()
+
+    try:
+        experiment = create_experiment(cmd_args, seed, data_dir, overrides)
+    except SEEDSError as err:
+        result['status'] = 1
+        result['error'] = str(err)
+    except Exception as err:
+        result['status'] = 3
+        result['error'] = "%s: %s" % (type(err).__name__, err)
+    else:
+        try:
+            for epoch in experiment:
+                pass
+            experiment.teardown()
+            result['summary'] = {'epochs': experiment.epoch}
+
+            if cmd_args.genconfig:
+                experiment.config.write(filename='experiment.cfg')
+        except SEEDSError as err:
+            result['status'] = 2
+            result['error'] = str(err)
+        except Exception as err:
+            result['status'] = 3
+            result['error'] = "%s: %s" % (type(err).__name__, err)
+
+    result['runtime'] = time.time() - start
+    return result
+
+def run_replicates(cmd_args):
+    """Run a number of replicates of an experiment in a pool of worker
+    processes.  Replicate i writes its data to <data_dir>/replicate-<i> and
+    is seeded with a seed derived from the master seed and i, so results do
+    not depend on the number of workers.  A manifest (manifest.csv) recording
+    the seed, runtime, and exit status of each replicate is written to the
+    data directory.  Return the number of failed replicates.
+
+    Parameters:
+
+    *cmd_args*
+        The parsed command line arguments
+
+    """
+
+    if cmd_args.seed > 0:
+        master_seed = cmd_args.seed
+    else:
+        master_seed = int(time.time()*10)
+
+    # Move any existing data directory aside, as Experiment does
+    data_dir = cmd_args.data_dir
+    if os.path.exists(data_dir):
+        newname = data_dir + '-' + datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        shutil.move(data_dir, newname)
+    os.mkdir(data_dir)
+
+    width = len(str(cmd_args.replicates - 1))
+    jobs = []
+    for r in range(cmd_args.replicates):
+        seed = derive_seed(master_seed, ("replicate", r)) % 2**32
+        rep_dir = os.path.join(data_dir, "replicate-%0*d" % (width, r))
+        jobs.append((cmd_args, r, seed, rep_dir, []))
+
+    if not cmd_args.quiet:
+        print("Running %d replicates (master seed: %d)" % (cmd_args.replicates, master_seed))
+
+    failures = 0
+    fields = ['replicate', 'seed', 'master_seed', 'data_dir', 'runtime', 'status', 'error']
+
+    with open(os.path.join(data_dir, 'manifest.csv'), 'w') as manifest:
+        writer = csv.writer(manifest)
+        writer.writerow(fields)
+
+        for result in run_jobs(jobs, cmd_args.jobs):
+            result['master_seed'] = master_seed
+            result['runtime'] = "%.3f" % (result['runtime'])
+            writer.writerow([result[f] for f in fields])
+            manifest.flush()
+
+            if result['status'] != 0:
+                failures += 1
+
+            if not cmd_args.quiet:
+                if result['status'] == 0:
+                    print("Replicate %d finished (%s s)" % (result['replicate'], result['runtime']))
+                else:
+                    print("Replicate %d failed: %s" % (result['replicate'], result['error']))
+
+    return failures
+
+def run_sweep(cmd_args):
+    """Run an experiment at every point of a parameter sweep in a pool of
+    worker processes.  The outcome of each run is recorded in a ResultStore,
+    keyed by a hash of the point's configuration, seed, and the SEEDS
+    version.  Runs that have already finished are skipped, so an interrupted
+    sweep can be resumed by running the same command again.  Each run writes
+    its data to <data_dir>/point-<key>.  Return the number of failed runs.
+
+    Parameters:
+
+    *cmd_args*
+        The parsed command line arguments
+
+    """
+
+    data_dir = cmd_args.data_dir
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+
+    if cmd_args.store:
+        store = ResultStore(cmd_args.store)
+    else:
+        store = ResultStore(os.path.join(data_dir, 'sweep.sqlite'))
+
+    params = parse_params(cmd_args)
+    points = expand_sweep(cmd_args.sweep)
+    replicates = max(1, cmd_args.replicates)
+
+    jobs = []
+    runs = {}
+    queued = set()
+    skipped = 0
+
+    for point in points:
+        config = canonical_config(cmd_args.config, params + point)
+        point_id = tuple("%s.%s=%s" % p for p in point)
+
+        for r in range(replicates):
+            seed = derive_seed(cmd_args.seed, point_id + ("replicate", r)) % 2**32
+            key = point_key(config, cmd_args.experiment, seed, S.__version__)
+
+            if store.is_finished(key):
+                skipped += 1
+                continue
+            elif key in queued:
+                continue
+
+            run_dir = os.path.join(data_dir, "point-%s" % (key[:12]))
+            jobs.append((cmd_args, r, seed, run_dir, point))
+            runs[run_dir] = (key, point)
+            queued.add(key)
+
+    if not cmd_args.quiet:
+        print("Sweep of %d points x %d replicates: %d to run, %d already finished" % (len(points), replicates, len(jobs), skipped))
+
+    failures = 0
+
+    try:
+        for result in run_jobs(jobs, cmd_args.jobs):
+            (key, point) = runs[result['data_dir']]
+            store.record(key=key, params=point, seed=result['seed'],
+                         version=S.__version__, data_dir=result['data_dir'],
+                         status=result['status'], error=result['error'],
+                         runtime=result['runtime'], summary=result['summary'])
+
+            if result['status'] != 0:
+                failures += 1
+
+            if not cmd_args.quiet:
+                desc = ", ".join("%s.%s=%s" % p for p in point)
+                if result['status'] == 0:
+                    print("Finished %s [replicate %d] (%.3f s)" % (desc, result['replicate'], result['runtime']))
+                else:
+                    print("Failed %s [replicate %d]: %s" % (desc, result['replicate'], result['error']))
+    finally:
+        store.close()
+
+    return failures
+
+def run_jobs(jobs, processes):
+    """Run the given jobs (see run_replicate) and yield their results as
+    they finish.  If more than one process is requested, the jobs are run in
+    a pool of worker processes.
+
+    Parameters:
+
+    *jobs*
+        A list of jobs
+    *processes*
+        The number of worker processes to use
+
+    """
+
+    if processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            for result in pool.imap_unordered(run_replicate, jobs):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for j in jobs:
+            yield run_replicate(j)
+
+def main():
+    parser = argparse.ArgumentParser(prog='runseeds.py',
+                                      description='Run an experiment using SEEDS')
+    parser.add_argument("-c", "--config", default="seeds.cfg",
+                        help="read config file (default: seeds.cfg)")
+    parser.add_argument("-C", "--genconfig", action="store_true",
+                        help="write config file used (experiment.cfg)")
+    parser.add_argument("-d", "--data_dir", default="data",
+                        help="write data to this directory (default: data)")
+    parser.add_argument("-e", "--experiment", default=None,
+                        help="label of the experiment to run")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of replicates to run at once (default: 1)")
+    parser.add_argument("-p", "--param", action="append",
+                        help="Set config values. Semicolon-separated list of section.param=val")
+    parser.add_argument("-q", "--quiet", action="store_true", help="suppress all output messages")
+    parser.add_argument("-r", "--replicates", type=int, default=0,
+                        help="run this many replicates, each in its own subdirectory of the data directory, with seeds derived from the given seed")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="set random seed (default: use clock)")
+    parser.add_argument("--store", default=None,
+                        help="record sweep results in this database (default: <data_dir>/sweep.sqlite)")
+    parser.add_argument("--sweep", action="append",
+                        help="sweep over the values of a config parameter, given as section.param=v1,v2,... or section.param=start:stop:step. May be given more than once to sweep over a grid. Finished points are skipped when re-run.")
+    parser.add_argument("--version", action="version",
+                        version="%s (SEEDS Version %s)" % (__version__, S.__version__))
+    cmd_args = parser.parse_args()
+
+    if cmd_args.jobs < 1:
+        parser.error("the number of jobs must be at least 1")
+
+    if cmd_args.sweep:
+        if cmd_args.seed <= 0:
+            parser.error("a sweep requires a seed (--seed) so that it can be resumed")
+
+        try:
+            failures = run_sweep(cmd_args)
+        except SEEDSError as err:
+            print("Error: %s" % err)
+            sys.exit(1)
+
+        if failures > 0:
+            sys.exit(2)
+        return
+
+    if cmd_args.replicates > 0:
+        failures = run_replicates(cmd_args)
+        if failures > 0:
+            sys.exit(2)
+        return
+
+    if cmd_args.seed > 0:
+        random_seed = cmd_args.seed
+    else:
+        random_seed=-1
+
+    # Create the Experiment...
+    try:
+        experiment = create_experiment(cmd_args, random_seed, cmd_args.data_dir)
+    except SEEDSError as err:
+        print("Error: %s" % err)
+        sys.exit(1)
+
     if not cmd_args.quiet:
         print("Experiment ID: %s" % experiment.uuid)
 
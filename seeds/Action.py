@@ -42,26 +42,48 @@ class Action(object):
     header
         For Actions that write data files, whether or not to write a header
         row.  (Boolean, Default: True)
+    settings
+        A ConfigSection containing the typed settings for this Action,
+        compiled from the Action's configuration block using config_schema
+    rng
+        The Action's own stream of pseudorandom numbers (see Experiment)
     
     Configuration: The data_dir parameter should be set in the [Experiment]
-    block.  Each Action should have its own configuration block.
+    block.  Each Action should have its own configuration block.  The
+    epoch_start, epoch_end, frequency, and priority parameters are read from
+    this block for all Actions.  Actions that have other parameters should
+    extend config_schema (see Config.compile).  For example:
+
+        config_schema = dict(Action.config_schema, filename=(str, 'out.csv'))
 
     """
 
+    config_schema = {'epoch_start': (int, 0),
+                     'epoch_end': (int, None),
+                     'frequency': (int, 1),
+                     'priority': (int, 0)}
+
     def __init__(self, experiment, name=None, label=None):
         """Create an Action instance"""
         self.experiment = experiment
         self.name = name
         self.label = label
-        self.data_dir = self.experiment.config.get(self.experiment.config_section, 'data_dir', 'data')
-        self.epoch_start = 0
-        self.epoch_end = self.experiment.config.getint(self.experiment.config_section, 'epochs', default=-1)
-        self.frequency = 1
-        self.priority = 0
+        self.data_dir = self.experiment.settings.data_dir
         self.enabled = True
         self.header = True
 
         self.config_section = self.get_config_section()
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+        self.rng = self.experiment.rng.spawn(self.config_section)
+
+        self.epoch_start = self.settings.epoch_start
+        if self.settings.epoch_end is None:
+            self.epoch_end = self.experiment.settings.epochs
+        else:
+            self.epoch_end = self.settings.epoch_end
+        self.frequency = self.settings.frequency
+        self.priority = self.settings.priority
 
     def __str__(self):
         """Produce a string to be used when an Action object is printed"""
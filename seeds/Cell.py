@@ -8,8 +8,6 @@ that organism.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
-import random
-
 from seeds.SEEDSError import *
 
 
@@ -46,18 +44,82 @@ class Cell(object):
         A unique label identifying this Cell's configuration
     neighbors
         A list of Cells with which this Cell interacts.  These are cells on
-        neighboring nodes in the topology.
+        neighboring nodes in the topology.  If the Cell keeps no list of its
+        own (see update_neighbors), as on topologies with an adjacency
+        index, the list is read from the topology each time it is accessed.
+    rng
+        The stream of pseudorandom numbers to use.  This is shared by all
+        Cells in the Population.  State-only Cell types use the Population's
+        rng property.
+    state_attributes
+        A dict mapping the names of any per-cell numeric attributes to NumPy
+        dtype strings (e.g., {'fitness': 'f8'}).  When the Population uses
+        array state (see Population), these attributes, along with the Cell's
+        type, are stored in arrays indexed by node ID rather than in each
+        Cell object.
+    state_only
+        Whether or not the Cell type can be run without creating Cell objects
+        when the Population uses array state.  Cell types that set this to
+        True must implement the setup_state, init_state, and update_state
+        class methods, which operate directly on the Population's CellState.
+        (default: False)
+    update_state_batch
+        An optional class method update_state_batch(population, nodes, draws)
+        that applies one event at each node in the array nodes, using one
+        uniform random number from the array draws per event.  It is used by
+        the Population's batched update mode, which only passes it events
+        that do not interact, so it may apply them all at once using array
+        operations.  (default: None, batched updates not supported)
+    update_state_synchronous
+        An optional class method update_state_synchronous(population) that
+        computes the next generation of the whole Population at once.  It
+        must read only the current generation and return a new array of
+        Cell types rather than modifying the current one.  It is used by the
+        Population's synchronous update mode.  (default: None)
+    state_rates
+        An optional class method state_rates(population, nodes) returning an
+        array with the probability that an event at each of the given nodes
+        changes its state.  Used with fire_state by the Population's rate
+        update mode.  (default: None)
+    fire_state
+        An optional class method fire_state(population, node) that changes
+        the state of the given node, given that an event there does change
+        it.  Afterwards, the rates of the node and its neighbors are
+        recomputed with state_rates.  (default: None)
+    count_transitions
+        An optional class method count_transitions(population, counts) that
+        returns a (max_types, max_types) array in which entry [i][j] is the
+        probability that an event at a Cell of type i changes it to type j,
+        given the array counts of the number of Cells of each type in a
+        well-mixed Population.  The diagonal is ignored.  Used with
+        init_counts by the Population's count update mode, in which the
+        Cell type's parameters (see setup_state) are the Population's
+        count_params property.  (default: None)
+
+    settings
+        A ConfigSection containing the typed settings for this Cell type,
+        compiled from its configuration block using config_schema.  All
+        Cells of a type share one.
 
     Configuration:
         Configuration options for each custom Cell object should be stored in a
         configuration block bearing the name of that Cell type (e.g.,
-        "[DemoCell]")
+        "[DemoCell]").  The options are declared in config_schema, a dict
+        mapping option names to (type, default) tuples (see Config.compile).
 
     """
 
     types = []
     type_colors = []
     max_types = 0
+    config_schema = {}
+    state_attributes = {}
+    state_only = False
+    update_state_batch = None
+    update_state_synchronous = None
+    state_rates = None
+    fire_state = None
+    count_transitions = None
 
     def __init__(self, experiment, population, node, type=None, name=None, label=None):
         """Initialize a Cell object
@@ -86,6 +148,7 @@ class Cell(object):
         self.node = node
         self.name = name
         self.label = label
+        self.rng = self.population.rng
         self.type_colors = ['r','g','b','y','c', 'm', 'k']
 
         if type:
@@ -94,40 +157,65 @@ class Cell(object):
             else:
                 self.type = type
         else:
-            self.type = random.randint(0, len(self.types)-1)
+            self.type = self.rng.randint(0, len(self.types)-1)
 
         if self.label:
             self.config_section = "{name}:{label}".format(name=self.name, label=self.label)
         else:
             self.config_section = "{name}".format(name=self.name)
 
-        self.neighbors = []
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+        self._neighbors = None
 
     def __str__(self):
         """Produce a string to be used when a Cell object is printed"""
         return "Cell {id} Type {type}".format(id=self.id, type=self.type)
 
+    @property
+    def neighbors(self):
+        if self._neighbors is None:
+            return self.population.get_neighbors(self)
+        return self._neighbors
+
+    @neighbors.setter
+    def neighbors(self, neighbors):
+        self._neighbors = neighbors
+
     def add_neighbor(self, neighbor):
-        """Make the given cell a neighbor"""
-        self.population.topology.add_edge(self.id, neighbor.id)
-        self.neighbors = self.get_neighbors()
-        neighbor.neighbors = neighbor.get_neighbors()
+        """Make the given cell a neighbor.  Any neighbor lists kept by the
+        two Cells are updated in place rather than rebuilt.
+        """
+        topology = self.population.topology
+        if topology.has_edge(self.node, neighbor.node):
+            return
+
+        topology.add_edge(self.node, neighbor.node)
+        if self._neighbors is not None:
+            self._neighbors.append(neighbor)
+        if neighbor is not self and neighbor._neighbors is not None:
+            neighbor._neighbors.append(self)
 
     def remove_neighbor(self, neighbor):
         """Disconnect the Cell from the given Cell, making them no longer
-        neighbors
+        neighbors.  Any neighbor lists kept by the two Cells are updated in
+        place rather than rebuilt.
         """
-        self.population.topology.remove_edge(self.id, neighbor.id)
-        self.update_neighbors()
-        neighbor.update_neighbors()
+        self.population.topology.remove_edge(self.node, neighbor.node)
+        if self._neighbors is not None:
+            self._neighbors.remove(neighbor)
+        if neighbor is not self and neighbor._neighbors is not None:
+            neighbor._neighbors.remove(self)
 
     def get_neighbors(self):
         """Get a list of neighboring cells"""
         return self.population.get_neighbors(self)
 
     def update_neighbors(self):
-        """Update the list of neighboring cells"""
-        self.neighbors = self.get_neighbors()
+        """Update the list of neighboring cells kept by the Cell.  Cells
+        that have never called this keep no list, and read their neighbors
+        from the topology whenever they are needed."""
+        self._neighbors = self.get_neighbors()
 
     def update(self):
         """Update the Cell according to its update rules"""
@@ -148,3 +236,96 @@ class Cell(object):
     def get_neighbor_distances(self):
         """Get an array of distances to all neighbors"""
         return [self.get_neighbor_distance(n) for n in self.get_neighbors()]
+
+    @classmethod
+    def state_config_section(cls, label=None):
+        """Get the name of the configuration section for this Cell type when
+        no Cell objects are created
+
+        Parameters:
+
+        *label*
+            A unique label for the configuration of this Cell type
+
+        """
+
+        if label:
+            return "{name}:{label}".format(name=cls.__name__, label=label)
+        else:
+            return "{name}".format(name=cls.__name__)
+
+    @classmethod
+    def setup_state(cls, population, label=None):
+        """Read the configuration for a state-only Cell type and return a dict
+        of parameters shared by all of its Cells.  This dict is stored as the
+        params property of the Population's CellState.
+
+        Parameters:
+
+        *population*
+            A reference to the Population in which the Cells exist
+        *label*
+            A unique label for the configuration of this Cell type
+
+        """
+
+        return {}
+
+    @classmethod
+    def init_state(cls, population, node, type=None):
+        """Initialize the state of the given node when no Cell object is used
+
+        Parameters:
+
+        *population*
+            A reference to the Population in which the Cell exists
+        *node*
+            The ID of the node whose state to initialize
+        *type*
+            The type of Cell to place in the node (assigned randomly if not
+            provided)
+
+        """
+
+        if type is None:
+            type = population.rng.randint(0, len(cls.types)-1)
+        elif type not in range(len(cls.types)):
+            raise CellTypeError(type)
+
+        population.state.types[node] = type
+        population.increment_type_count(type)
+
+    @classmethod
+    def init_counts(cls, population, size, rng):
+        """Return an array with the number of Cells of each type when the
+        Population is represented only by its type counts.  As with
+        init_state, each Cell's type is assigned randomly.
+
+        Parameters:
+
+        *population*
+            A reference to the Population in which the Cells exist
+        *size*
+            The number of Cells
+        *rng*
+            A NumPy RandomState to use
+
+        """
+
+        return rng.multinomial(size, [1.0/len(cls.types)] * len(cls.types))
+
+    @classmethod
+    def update_state(cls, population, node):
+        """Update the state of the given node when no Cell object is used.
+        This is the state-only counterpart of update.
+
+        Parameters:
+
+        *population*
+            A reference to the Population in which the Cell exists
+        *node*
+            The ID of the node whose state to update
+
+        """
+
+        pass
@@ -26,10 +26,27 @@ else:
     NO_OPTION_ERROR = ConfigParser.NoOptionError
 
 import seeds as S
+from seeds.SEEDSError import *
+
+# Strings accepted for boolean parameters (the same as ConfigParser)
+BOOLEAN_STATES = {'1': True, 'yes': True, 'true': True, 'on': True,
+                  '0': False, 'no': False, 'false': False, 'off': False}
+
 
 class Config(object):
     """A Config object contains the configuration for an experiment.  The
     values in a configuration can be queried and also updated.
+
+    Because reading values from the parser involves string parsing (and
+    writes the defaults of missing values back), objects should not query
+    the Config while an experiment runs.  Instead, each object declares a
+    schema for its configuration section, which is compiled once into a
+    typed, frozen ConfigSection when the object is set up (see compile).
+
+    Schemas are dicts that map parameter names to (type, default) tuples,
+    where type is one of bool, int, float, or str.  For example:
+
+        config_schema = {'size': (int, 100), 'periodic': (bool, False)}
     
     """
 
@@ -62,6 +79,8 @@ class Config(object):
         if filename != None:
             self.config.read(filename)
 
+        self.snapshots = {}
+
         self.resource_sections = []
         for sec in self.config.sections():
             match = re.match("Resource:([a-zA-Z_]+)", sec)
@@ -180,6 +199,7 @@ class Config(object):
 
         """
 
+        self.snapshots.pop(section, None)
         val = self.config.set(section, name, str(value))
         return val
         
@@ -196,6 +216,73 @@ class Config(object):
         val = self.config.items(section)
         return val
 
+    def compile(self, section, schema):
+        """Compile the values in a section into a typed, frozen ConfigSection
+        according to the given schema.  Values are converted to the types
+        given in the schema, and defaults are used (and recorded in the
+        configuration) for any values that are not defined.  Sections are
+        only compiled once.  If a section is compiled again with a schema
+        that declares new parameters, a new ConfigSection containing the
+        parameters of both schemas is compiled.
+
+        Setting a value in a section discards its compiled snapshot, but
+        ConfigSection objects that were already given out do not change.
+
+        If a value can not be converted to the declared type,
+        InvalidParameterValue is raised.
+
+        Parameters:
+
+        *section*
+            The section to compile
+        *schema*
+            A dict mapping the names of parameters to (type, default) tuples
+
+        """
+
+        snapshot = self.snapshots.get(section)
+
+        if snapshot is not None:
+            if all(name in snapshot for name in schema):
+                return snapshot
+
+            merged = dict(snapshot._schema)
+            merged.update(schema)
+            schema = merged
+
+        if not self.config.has_section(section):
+            self.config.add_section(section)
+
+        values = {}
+        for name, (type, default) in schema.items():
+            if self.config.has_option(section, name):
+                values[name] = self._convert(section, name, type,
+                                             self.config.get(section, name),
+                                             default)
+            else:
+                if default is not None:
+                    self.config.set(section, name, str(default))
+                values[name] = default
+
+        snapshot = ConfigSection(section, schema, values)
+        self.snapshots[section] = snapshot
+        return snapshot
+
+    def _convert(self, section, name, type, raw, default):
+        """Convert a raw string value to the given type"""
+
+        # Earlier versions recorded undefined values as 'None'
+        if raw == 'None':
+            return default
+
+        try:
+            if type is bool:
+                return BOOLEAN_STATES[raw.strip().lower()]
+            else:
+                return type(raw.strip())
+        except (KeyError, ValueError):
+            raise InvalidParameterValue(section=section, parameter=name)
+
     def has_section(self, secname):
         """See if the given section name is defined"""
         return self.config.has_section(secname)
@@ -214,8 +301,48 @@ class Config(object):
         data_dir = self.get(self.experiment.config_section, 'data_dir', 'data')
         data_file = os.path.join(data_dir, filename)
 
-        with open(data_file, 'wb') as configfile:
+        with open(data_file, 'w') as configfile:
             info = "# SEEDS {version} Experiment Configuration\n# Generated: {when}\n# UUID: {uuid}\n\n".format(version=S.__version__, when=datetime.datetime.now().strftime("%Y-%m-%d (%H:%M:%S)"), uuid=self.experiment.uuid)
             configfile.write(info)
             self.config.write(configfile)
 
+
+class ConfigSection(object):
+    """A frozen snapshot of the typed values in one section of a Config.
+    Parameters are accessed as attributes (e.g., settings.size), and can
+    not be changed.  ConfigSection objects are created by Config.compile.
+
+    """
+
+    def __init__(self, section, schema, values):
+        """Initialize a ConfigSection object
+
+        Parameters:
+
+        *section*
+            The name of the section
+        *schema*
+            The schema used to compile the section
+        *values*
+            A dict mapping parameter names to their typed values
+
+        """
+
+        self.__dict__.update(values)
+        self.__dict__['_section'] = section
+        self.__dict__['_schema'] = schema
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Configuration section '{sec}' is read-only".format(sec=self._section))
+
+    def __delattr__(self, name):
+        raise AttributeError("Configuration section '{sec}' is read-only".format(sec=self._section))
+
+    def __contains__(self, name):
+        """Return whether or not the given parameter is in the snapshot"""
+        return name in self._schema
+
+    def __str__(self):
+        """Produce a string to be used when a ConfigSection is printed"""
+        items = ", ".join("{name}={val!r}".format(name=n, val=getattr(self, n)) for n in sorted(self._schema))
+        return "ConfigSection [{sec}] ({items})".format(sec=self._section, items=items)
@@ -8,6 +8,7 @@ __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
 import datetime
+import json
 import os
 import random
 import shutil
@@ -25,6 +26,7 @@ from seeds.SEEDSError import *
 from seeds.Topology import *
 
 from seeds.utils.parsing import parse_version_string
+from seeds.utils.rng import RNG
 from seeds.utils.versions import is_valid_version
 
 
@@ -53,9 +55,27 @@ class Experiment(object):
         and their interactions
     proceed
         Boolean value indicating whether or not the experiment should continue.
+    rng
+        The RNG (pseudorandom number generator) for this Experiment, created
+        from its seed when the Experiment is set up.  Components do not draw
+        from it directly.  Instead, each spawns its own child stream (e.g.,
+        experiment.rng.spawn(config_section)), so that the numbers it gets do
+        not depend on other components.
+    topology_rng
+        The RNG from which Topologies spawn their streams.  This is rng,
+        unless a separate topology_seed is configured, in which case
+        replicates with different seeds can share the same topologies (see
+        Topology.load_cache).
     resources
         A hash of available resources.  The key is the name of the resource,
         and the value is a Resource object.
+    resource_stage
+        A ResourceStage that updates the Resources each epoch, fusing the
+        updates of compatible Resources and running them in resource_threads
+        threads (see ResourceStage)
+    topologies
+        A dict of the shareable Topologies created so far, keyed by their
+        type and settings (see get_topology)
     uuid
         A practically unique identifier for the experiment. (RFC 4122 ver 4)
     label
@@ -63,9 +83,23 @@ class Experiment(object):
     config_section
         The section of the config file in which to find settings for this
         Experiment
+    settings
+        A ConfigSection containing the typed settings for this Experiment,
+        which is compiled when the Experiment is set up
 
     """
 
+    config_schema = {'seed': (int, -1),
+                     'epochs': (int, -1),
+                     'data_dir': (str, 'data'),
+                     'plugin_dirs': (str, None),
+                     'resources': (str, None),
+                     'population': (str, 'Population'),
+                     'actions': (str, None),
+                     'topology_seed': (int, -1),
+                     'topology_cache': (str, None),
+                     'resource_threads': (int, 1)}
+
     def __init__(self, configfile=None, seed=-1, label=None):
         """Initialize a Experiment object
 
@@ -92,9 +126,13 @@ class Experiment(object):
         self.is_setup = False
         self.proceed = True
         self.seed = seed
+        self.rng = None
+        self.topology_rng = None
         self.uuid = uuid.uuid4()
         self.data = {}
         self.resources = {}
+        self.resource_stage = None
+        self.topologies = {}
         self.actions = []
         self.label = label
 
@@ -117,25 +155,38 @@ class Experiment(object):
 
     def setup(self):
         """Set up the Experiment including its Population, Resources, and Actions"""
+        self.settings = self.config.compile(self.config_section,
+                                            self.config_schema)
+
         if self.seed == -1:
-            configseed = self.config.getint(self.config_section, "seed", default=-1)
-            if configseed != -1:
-                self.seed = configseed
+            if self.settings.seed != -1:
+                self.seed = self.settings.seed
             else:
                 self.seed = int(time.time()*10)
 
-        random.seed(self.seed)
+        self.rng = RNG(seed=self.seed)
         self.config.set(self.config_section, 'seed', self.seed)
 
-        self.experiment_epochs = self.config.getint(self.config_section, 'epochs',
-                                                    default=-1)
+        # Topologies can be built from their own seed, so that they do not
+        # change with the seed of the dynamics
+        if self.settings.topology_seed != -1:
+            self.topology_rng = RNG(seed=self.settings.topology_seed)
+        else:
+            self.topology_rng = self.rng
+
+        # Seed the global generator for plugins that still use it
+        random.seed(self.seed)
+
+        # Setting the seed discards the snapshot, so compile the final one
+        self.settings = self.config.compile(self.config_section,
+                                            self.config_schema)
+
+        self.experiment_epochs = self.settings.epochs
 
         # Create the data directory.  If the directory already exists, move it
         # to a new directory named after the current name with a timestamp
         # appended
-        data_dir = self.config.get(section=self.config_section,
-                                   name='data_dir',
-                                   default='data')
+        data_dir = self.settings.data_dir
 
         if os.path.exists(data_dir):
             newname = data_dir + '-' + datetime.datetime.now().strftime("%Y%m%d%H%M%S")
@@ -155,7 +206,7 @@ class Experiment(object):
 
         # Initialize all of the Resources
         self.data['resources'] = {}
-        resourcestring = self.config.get(self.config_section, "resources")
+        resourcestring = self.settings.resources
         if resourcestring:
             reslist = [res.strip() for res in resourcestring.split(',')]
 
@@ -171,10 +222,13 @@ class Experiment(object):
                 else:
                     warn("Resource '{resname}' listed twice. Skipping duplicates.".format(resname=res))
 
+        self.resource_stage = ResourceStage(list(self.resources.values()),
+                                            threads=self.settings.resource_threads)
+
         # Create the Population
         self.data['population'] = {}
 
-        population_raw = self.config.get(self.config_section, "population", default="Population")
+        population_raw = self.settings.population
         parsed = population_raw.split(':')
 
         if parsed[0] != "Population":
@@ -189,8 +243,7 @@ class Experiment(object):
 
 
         # Setup the list of Actions to be run
-        actionstring = self.config.get(section=self.config_section,
-                                       name="actions")
+        actionstring = self.settings.actions
 
         if actionstring:
             actionlist = [action.strip() for action in actionstring.split(',')]
@@ -216,7 +269,7 @@ class Experiment(object):
             self.setup()
 
         [a.update() for a in self.actions]
-        [self.resources[res].update() for res in self.resources]
+        self.resource_stage.update()
         self.population.update()
         self.epoch += 1
 
@@ -258,6 +311,7 @@ class Experiment(object):
         """Perform any necessary cleanup at the end of a run"""
         [a.teardown() for a in self.actions]
         [self.resources[res].teardown() for res in self.resources]
+        self.resource_stage.teardown()
         self.population.teardown()
 
     def is_resource_defined(self, name):
@@ -278,6 +332,47 @@ class Experiment(object):
         except KeyError:
             raise ResourceNotDefinedError(name)
 
+    def get_topology(self, topology_type, label=None):
+        """Get a Topology of the given type and configuration.  Topologies
+        whose graphs can not change once built (see Topology.shareable) are
+        created only once for each distinct set of settings, so the
+        Population and Resources configured with identical grids share one
+        instance, along with its adjacency index.  Others are created anew
+        for each call.
+
+        Parameters:
+
+        *topology_type*
+            The name of the Topology plugin (e.g., MooreTopology)
+        *label*
+            The label of the Topology's configuration section (optional)
+
+        """
+
+        tref = self.plugin_manager.get_topology_plugin(topology_type)
+
+        if not tref.shareable:
+            return tref(experiment=self, label=label)
+
+        if label:
+            section = "{type}:{label}".format(type=topology_type, label=label)
+        else:
+            section = topology_type
+
+        settings = self.config.compile(section, tref.config_schema)
+        ident = [topology_type, sorted((name, getattr(settings, name)) for name in settings._schema)]
+
+        # The graphs of other topologies depend on their random stream, which
+        # is determined by their label
+        if not tref.deterministic:
+            ident.append(label)
+
+        key = json.dumps(ident, default=str)
+        if key not in self.topologies:
+            self.topologies[key] = tref(experiment=self, label=label)
+
+        return self.topologies[key]
+
     def add_action(self, action):
         """Add an Action to the list of actions to be scheduled.
 
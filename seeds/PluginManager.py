@@ -64,7 +64,7 @@ class PluginManager(object):
         self.plugin_dirs = []
         self.plugins = None
 
-        plugindirs = self.experiment.config.get(section=self.experiment.config_section, name='plugin_dirs')
+        plugindirs = self.experiment.settings.plugin_dirs
         if plugindirs:
             for d in plugindirs.split(','):
                 if os.path.exists(d):
@@ -9,12 +9,16 @@ __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
 import itertools
-import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from seeds.Experiment import *
 from seeds.SEEDSError import *
 from seeds.Topology import *
-from seeds.utils.sampling import sample_with_replacement
+from seeds.utils.sampling import sample_with_replacement, BlockSampler, SumTree
 
 
 class Population(object):
@@ -35,11 +39,100 @@ class Population(object):
     cell_id_manager
         Keeps track of Cell IDs and provides unique IDs using the get_cell_id
         method.
+    state
+        A CellState object storing the types and declared attributes of all
+        Cells in contiguous arrays, or None if array state is not used
+    rng
+        The Population's own stream of pseudorandom numbers, which is used
+        to select and update Cells
+    state_only
+        Whether or not the Population is run without Cell objects.  This is
+        the case when array state is used and the configured Cell type sets
+        its state_only property.
     _cell_class
         A reference to the proper class for the configured Cell type
+    _view_class
+        A reference to the class used to create Cell objects.  When array
+        state is used, this is a subclass of the configured Cell type whose
+        type and declared attributes are views onto the CellState.
+    settings
+        A ConfigSection containing the typed settings for this Population
+
+    Configuration: All configuration options should be specified in the
+    [Population] block (or [Population:<label>] if a label is used).
+
+        topology
+            The Topology type (and optional label) defining the interactions
+            among Cells (e.g., MooreTopology:large)
+        cell
+            The Cell type (and optional label) to use (e.g., RPSCell)
+        events_per_epoch
+            The number of Cell updates to perform each epoch (default: the
+            number of nodes in the topology)
+        array_state
+            Whether or not to store Cell types and declared attributes in
+            contiguous arrays indexed by node ID.  Requires NumPy.  Cell
+            types that support it are run without creating any Cell objects.
+            (default: False)
+        update_mode
+            How the events of each epoch are carried out.  With 'random',
+            each event updates one randomly-selected Cell, in turn.  With
+            'batched', the events are processed in chunks: events in a chunk
+            that do not interact (no event's node is in another's node or
+            neighborhood) are applied together by the Cell type's
+            update_state_batch method, and the remaining events are applied
+            one at a time in order.  The outcome is the same as applying the
+            events one at a time.  Batched updates require array_state, a
+            Cell type that supports them, and a topology with an adjacency
+            index.  (default: random)
+            With 'synchronous', every Cell is updated once per epoch, reading
+            the state of the Population at the start of the epoch and writing
+            the state for the next (double buffering).  Synchronous updates
+            require array_state.  State-only Cell types must provide an
+            update_state_synchronous method.  events_per_epoch is ignored.
+            With 'rate', time is continuous and only events that change the
+            Population are carried out (Gillespie's direct method).  Each Cell
+            experiences events at rate events_per_epoch/N per epoch, but an
+            event takes place with probability equal to the Cell's rate as
+            reported by the Cell type's state_rates method, so events that
+            would do nothing are never drawn.  The next event is selected
+            with a sum tree in O(log N) time.  This is the continuous-time
+            counterpart of 'random' and is statistically equivalent to it for
+            large Populations.  Rate updates require array_state, a Cell type
+            that supports them, and a topology with an adjacency index.
+            With 'count', the Population is represented only by the number of
+            Cells of each type, and no Cell objects or node state are kept.
+            This requires a well-mixed topology (see Topology.well_mixed) and
+            a Cell type that supports it (see Cell.count_transitions).  Each
+            event picks a Cell at random and changes its type with a
+            probability that depends only on the type counts, as with a
+            WellMixedTopology that resamples neighbors.  Only per-type data
+            (type_count and transitions) are available.
+        batch_size
+            The number of events per chunk in batched mode.  If 0, a size is
+            chosen so that few events in a chunk interact.  In count mode,
+            the outcomes of the events of a chunk are drawn together from the
+            type counts at the start of the chunk, which approximates
+            applying them one at a time.  A chunk is never larger than the
+            count of any type present, and with 1, the events are exact.  If
+            0, chunks of 1/1000 of the Population are used. (default: 0)
+
+    Example:
+        [Population]
+        topology = MooreTopology
+        cell = Kerr07Cell
+        array_state = True
+        update_mode = batched
 
     """
 
+    config_schema = {'topology': (str, None),
+                     'cell': (str, None),
+                     'events_per_epoch': (int, None),
+                     'array_state': (bool, False),
+                     'update_mode': (str, 'random'),
+                     'batch_size': (int, 0)}
+
     def __init__(self, experiment, label=None):
         self.experiment = experiment
         self.label = label
@@ -52,13 +145,25 @@ class Population(object):
         if not self.experiment.config.has_section(self.config_section):
             raise ConfigurationError("Configuration section {sec} not defined".format(sec=self.config_section))
 
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+
         self.cell_id_manager = itertools.count(0)
+        self.rng = self.experiment.rng.spawn(self.config_section)
+        self._cells = None
+        self._neighbor_lists = False
+
+        # Nodes to update are drawn in blocks when NumPy is available
+        if np is not None:
+            self._sampler = BlockSampler(seed=self.rng.numpy_seed())
+        else:
+            self._sampler = None
 
         self.experiment.data['population']['type_count'] = []
         self.experiment.data['population']['transitions'] = []
 
         # Create a topology to represent the organisms and their interactions
-        pop_topology_raw = self.experiment.config.get(self.config_section, 'topology')
+        pop_topology_raw = self.settings.topology
         parsed = pop_topology_raw.split(':')
 
         pop_topology_type = parsed[0]
@@ -67,12 +172,11 @@ class Population(object):
         else:
             label = None
 
-        tref = self.experiment.plugin_manager.get_topology_plugin(pop_topology_type)
-        self.topology = tref(self.experiment, label=label)
+        self.topology = self.experiment.get_topology(pop_topology_type, label=label)
 
 
         # Create a reference for the configured Cell type
-        cell_config = self.experiment.config.get(self.config_section, 'cell')
+        cell_config = self.settings.cell
 
         parsed = cell_config.split(':')
         cell_type = parsed[0]
@@ -84,17 +188,85 @@ class Population(object):
 
         # Get a reference to the object for the type of cell to use
         self._cell_class = self.experiment.plugin_manager.get_cell_plugin(cell_type)
+        self._view_class = self._cell_class
+        self.cell_label = label
+
+        self.update_mode = self.settings.update_mode
+        if self.update_mode == 'count':
+            # Only the number of Cells of each type is kept, so neither a
+            # CellState nor Cell objects are created
+            self.array_state = False
+            self.state = None
+            self.state_only = False
+            self._setup_counts()
+            return
+
+        self.array_state = self.settings.array_state
+        if self.array_state:
+            if self.topology.graph is None:
+                size = self.topology.num_nodes()
+            else:
+                size = max(self.topology.graph.nodes()) + 1
+            self.state = CellState(size=size, cell_class=self._cell_class)
+            self.state_only = self._cell_class.state_only
+        else:
+            self.state = None
+            self.state_only = False
+
+        # Cell objects are stored in the nodes of the topology's graph
+        if self.topology.graph is None and not self.state_only:
+            raise ConfigurationError("Population: topologies without a graph (e.g., implicit lattices) require array_state and a state-only Cell type")
+
+        if self.update_mode == 'batched':
+            self._setup_batched()
+        elif self.update_mode == 'synchronous':
+            if not self.state:
+                raise ConfigurationError("Population: synchronous update_mode requires array_state")
+            elif self.state_only and self._cell_class.update_state_synchronous is None:
+                raise ConfigurationError("Population: Cell type does not support synchronous update_mode")
+        elif self.update_mode == 'rate':
+            if not self.state_only:
+                raise ConfigurationError("Population: rate update_mode requires array_state and a state-only Cell type")
+            elif self._cell_class.state_rates is None or self._cell_class.fire_state is None:
+                raise ConfigurationError("Population: Cell type does not support rate update_mode")
+            elif self.topology.adjacency is None:
+                raise ConfigurationError("Population: rate update_mode requires a topology with an adjacency index")
+        elif self.update_mode != 'random':
+            raise ConfigurationError("Population: unknown update_mode '{mode}'".format(mode=self.update_mode))
+
+        # Cell types that support it keep all of their state in the arrays, so
+        # no Cell objects are created.
+        if self.state_only:
+            self.state.params = self._cell_class.setup_state(self, label=label)
+            for n in self.topology.nodes():
+                self._cell_class.init_state(self, n)
+
+            if self.update_mode == 'rate':
+                self._setup_rates()
+            return
+        elif self.state:
+            self._view_class = self.state.view_class(self._cell_class)
 
         # For each node in the topology, create a Cell and assign it the
-        # coordinates of the node
+        # coordinates of the node.  The Cells are also kept in a list indexed
+        # by node ID, which is used to look up neighbors.
+        self._cells = [None] * (max(self.topology.graph.nodes()) + 1)
         for n in self.topology.graph.nodes():
-            c = self._cell_class(experiment=self.experiment, population=self,
+            c = self._view_class(experiment=self.experiment, population=self,
                                  node=n, label=label)
             self.topology.graph.node[n]['cell'] = c
+            self._cells[n] = c
 
         # Now that all Cells are present, set their neighbors list.  This can
         # help speed updates up when the topology changes less than once per
-        # epoch.  This benefit is most significant for fixed topologies.
+        # epoch.  Topologies with an adjacency index do not need these lists,
+        # since Cells read their neighbors from the index when needed (see
+        # Cell.neighbors).  Topologies that draw new neighbors each time
+        # instead have them set for each update (see _update_cell).
+        if self.topology.resample_neighbors or self.topology.adjacency is not None:
+            return
+
+        self._neighbor_lists = True
         for n in self.topology.graph.nodes():
             self.topology.graph.node[n]['cell'].update_neighbors()
 
@@ -117,11 +289,316 @@ class Population(object):
         self.experiment.data['population']['transitions'] = [[0]*num_types for i in range(num_types)]
 
         # Select a set of cells to update and update them
-        events = self.experiment.config.getint(section=self.config_section,
-                                               name='events_per_epoch',
-                                               default=len(self.topology.graph))
-        nodes_to_update = sample_with_replacement(self.topology.graph.nodes(), k=events)
-        [self.topology.graph.node[n]['cell'].update() for n in nodes_to_update]
+        events = self.settings.events_per_epoch
+        if events is None:
+            events = self.topology.num_nodes()
+        if self.update_mode == 'synchronous':
+            self._update_synchronous()
+            return
+        elif self.update_mode == 'rate':
+            self._update_rates(events)
+            return
+        elif self.update_mode == 'batched':
+            self._update_batched(events)
+            return
+        elif self.update_mode == 'count':
+            self._update_counts(events)
+            return
+
+        nodes_to_update = sample_with_replacement(self.topology.nodes(), k=events,
+                                                  sampler=self._sampler)
+
+        if self.state_only:
+            update_state = self._cell_class.update_state
+            [update_state(self, n) for n in nodes_to_update]
+        elif self.topology.resample_neighbors:
+            [self._update_cell(n) for n in nodes_to_update]
+        else:
+            [self.topology.graph.node[n]['cell'].update() for n in nodes_to_update]
+
+    def _update_cell(self, node):
+        """Update the Cell in the given node with a newly-drawn set of
+        neighbors, which is discarded afterwards.  This is used for topologies
+        that resample neighbors (see Topology.resample_neighbors), so that
+        Cells do not keep neighbor lists between updates.
+
+        Parameters:
+
+        *node*
+            The ID of the node
+
+        """
+
+        cell = self.topology.graph.node[node]['cell']
+        cell.neighbors = self.get_neighbors(cell)
+        cell.update()
+        cell.neighbors = []
+
+    def _update_synchronous(self):
+        """Update every Cell once, based on the state of the Population at
+        the start of the epoch.
+
+        State-only Cell types compute the next generation with their
+        update_state_synchronous method.  Otherwise, each Cell object is
+        updated while the CellState directs writes to a second buffer, which
+        becomes the current state once all Cells have been updated.
+
+        """
+
+        if self.state_only:
+            current = self.state.types
+            following = self._cell_class.update_state_synchronous(self)
+            self.state.types = following
+            self.record_transitions(current, following)
+        else:
+            self.state.begin_step()
+            try:
+                if self.topology.resample_neighbors:
+                    [self._update_cell(n) for n in self.topology.graph.nodes()]
+                else:
+                    [self.topology.graph.node[n]['cell'].update() for n in self.topology.graph.nodes()]
+            finally:
+                self.state.end_step()
+
+    def _setup_rates(self):
+        """Build the sum tree holding the rate of every node"""
+        nodes = self._node_array()
+        rates = np.zeros(len(self.state))
+        rates[nodes] = self._cell_class.state_rates(self, nodes)
+        self._rates = SumTree(rates)
+
+    def _update_rates(self, events):
+        """Advance the Population by one epoch of continuous time
+
+        The time until the next event is exponentially distributed with the
+        total rate of all nodes.  The node at which it happens is chosen with
+        probability proportional to its rate, and the event is carried out by
+        the Cell type's fire_state method.  This continues until the end of
+        the epoch is reached.  Since the waiting times are memoryless, the
+        event that would fall after the end of the epoch is simply dropped.
+
+        Parameters:
+
+        *events*
+            The number of events per epoch in the equivalent random-sequential
+            update, which sets the base event rate of each node
+
+        """
+
+        adj = self.topology.adjacency
+        fire = self._cell_class.fire_state
+        rates = self._cell_class.state_rates
+        tree = self._rates
+
+        base_rate = float(events) / self.topology.num_nodes()
+        remaining = 1.0
+
+        while True:
+            total = base_rate * tree.total()
+            if total <= 0:
+                break
+
+            remaining -= self.rng.expovariate(total)
+            if remaining < 0:
+                break
+
+            node = tree.find(self.rng.random())
+            fire(self, node)
+
+            affected = np.append(adj.neighbors(node), node)
+            tree.update(affected, rates(self, affected))
+
+    def _setup_batched(self):
+        """Check that batched updates can be used and prepare for them"""
+        if not self.state_only:
+            raise ConfigurationError("Population: batched update_mode requires array_state and a state-only Cell type")
+        elif self._cell_class.update_state_batch is None:
+            raise ConfigurationError("Population: Cell type does not support batched update_mode")
+        elif self.topology.adjacency is None:
+            raise ConfigurationError("Population: batched update_mode requires a topology with an adjacency index")
+
+        self.batch_size = self.settings.batch_size
+        if self.batch_size < 0:
+            raise ConfigurationError("Population: batch_size can not be negative")
+        elif self.batch_size == 0:
+            # The chance that an event interacts with another in its chunk is
+            # roughly batch_size * (degree + 1) / N.  Aim for about 10%.
+            adj = self.topology.adjacency
+            mean_degree = 2.0 * adj.num_edges() / max(1, len(adj))
+            self.batch_size = max(1, int(len(adj) / (10 * (mean_degree + 1))))
+
+        self._node_ids = self._node_array()
+        self._np_random = np.random.RandomState(self.rng.numpy_seed())
+
+    def _setup_counts(self):
+        """Check that count updates can be used and draw the initial number
+        of Cells of each type"""
+        if np is None:
+            raise ConfigurationError("Population: count update_mode requires NumPy")
+        elif not self.topology.well_mixed:
+            raise ConfigurationError("Population: count update_mode requires a well-mixed topology")
+        elif self._cell_class.count_transitions is None:
+            raise ConfigurationError("Population: Cell type does not support count update_mode")
+
+        size = self.topology.num_nodes()
+        if size < 2:
+            raise ConfigurationError("Population: count update_mode requires at least 2 nodes")
+
+        self.batch_size = self.settings.batch_size
+        if self.batch_size < 0:
+            raise ConfigurationError("Population: batch_size can not be negative")
+        elif self.batch_size == 0:
+            self.batch_size = max(1, size // 1000)
+
+        self.count_params = self._cell_class.setup_state(self, label=self.cell_label)
+        self._np_random = np.random.RandomState(self.rng.numpy_seed())
+
+        initial = self._cell_class.init_counts(self, size, self._np_random)
+        self.counts = np.zeros(self._cell_class.max_types, dtype=np.int64)
+        self.counts[:len(initial)] = initial
+        self.experiment.data['population']['type_count'] = self.counts.tolist()
+
+    def _update_counts(self, events):
+        """Carry out the given number of events on the type counts
+
+        For each event, the type of the Cell affected is drawn in proportion
+        to the counts, and its new type is drawn from the probabilities given
+        by the Cell type's count_transitions method.  Events are drawn in
+        chunks of up to batch_size with a single multinomial draw, holding
+        the counts fixed for the chunk.  Since a chunk is never larger than
+        the count of any type present, no count can become negative.  When
+        chunking is not possible, events are applied one at a time.
+
+        Parameters:
+
+        *events*
+            The number of events to carry out
+
+        """
+
+        num_types = self._cell_class.max_types
+        probabilities = self._cell_class.count_transitions
+        counts = self.counts
+        size = float(counts.sum())
+        transitions = self.experiment.data['population']['transitions']
+        moves = np.zeros((num_types, num_types), dtype=np.int64)
+
+        remaining = events
+        while remaining > 0:
+            k = min(self.batch_size, remaining, counts[counts > 0].min())
+
+            # The probability that an event changes a Cell of type i to type j
+            p = counts[:, np.newaxis] / size * probabilities(self, counts)
+            np.fill_diagonal(p, 0)
+            p = p.ravel()
+            total = p.sum()
+
+            if k > 1:
+                drawn = self._np_random.multinomial(k, np.append(p, max(0.0, 1.0 - total)))
+                moved = drawn[:-1].reshape(num_types, num_types)
+                counts += moved.sum(axis=0) - moved.sum(axis=1)
+                moves += moved
+                remaining -= k
+            elif total <= 0:
+                break
+            else:
+                # Events that change nothing are skipped: the number of events
+                # up to and including the next change is geometric
+                k = self._np_random.geometric(min(1.0, total))
+                if k > remaining:
+                    break
+
+                event = min(np.searchsorted(np.cumsum(p), self.rng.random() * total, side='right'),
+                            len(p) - 1)
+                (fromtype, totype) = divmod(int(event), num_types)
+                counts[fromtype] -= 1
+                counts[totype] += 1
+                moves[fromtype, totype] += 1
+                remaining -= k
+
+        for (fromtype, totype) in zip(*np.nonzero(moves)):
+            transitions[fromtype][totype] += int(moves[fromtype, totype])
+
+        self.experiment.data['population']['type_count'][:] = counts.tolist()
+
+    def _node_array(self):
+        """Return an array containing the IDs of the nodes in the topology"""
+        if self.topology.graph is None:
+            return np.arange(self.topology.num_nodes(), dtype=np.int64)
+        return np.array(self.topology.graph.nodes(), dtype=np.int64)
+
+    def _update_batched(self, events):
+        """Carry out the given number of events in conflict-aware batches
+
+        Events are drawn and processed in chunks.  Within a chunk, an event
+        is independent if no other event of the chunk targets its node or one
+        of its neighbors.  Independent events commute with every other event
+        of the chunk, so they are applied first, all at once, and the rest
+        are then applied one at a time in their original order.  Each event
+        is given the same random number either way, so the result equals
+        that of applying the events of the chunk sequentially.
+
+        Parameters:
+
+        *events*
+            The number of events to carry out
+
+        """
+
+        adj = self.topology.adjacency
+        kernel = self._cell_class.update_state_batch
+        rng = self._np_random
+
+        for start in range(0, events, self.batch_size):
+            k = min(self.batch_size, events - start)
+            chunk = self._node_ids[rng.randint(0, len(self._node_ids), size=k)]
+            draws = rng.random_sample(k)
+
+            # Count the events of the chunk that touch each event's closed
+            # neighborhood.  Only the event itself means it is independent.
+            targeted = np.bincount(chunk, minlength=len(adj))
+            (neighbors, owners) = adj.gather(chunk)
+            touches = targeted[chunk] + np.bincount(owners,
+                                                     weights=targeted[neighbors],
+                                                     minlength=k)
+            independent = touches == 1
+
+            kernel(self, chunk[independent], draws[independent])
+            for i in np.flatnonzero(~independent):
+                kernel(self, chunk[i:i+1], draws[i:i+1])
+
+    def record_transitions(self, fromtypes, totypes):
+        """Update the cell type counts and transition counts for many Cells at
+        once.  This is the array counterpart of update_type_count.
+
+        Parameters:
+
+        *fromtypes*
+            Array of the types of the Cells prior to being updated
+        *totypes*
+            Array of the types of the Cells after being updated
+
+        """
+
+        changed = np.flatnonzero(fromtypes != totypes)
+        if len(changed) == 0:
+            return
+
+        num_types = self._cell_class.max_types
+        pairs = fromtypes[changed].astype(np.intp) * num_types + totypes[changed]
+        counts = np.bincount(pairs, minlength=num_types * num_types)
+
+        for pair in np.flatnonzero(counts):
+            (fromtype, totype) = divmod(int(pair), num_types)
+            count = int(counts[pair])
+
+            type_count = self.experiment.data['population']['type_count']
+            if len(type_count) <= totype:
+                type_count.extend([0] * (1 + totype - len(type_count)))
+            type_count[fromtype] -= count
+            type_count[totype] += count
+
+            self.experiment.data['population']['transitions'][fromtype][totype] += count
 
     def teardown(self):
         """Perform teardown at the end of an experiment"""
@@ -196,7 +673,7 @@ class Population(object):
 
         """
 
-        return self.topology.node_distance(src.id, dest.id)
+        return self.topology.node_distance(src.node, dest.node)
 
     def add_cell(self, cell=None, neighbors=[], coords=None):
         """Add a Cell of the appropriate type to the population and connect it
@@ -213,12 +690,19 @@ class Population(object):
             this tuple must match the number of dimensions represented in the
             topology.  If none are supplied, the origin (0,..,0) will be used.
 
+        The new node's ID is chosen by the topology, which reuses the IDs of
+        removed nodes (see Topology.new_node_id).  Only the neighbor lists
+        kept by the new Cell and its neighbors are updated.  The new Cell is
+        returned.
+
         """
 
-        neighbor_ids = []
-        [neighbor_ids.append(n.id) for n in neighbors]
+        if self.state is not None:
+            raise ConfigurationError("Population: add_cell is not supported with array_state")
+
+        neighbor_ids = [n.node for n in neighbors]
 
-        new_id = max(self.topology.graph.nodes()) + 1
+        new_id = self.topology.new_node_id()
 
         try:
             self.topology.add_node(id=new_id, neighbors=neighbor_ids, coords=coords)
@@ -226,13 +710,25 @@ class Population(object):
             # Perhaps a different exception would make more sense
             raise NonExistentNodeError(new_id)
 
-        if not Cell:
+        if not cell:
             cell = self._cell_class(experiment=self.experiment,
-                                    population=self, id=new_id)
+                                    population=self, node=new_id)
         else:
-            cell.id = new_id
+            cell.node = new_id
+
+        self.topology.graph.node[new_id]['cell'] = cell
+        if new_id >= len(self._cells):
+            self._cells.extend([None] * (1 + new_id - len(self._cells)))
+        self._cells[new_id] = cell
+
+        if self._neighbor_lists:
+            cell.update_neighbors()
+        if not self.topology.resample_neighbors:
+            for n in cell.neighbors:
+                if n is not cell and n._neighbors is not None:
+                    n._neighbors.append(cell)
 
-        self.topology.graph.node[n]['cell'] = cell
+        return cell
 
     def remove_cell(self, cell):
         """Remove the given Cell from the Population and its corresponding
@@ -243,12 +739,27 @@ class Population(object):
         *cell*
             The Cell object to be removed
 
+        Only the neighbor lists kept by the Cell's neighbors are updated.
+        The node's ID may be reused by a Cell added later.
+
         """
 
+        if self.topology.resample_neighbors:
+            neighbors = []
+        else:
+            neighbors = cell.neighbors
+
         try:
-            self.topology.remove_node(cell.id)
+            self.topology.remove_node(cell.node)
         except NonExistentNodeError as err:
             print("Error removing Cell: {e}".format(e=err))
+            return
+
+        self._cells[cell.node] = None
+        for n in neighbors:
+            if n is not cell and n._neighbors is not None:
+                n._neighbors.remove(cell)
+        cell.neighbors = []
 
     def connect_cells(self, src, dest):
         """Connect two Cells in the Population
@@ -270,7 +781,7 @@ class Population(object):
         """
 
         try:
-            self.topology.add_edge(src.id, dest.id)
+            src.add_neighbor(dest)
         except NonExistentNodeError as err:
             print("Error connecting Cells: {e}".format(e=err))
 
@@ -291,14 +802,194 @@ class Population(object):
         """
 
         try:
-            self.topology.remove_edge(src.id, dest.id)
+            src.remove_neighbor(dest)
         except NonExistentEdgeError as err:
             print("Error disconnecting Cells: {e}".format(e=err))
 
     def get_cell_id(self):
         """Return a unique ID to be used for a Cell"""
-        return self.cell_id_manager.next()
+        return next(self.cell_id_manager)
 
     def get_neighbors(self, cell):
         """Return a list of the neighbors for the given cell"""
-        return [self.topology.graph.node[n]['cell'] for n in self.topology.get_neighbors(cell.node)]
+        cells = self._cells
+        return [cells[n] for n in self.topology.get_neighbors(cell.node)]
+
+    def get_cell(self, node):
+        """Return the Cell object residing in the given node, or None if the
+        Population is run without Cell objects
+
+        Parameters:
+
+        *node*
+            The ID of the node
+
+        """
+
+        if self.topology.graph is None:
+            return None
+        return self.topology.graph.node[node].get('cell')
+
+    def get_cell_type(self, node):
+        """Return the type of the Cell residing in the given node.  This works
+        whether or not Cell objects are used.
+
+        Parameters:
+
+        *node*
+            The ID of the node
+
+        """
+
+        if self.state:
+            return self.state.get('type', node)
+        else:
+            return self.topology.graph.node[node]['cell'].type
+
+
+class CellState(object):
+    """Store the state of the Cells in a Population in contiguous typed arrays
+    indexed by node ID.  This avoids the overhead of per-Cell objects and
+    attribute lookups for large populations.
+
+    Properties:
+
+    types
+        An integer array containing the type of the Cell in each node
+    attributes
+        A dict mapping the name of each numeric attribute declared by the Cell
+        type (see Cell.state_attributes) to an array holding its value at each
+        node
+    params
+        A dict of parameters shared by all Cells, as returned by the Cell
+        type's setup_state method
+
+    """
+
+    def __init__(self, size, cell_class):
+        """Initialize a CellState object
+
+        Parameters:
+
+        *size*
+            The number of nodes to allocate state for
+        *cell_class*
+            A reference to the Cell type whose state is stored
+
+        """
+
+        if np is None:
+            raise ConfigurationError("Population array_state requires NumPy")
+
+        if cell_class.max_types < 128:
+            type_dtype = np.int8
+        else:
+            type_dtype = np.int32
+
+        self.types = np.zeros(size, dtype=type_dtype)
+        self.attributes = {}
+        for (name, dtype) in cell_class.state_attributes.items():
+            self.attributes[name] = np.zeros(size, dtype=dtype)
+
+        self.params = {}
+        self.next = None
+
+    def __len__(self):
+        """Return the number of nodes for which state is allocated"""
+        return len(self.types)
+
+    def array(self, name):
+        """Return the array storing the given attribute ('type' for the Cell
+        types)"""
+        if name == 'type':
+            return self.types
+        else:
+            return self.attributes[name]
+
+    def get(self, name, node):
+        """Get the value of an attribute at the given node as a Python
+        number"""
+        return self.array(name)[node].item()
+
+    def set(self, name, node, value):
+        """Set the value of an attribute at the given node.  During a
+        synchronous step, the value is written to the next generation."""
+        if self.next is not None:
+            self.next[name][node] = value
+        else:
+            self.array(name)[node] = value
+
+    def begin_step(self):
+        """Begin a synchronous step.  Until end_step is called, values are
+        read from the current generation and written to a copy of it."""
+        self.next = {'type': self.types.copy()}
+        for name in self.attributes:
+            self.next[name] = self.attributes[name].copy()
+
+    def end_step(self):
+        """End a synchronous step, making the written copy current"""
+        self.types = self.next.pop('type')
+        self.attributes.update(self.next)
+        self.next = None
+
+    def resize(self, size):
+        """Grow the arrays so that they can hold the state of at least the
+        given number of nodes.  Capacity is doubled to amortize the cost of
+        repeated growth.
+
+        Parameters:
+
+        *size*
+            The number of nodes that must fit
+
+        """
+
+        if size <= len(self.types):
+            return
+
+        size = max(size, 2 * len(self.types))
+        self.types = _grow(self.types, size)
+        for name in self.attributes:
+            self.attributes[name] = _grow(self.attributes[name], size)
+
+    def view_class(self, cell_class):
+        """Return a subclass of the given Cell type whose type and declared
+        attributes are read from and written to this CellState.  Objects of
+        this class are thin views onto the arrays.
+
+        Parameters:
+
+        *cell_class*
+            A reference to the Cell type
+
+        """
+
+        attrs = {'type': StateAttribute(self, 'type')}
+        for name in cell_class.state_attributes:
+            attrs[name] = StateAttribute(self, name)
+
+        return type(cell_class.__name__, (cell_class,), attrs)
+
+
+class StateAttribute(object):
+    """Descriptor mapping an attribute of a Cell object onto the value stored
+    for its node in a CellState"""
+
+    def __init__(self, state, name):
+        self.state = state
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self.state.get(self.name, obj.node)
+
+    def __set__(self, obj, value):
+        self.state.set(self.name, obj.node, value)
+
+
+def _grow(a, size):
+    """Return a copy of array a extended with zeros to the given size"""
+    b = np.zeros(size, dtype=a.dtype)
+    b[:len(a)] = a
+    return b
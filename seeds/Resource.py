@@ -11,12 +11,24 @@ used in SEEDS.  Specific implementations can be seen in plugins/resource.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
+import array
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Experiment import *
 from seeds.PluginManager import *
 from seeds.ResourceCell import *
 from seeds.SEEDSError import *
 from seeds.Topology import *
-from seeds.utils.sampling import sample_with_replacement
+from seeds.utils.sampling import sample_with_replacement, BlockSampler
 
 
 class Resource(object):
@@ -30,11 +42,25 @@ class Resource(object):
         A reference to the Experiment in which the Resource exists
     name
         Unique name of the resource
+    rng
+        The Resource's own stream of pseudorandom numbers
     type
         The type of the resource (specific ResourceCell class to be used)
     topology
-        The Topology object that stores the graph of ResourceCell (nodes)
-        objects and the flow between them (edges)
+        The Topology object whose graph defines the flow between the
+        ResourceCells (edges).  It may be shared with the Population and
+        other Resources (see Experiment.get_topology).
+    cells
+        A list containing the ResourceCell object at each node, indexed by
+        node ID
+    field
+        A ResourceField holding the level of the resource and the declared
+        parameters (see ResourceCell.field_attributes) at every node in
+        contiguous arrays.  The ResourceCells are views onto it, and its
+        level array is also stored as the 'levels' entry of the resource's
+        data in the Experiment.
+    settings
+        A ConfigSection containing the typed settings for this Resource
     _resource_type_class
         A reference to the proper class for the configured ResourceCell
 
@@ -53,8 +79,65 @@ class Resource(object):
     For more information about the properties of this resource, see the
     documentation for NormalResource.
 
+    Configuration options common to all Resources:
+
+        name
+            The name of the resource (default: the label)
+        type
+            The ResourceCell type to use (default: NormalResource)
+        available
+            Whether or not the resource is initially available (default: True)
+        topology
+            The Topology type (and optional label) defining the flow between
+            ResourceCells (e.g., MooreTopology:grid)
+        events_per_epoch
+            The number of ResourceCell updates to perform each epoch
+            (default: the number of nodes in the topology)
+        update_mode
+            How the events of each epoch are carried out.  With 'random',
+            each event updates one randomly-selected ResourceCell, in turn.
+            With 'field', the whole resource is advanced at once by the
+            ResourceCell type's update_field method using array operations.
+            Each node is then updated the mean number of times,
+            events_per_epoch / N, unless sample_events is set.  Field updates
+            require NumPy and a ResourceCell type that supports them.  The
+            ResourceCell type may define its parameters differently in field
+            mode (e.g., NormalResource's diffusion), so the two modes do not
+            give the same levels for the same settings.  (default: random)
+        sample_events
+            In field mode, whether to draw the number of updates of each node
+            as the random mode would (events_per_epoch nodes chosen with
+            replacement), so that the field mode reproduces the variation in
+            the number of updates.  It does not change how much each update
+            does.  (default: False)
+        dtype
+            The type used to store resource levels, 'float64' or 'float32'
+            (default: float64)
+        coupling_interval
+            The number of epochs between updates of the Resource.  At each
+            update, the Resource is advanced by all of the epochs since the
+            last one at once (see advance), which is much cheaper than
+            stepping through them for ResourceCell types that can fast
+            forward.  The population sees the levels only as of the last
+            update.  (default: 1)
+        defer_unavailable
+            Whether or not to stop updating the Resource while it is
+            unavailable.  The epochs that pass are made up at once when it
+            becomes available again.  (default: False)
+
     """
 
+    config_schema = {'name': (str, None),
+                     'type': (str, 'NormalResource'),
+                     'available': (bool, True),
+                     'topology': (str, None),
+                     'events_per_epoch': (int, None),
+                     'update_mode': (str, 'random'),
+                     'sample_events': (bool, False),
+                     'dtype': (str, 'float64'),
+                     'coupling_interval': (int, 1),
+                     'defer_unavailable': (bool, False)}
+
     def __init__(self, experiment, label=None):
         """ Initialize a Resource object
 
@@ -75,20 +158,30 @@ class Resource(object):
             raise ConfigurationError("Must supply a Resource label")
 
         self.config_section = "Resource:{label}".format(label=self.label)
-        self.name = self.experiment.config.get(self.config_section, "name",
-                                               default=self.label)
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+
+        if self.settings.name is None:
+            self.name = self.label
+        else:
+            self.name = self.settings.name
 
         self.experiment.data['resources'][self.name] = {}
 
-        self.type = self.experiment.config.get(self.config_section, 'type',
-                                               default='NormalResource')
-        self.available = self.experiment.config.getboolean(self.config_section,
-                                                           'available',
-                                                           default=True)
+        self.rng = self.experiment.rng.spawn(self.config_section)
+
+        # Nodes to update are drawn in blocks when NumPy is available
+        if np is not None:
+            self._sampler = BlockSampler(seed=self.rng.numpy_seed())
+        else:
+            self._sampler = None
+
+        self.type = self.settings.type
+        self.available = self.settings.available
 
         self._resource_type_class = self.experiment.plugin_manager.get_resource_cell_plugin(self.type)
 
-        topology_raw = self.experiment.config.get(self.config_section, 'topology')
+        topology_raw = self.settings.topology
         parsed = topology_raw.split(':')
 
         topology_type = parsed[0]
@@ -101,25 +194,56 @@ class Resource(object):
         if topology_type != "MooreTopology" and topology_type != "VonNeumannTopology":
             raise ConfigurationError("SEEDS does not currently support Resource topology types other than MooreTopology or VonNeumannTopology")
 
-        tref = self.experiment.plugin_manager.get_topology_plugin(topology_type)
-        self.topology = tref(experiment=self.experiment,
-                             label=top_label)
+        self.topology = self.experiment.get_topology(topology_type, label=top_label)
+
+        if self.topology.graph is None:
+            raise ConfigurationError("Resource topologies must have a graph (implicit lattices are not supported)")
 
-        self.experiment.data['resources'][self.name]['levels'] = [0] * self.topology.num_nodes()
+        # The levels and parameters of all ResourceCells are stored in
+        # arrays indexed by node ID, and the ResourceCells are views onto them
+        size = max(self.topology.graph.nodes()) + 1
+        self.field = ResourceField(size, self._resource_type_class,
+                                   dtype=self.settings.dtype)
+        self._view_class = self.field.view_class(self._resource_type_class)
+        self.experiment.data['resources'][self.name]['levels'] = self.field.levels
 
-        # For each node in the topology, create a ResourceCell object
+        # For each node in the topology, create a ResourceCell object.  These
+        # are kept by the Resource rather than in the graph, since the
+        # topology may be shared.
+        self.cells = [None] * size
         for n in self.topology.graph.nodes():
-            self.topology.graph.node[n]['resource'] = self._resource_type_class(experiment=self.experiment,
-                                                                                resource=self, 
-                                                                                config_section=self.config_section,
-                                                                                id=n)
+            self.cells[n] = self._view_class(experiment=self.experiment,
+                                             resource=self,
+                                             config_section=self.config_section,
+                                             id=n)
 
         # Now that all ResourceCells are present, set their neighbors list.
         # This can help speed updates up when the topology changes less than
-        # once per epoch.  This benefit is most significant for fixed
-        # topologies.
-        for n in self.topology.graph.nodes():
-            self.topology.graph.node[n]['resource'].update_neighbors()
+        # once per epoch.  Topologies with an adjacency index do not need
+        # these lists, since ResourceCells read their neighbors from the
+        # index when needed (see ResourceCell.neighbors).
+        if self.topology.adjacency is None:
+            for n in self.topology.graph.nodes():
+                self.cells[n].update_neighbors()
+
+        self.update_mode = self.settings.update_mode
+        if self.update_mode == 'field':
+            if np is None:
+                raise ConfigurationError("Resource: field update_mode requires NumPy")
+            elif self._resource_type_class.update_field is None:
+                raise ConfigurationError("Resource: ResourceCell type does not support field update_mode")
+        elif self.update_mode != 'random':
+            raise ConfigurationError("Resource: unknown update_mode '{mode}'".format(mode=self.update_mode))
+
+        # The epoch and parameters for which levels were last computed by the
+        # ResourceCell type's epoch_levels method
+        self._evaluated = None
+
+        if self.settings.coupling_interval < 1:
+            raise ConfigurationError("Resource: coupling_interval must be at least 1")
+
+        # The number of epochs that have passed since the last update
+        self._pending = 0
 
     def __str__(self):
         """Produce a string to be used when a Resource object is printed"""
@@ -135,17 +259,172 @@ class Resource(object):
         updated, on average, each epoch.  This number can be changed by setting
         the events_per_epoch parameter in the Experiment section of the
         configuration.
+
+        In field mode, the ResourceCell type's update_field method instead
+        updates every node at once (see update_mode).  ResourceCell types
+        whose levels depend only on the epoch (see
+        ResourceCell.epoch_levels) are evaluated once per epoch for each
+        distinct set of parameters, regardless of the update mode.
+
+        If coupling_interval is greater than 1 (or the Resource is
+        unavailable and defer_unavailable is set), most calls only count the
+        epoch, and the Resource is then advanced by all of the epochs that
+        have passed at once (see advance).
                                                                         
         """
 
-        events = self.experiment.config.getint(section=self.config_section,
-                                               name='events_per_epoch',
-                                               default=len(self.topology.graph))
-        nodes_to_update = sample_with_replacement(self.topology.graph.nodes(), k=events)
-        [self.topology.graph.node[n]['resource'].update() for n in nodes_to_update]
+        epochs = self.due()
+        if epochs == 1:
+            self.step()
+        elif epochs > 1:
+            self.advance(epochs)
+
+    def due(self):
+        """Count an epoch and return the number of epochs by which the
+        Resource should be advanced now, which is 0 if it is not yet time to
+        update it (see coupling_interval and defer_unavailable)"""
+
+        self._pending += 1
+        if self._pending < self.settings.coupling_interval:
+            return 0
+        elif self.settings.defer_unavailable and not self.available:
+            return 0
+
+        epochs = self._pending
+        self._pending = 0
+        return epochs
+
+    def step(self):
+        """Advance the Resource by one epoch (see update)"""
+
+        if self._resource_type_class.epoch_levels is not None and np is not None:
+            self._update_epoch()
+            return
+
+        if self.update_mode == 'field':
+            self._resource_type_class.update_field(self, self.field_counts())
+            return
+
+        events = self.settings.events_per_epoch
+        if events is None:
+            events = len(self.topology.graph)
+
+        nodes_to_update = sample_with_replacement(self.topology.graph.nodes(), k=events,
+                                                  sampler=self._sampler)
+        [self.cells[n].update() for n in nodes_to_update]
+
+    def advance(self, epochs):
+        """Advance the Resource by the given number of epochs at once
+
+        ResourceCell types whose levels depend only on the epoch are simply
+        evaluated at the current epoch.  In field mode, the ResourceCell
+        type's advance_field method is used if it has one, and otherwise
+        the Resource is stepped through each epoch.  In random mode, the
+        events of all of the epochs are carried out in one sequence, which
+        is what stepping through them would do.
+
+        Parameters:
+
+        *epochs*
+            The number of epochs
+
+        """
+
+        if self._resource_type_class.epoch_levels is not None and np is not None:
+            self._update_epoch()
+        elif self.update_mode == 'field':
+            if self._resource_type_class.advance_field is not None:
+                self._resource_type_class.advance_field(self, epochs)
+            else:
+                for i in range(epochs):
+                    self._resource_type_class.update_field(self, self.field_counts())
+        else:
+            events = self.settings.events_per_epoch
+            if events is None:
+                events = len(self.topology.graph)
+
+            nodes_to_update = sample_with_replacement(self.topology.graph.nodes(),
+                                                      k=events * epochs,
+                                                      sampler=self._sampler)
+            [self.cells[n].update() for n in nodes_to_update]
+
+    def field_counts(self, epochs=1):
+        """Return an array containing the number of times each node is
+        treated as updated in field mode (see update_mode) during the given
+        number of epochs
+
+        Parameters:
+
+        *epochs*
+            The number of epochs (default: 1)
+
+        """
+
+        events = self.settings.events_per_epoch
+        if events is None:
+            events = len(self.topology.graph)
+        events *= epochs
+
+        num_nodes = len(self.cells)
+        if self.settings.sample_events:
+            chosen = self._sampler.indices(num_nodes, events)
+            counts = np.bincount(chosen, minlength=num_nodes).astype(np.float64)
+        else:
+            counts = np.full(num_nodes, float(events) / num_nodes)
+
+        return counts
+
+    def array_backed(self):
+        """Return whether or not the Resource is updated entirely by array
+        operations, rather than by a Python loop over ResourceCells"""
+        if self._resource_type_class.epoch_levels is not None and np is not None:
+            return True
+        return self.update_mode == 'field'
+
+    def fusion_key(self):
+        """Return a key shared by the Resources whose updates can be fused
+        with this one's (see ResourceStage), or None if they can not be.
+        Resources can be fused when they are field-updated by the same
+        ResourceCell type supporting update_fields, on the same topology,
+        with the same level dtype and update schedule.
+
+        """
+
+        if self._resource_type_class.epoch_levels is not None and np is not None:
+            return None
+        elif self.update_mode != 'field' or self._resource_type_class.update_fields is None:
+            return None
+        return (self._resource_type_class, id(self.topology),
+                self.field.levels.dtype.str, self.settings.coupling_interval,
+                self.settings.defer_unavailable)
+
+    def _update_epoch(self):
+        """Set the level of every node from the ResourceCell type's
+        epoch_levels method.  The nodes are grouped by their parameters (see
+        ResourceField.groups), so the levels are computed once per group
+        and then copied to the nodes.  Nothing is done if the levels have
+        already been computed for this epoch and these parameters.
+
+        """
+
+        epoch = self.experiment.epoch
+        if self._evaluated == (epoch, self.field.version):
+            return
+
+        (params, inverse) = self.field.groups(self._resource_type_class.field_attributes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = self._resource_type_class.epoch_levels(epoch, params)
+
+        if len(values) == 1:
+            self.field.levels.fill(values[0])
+        else:
+            self.field.levels[:] = values[inverse]
+
+        self._evaluated = (epoch, self.field.version)
 
     def teardown(self):
-        """Perform any necessary cleanup at the end of the experiment"""
+        """Perform any necessary cleanup at the end of the experiment.  Note
+        that a shared topology is torn down by each of its users."""
         self.topology.teardown()
 
     def add_resourcetype(self, rt=None, neighbors=[]):
@@ -168,20 +447,27 @@ class Resource(object):
         neighbor_ids = []
         [neighbor_ids.append(n.id) for n in neighbors]
 
-        new_id = max(self.topology.graph.nodes()) + 1
+        new_id = self.topology.new_node_id()
 
         try:
             self.topology.add_node(id=new_id, neighbors=neighbor_ids)
         except NonExistentNodeError as err:
             print("Error adding ResourceCell: {e}".format(e=err))
 
+        if new_id >= len(self.cells):
+            self.cells.extend([None] * (1 + new_id - len(self.cells)))
+            self.field.resize(new_id + 1)
+            self.experiment.data['resources'][self.name]['levels'] = self.field.levels
+
         if not rt:
-            rt = self._resource_type_class(experiment=self.experiment,
-                                           resource=self,
-                                           config_section=self.config_section,
-                                           id=new_id)
- 
-        self.topology.graph.node[n]['resource'] = rt
+            rt = self._view_class(experiment=self.experiment,
+                                  resource=self,
+                                  config_section=self.config_section,
+                                  id=new_id)
+        else:
+            rt.id = new_id
+
+        self.cells[new_id] = rt
 
     def remove_resourcetype(self, rt):
         """Remove the given ResourceCell from the Resource and its
@@ -195,7 +481,9 @@ class Resource(object):
         """
 
         try:
-            self.topology.remove_node(cell.id)
+            self.topology.remove_node(rt.id)
+            self.cells[rt.id] = None
+            self.field.clear(rt.id)
         except NonExistentNodeError as err:
             print("Error removing ResourceCell: {e}".format(e=err))
 
@@ -244,7 +532,7 @@ class Resource(object):
         except NonExistentEdgeError as err:
             print("Error disconnecting ResourceCells: {e}".format(e=err))
 
-    def resourcetpye_distance(self, src, dest):
+    def resourcetype_distance(self, src, dest):
         """Calculate the Cartesian distance between two ResourceCells
 
         Properties:
@@ -257,3 +545,288 @@ class Resource(object):
         """
 
         return self.topology.node_distance(src.id, dest.id)
+
+
+class ResourceField(object):
+    """Store the level of a Resource and the declared parameters of its
+    ResourceCells in contiguous arrays indexed by node ID.  Without NumPy,
+    the arrays are Python arrays (see the array module).
+
+    Properties:
+
+    levels
+        A float64 (or float32) array containing the level of the resource at
+        each node
+    attributes
+        A dict mapping the name of each parameter declared by the
+        ResourceCell type (see ResourceCell.field_attributes) to a float64
+        array holding its value at each node
+    version
+        A counter that is incremented whenever a parameter is set through
+        set (or a ResourceCell view) or the arrays are resized.  Code that
+        writes to the parameter arrays directly should increment it.
+
+    """
+
+    def __init__(self, size, resource_class, dtype='float64'):
+        """Initialize a ResourceField object
+
+        Parameters:
+
+        *size*
+            The number of nodes to allocate storage for
+        *resource_class*
+            A reference to the ResourceCell type whose values are stored
+        *dtype*
+            The type of the level array, 'float64' or 'float32'
+
+        """
+
+        if dtype not in ('float64', 'float32'):
+            raise ConfigurationError("Resource: dtype must be float64 or float32")
+
+        self.levels = self._zeros(size, dtype)
+        self.attributes = {}
+        for name in resource_class.field_attributes:
+            self.attributes[name] = self._zeros(size, 'float64')
+
+        self.version = 0
+        self._groups = None
+
+    @staticmethod
+    def _zeros(size, dtype):
+        """Return an array of the given size and type filled with zeros"""
+        if np is not None:
+            return np.zeros(size, dtype=dtype)
+        return array.array({'float64': 'd', 'float32': 'f'}[dtype], [0.0]) * size
+
+    def __len__(self):
+        """Return the number of nodes for which storage is allocated"""
+        return len(self.levels)
+
+    def array(self, name):
+        """Return the array storing the given parameter ('level' for the
+        levels)"""
+        if name == 'level':
+            return self.levels
+        else:
+            return self.attributes[name]
+
+    def get(self, name, node):
+        """Get the value of a parameter at the given node as a Python float"""
+        return float(self.array(name)[node])
+
+    def set(self, name, node, value):
+        """Set the value of a parameter at the given node"""
+        self.array(name)[node] = value
+        if name != 'level':
+            self.version += 1
+
+    def clear(self, node):
+        """Set the level and parameters at the given node to zero"""
+        self.levels[node] = 0
+        for name in self.attributes:
+            self.attributes[name][node] = 0
+        self.version += 1
+
+    def resize(self, size):
+        """Grow the arrays so that they can hold the values of at least the
+        given number of nodes.  Capacity is doubled to amortize the cost of
+        repeated growth.  The arrays are replaced, so any references to them
+        must be updated.
+
+        Parameters:
+
+        *size*
+            The number of nodes that must fit
+
+        """
+
+        if size <= len(self.levels):
+            return
+
+        size = max(size, 2 * len(self.levels))
+        self.levels = _grow(self.levels, size)
+        for name in self.attributes:
+            self.attributes[name] = _grow(self.attributes[name], size)
+        self.version += 1
+
+    def groups(self, names):
+        """Return a pair (params, inverse) of arrays grouping the nodes by
+        the values of the given parameters.  params has one row for each
+        distinct combination of values (one column per parameter), and
+        inverse gives the row of each node.  The grouping is kept until a
+        parameter changes (see version).  Requires NumPy.
+
+        Parameters:
+
+        *names*
+            A list of the names of the parameters
+
+        """
+
+        if self._groups is None or self._groups[0] != (self.version, tuple(names)):
+            if names:
+                columns = np.column_stack([self.attributes[n] for n in names])
+                (params, inverse) = np.unique(columns, axis=0, return_inverse=True)
+            else:
+                params = np.zeros((1, 0))
+                inverse = np.zeros(len(self.levels), dtype=np.intp)
+            self._groups = ((self.version, tuple(names)), params, inverse.ravel())
+
+        return self._groups[1:]
+
+    def view_class(self, resource_class):
+        """Return a subclass of the given ResourceCell type whose level and
+        declared parameters are read from and written to this ResourceField.
+        Objects of this class are thin views onto the arrays.
+
+        Parameters:
+
+        *resource_class*
+            A reference to the ResourceCell type
+
+        """
+
+        attrs = {'level': FieldAttribute(self, 'level')}
+        for name in resource_class.field_attributes:
+            attrs[name] = FieldAttribute(self, name)
+
+        return type(resource_class.__name__, (resource_class,), attrs)
+
+
+class FieldAttribute(object):
+    """Descriptor mapping an attribute of a ResourceCell object onto the value
+    stored for its node in a ResourceField"""
+
+    def __init__(self, field, name):
+        self.field = field
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self.field.get(self.name, obj.id)
+
+    def __set__(self, obj, value):
+        self.field.set(self.name, obj.id, value)
+
+
+def _grow(a, size):
+    """Return a copy of array a extended with zeros to the given size"""
+    if np is None:
+        return a + array.array(a.typecode, [0.0]) * (size - len(a))
+
+    b = np.zeros(size, dtype=a.dtype)
+    b[:len(a)] = a
+    return b
+
+
+class ResourceStage(object):
+    """Update all of the Resources of an Experiment once per epoch.
+
+    Resources that can be fused (see Resource.fusion_key), e.g., several
+    field-updated NormalResources on one grid, are grouped and advanced
+    together by their ResourceCell type's update_fields method in a single
+    pass over stacked arrays.  Other Resources are updated on their own.
+
+    With more than one thread, the groups of Resources that are updated by
+    array operations (see Resource.array_backed) are run in a thread pool.
+    NumPy releases the GIL during these operations, so independent groups
+    proceed in parallel.  The remaining Resources, whose updates loop over
+    ResourceCells in Python, are updated in the calling thread meanwhile.
+    The Resources of a group only touch their own arrays and random
+    streams, so the results do not depend on the number of threads.
+
+    Properties:
+
+    groups
+        A list of the groups of Resources, each a list updated together, in
+        the order in which the Resources were given
+    threads
+        The number of threads used to update the groups
+    executor
+        A ThreadPoolExecutor used to update the groups, or None if the
+        updates are run in the calling thread
+
+    """
+
+    def __init__(self, resources, threads=1):
+        """Initialize a ResourceStage
+
+        Parameters:
+
+        *resources*
+            A list of the Resources to update
+        *threads*
+            The number of threads to use (default: 1)
+
+        """
+
+        if threads < 1:
+            raise ConfigurationError("Experiment: resource_threads must be at least 1")
+
+        self.threads = threads
+        self.groups = []
+
+        fused = {}
+        for r in resources:
+            key = r.fusion_key()
+            if key is None:
+                self.groups.append([r])
+            elif key in fused:
+                fused[key].append(r)
+            else:
+                fused[key] = [r]
+                self.groups.append(fused[key])
+
+        parallel = [g for g in self.groups if g[0].array_backed()]
+        if threads > 1 and len(parallel) > 1 and ThreadPoolExecutor is not None:
+            self.executor = ThreadPoolExecutor(max_workers=threads)
+        else:
+            self.executor = None
+
+    @staticmethod
+    def update_group(group):
+        """Update a group of Resources for one epoch
+
+        Parameters:
+
+        *group*
+            A list of Resources, which must share a fusion key if there is
+            more than one
+
+        """
+
+        if len(group) == 1:
+            group[0].update()
+            return
+
+        # The Resources of the group share a schedule, but availability can
+        # differ
+        epochs = [r.due() for r in group]
+        stepped = [r for (r, e) in zip(group, epochs) if e == 1]
+        if stepped:
+            counts = np.vstack([r.field_counts() for r in stepped])
+            group[0]._resource_type_class.update_fields(stepped, counts)
+
+        [r.advance(e) for (r, e) in zip(group, epochs) if e > 1]
+
+    def update(self):
+        """Update every Resource for one epoch"""
+        if self.executor is None:
+            [self.update_group(g) for g in self.groups]
+            return
+
+        futures = [self.executor.submit(self.update_group, g)
+                   for g in self.groups if g[0].array_backed()]
+        [self.update_group(g) for g in self.groups if not g[0].array_backed()]
+
+        # Wait for the threads, raising any exception that occurred in them
+        [f.result() for f in futures]
+
+    def teardown(self):
+        """Shut down the thread pool, if any"""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
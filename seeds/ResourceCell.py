@@ -26,23 +26,73 @@ class ResourceCell(object):
     *id*
         A unique ID for this ResourceCell object
     *level*
-        The level of the Resource at this point
+        The level of the Resource at this point.  ResourceCells created by a
+        Resource read and write it in the Resource's level array (see
+        Resource.field).
     *resource*
         A reference to the Resource to which this ResourceCell belongs
     *neighbors*
         A list of neighbor ResourceCells.  A neighbor is a ResourceCell that
-        exists on an adjacent node.
+        exists on an adjacent node.  If the ResourceCell keeps no list of its
+        own (see update_neighbors), as on topologies with an adjacency index,
+        the list is read from the topology each time it is accessed.
+    *settings*
+        A ConfigSection containing the typed settings for this ResourceCell,
+        compiled from its configuration section using config_schema (see
+        Config.compile).  All ResourceCells of a Resource share one.
+    *update_field*
+        An optional class method update_field(resource, counts) that advances
+        every ResourceCell of the given Resource by one epoch at once, as if
+        the ResourceCell at node n were updated counts[n] times (counts is
+        an array of floats, which need not be whole numbers).  It is used by
+        the Resource's field update mode.  (default: None, field updates not
+        supported)
+    *update_fields*
+        An optional class method update_fields(resources, counts) that does
+        what update_field does for several Resources of this type that
+        share a topology, in one pass.  counts is a 2-D array with one row
+        per Resource.  It is used to fuse the updates of such Resources (see
+        ResourceStage).  (default: None)
+    *advance_field*
+        An optional class method advance_field(resource, epochs) that does
+        what the given number of successive calls to update_field would do,
+        for Resources that are updated less often than every epoch (see
+        Resource.advance).  (default: None, update_field is called once per
+        epoch)
+    *field_attributes*
+        A list of the names of any numeric per-node parameters (e.g.,
+        inflow).  Like the level, these are stored in arrays indexed by node
+        ID in the Resource's ResourceField, so that update_field and
+        analytics can read them without visiting each ResourceCell.
+    *epoch_levels*
+        An optional class method epoch_levels(epoch, params) for types whose
+        level depends only on the epoch and the node's field_attributes.
+        params is a 2-D array with one row for each distinct combination of
+        parameter values (columns in the order of field_attributes), and an
+        array of the level for each row at the given epoch is returned.
+        When it is provided, the Resource evaluates it once per epoch and
+        copies the results into its level array instead of updating
+        sampled ResourceCells (see Resource.update).  (default: None)
 
     """
 
+    config_schema = {}
+    field_attributes = []
+    update_field = None
+    update_fields = None
+    advance_field = None
+    epoch_levels = None
+
     def __init__(self, experiment, resource, config_section, id):
         """Initialize the ResourceCell object"""
         self.experiment = experiment
         self.resource = resource
+        self.id = id
         self.level = 0.0
         self.config_section = config_section
-        self.id = id
-        self.neighbors = []
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+        self._neighbors = None
 
     def __str__(self):
         """Return a string for when a ResourceCell object is printed"""
@@ -65,13 +115,27 @@ class ResourceCell(object):
         """Perform any necessary cleanup at the end of the experiment"""
         pass
 
+    @property
+    def neighbors(self):
+        if self._neighbors is None:
+            return self.get_neighbors()
+        return self._neighbors
+
+    @neighbors.setter
+    def neighbors(self, neighbors):
+        self._neighbors = neighbors
+
     def get_neighbors(self):
         """Get a list of neighboring ResourceCells"""
-        return [self.resource.topology.graph.node[n]['resource'] for n in self.resource.topology.get_neighbors(self.id)]
+        cells = self.resource.cells
+        return [cells[n] for n in self.resource.topology.get_neighbors(self.id)]
 
     def update_neighbors(self):
-        """Update the list of neighboring ResourceCells"""
-        self.neighbors = self.get_neighbors()
+        """Update the list of neighboring ResourceCells kept by the
+        ResourceCell.  ResourceCells that have never called this keep no
+        list, and read their neighbors from the topology whenever they are
+        needed."""
+        self._neighbors = self.get_neighbors()
 
     def coords(self):
         """Get the coordinates of the ResourceCell in space"""
@@ -12,13 +12,24 @@ can potentially interact with each other.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly, Luis Zaman"
 
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
 from math import sqrt
 
 import networkx as nx
 from networkx.exception import *
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.SEEDSError import *
-from seeds.utils.geometry import euclidean_distance
+from seeds.utils.geometry import CellList, euclidean_distance
 
 
 class Topology(object):
@@ -30,7 +41,10 @@ class Topology(object):
             configuration for this Topology.  This will likely need to be set
             by each Topology plugin (e.g., CartesianTopology:label1).
         graph
-            A NetworkX graph object defining the connections between cells.
+            A NetworkX graph object defining the connections between cells,
+            or None if the topology is implicit.  The nodes of implicit
+            topologies are numbered 0..N-1, and their neighbors are computed
+            by the adjacency index (e.g., LatticeIndex) when needed.
         experiment
             Reference to the Experiment in which it exists
         periodic
@@ -38,9 +52,74 @@ class Topology(object):
             the edges of the space (default: False)
         label
             A unique label identifying a configuration for the Topology
+        adjacency
+            A frozen AdjacencyIndex (compressed sparse row) compiled from the
+            graph (see compile_adjacency), or None if one has not been
+            compiled.  Any change to the graph discards the index.  Implicit
+            topologies set this to an index that computes neighbors without
+            a graph.
+        positions
+            An (N, 2) array containing the coordinates of each node when they
+            are not stored in the graph (e.g., when the Topology was loaded
+            from the cache without a graph), or None
+        resample_neighbors
+            Whether or not get_neighbors returns a new random set of
+            neighbors each time it is called (e.g., WellMixedTopology).  If
+            so, Cells do not keep lists of their neighbors, and a fresh set is
+            drawn for each update instead. (default: False)
+        rng
+            The Topology's own stream of pseudorandom numbers.  Topologies of
+            the same type and label get the same stream, so a configuration
+            always produces the same graph for a given experiment seed.  The
+            stream is spawned from the Experiment's topology_rng, so if the
+            topology_seed option is set in the [Experiment] section, the graph
+            depends only on it and not on the experiment seed.
+        settings
+            A ConfigSection containing the typed settings for this Topology.
+            Topology plugins compile this from their configuration section
+            using config_schema once config_section is set (see
+            Config.compile).
+
+    Topologies whose graphs change during an experiment (e.g., in birth and
+    death or rewiring models) reuse the IDs of removed nodes (see
+    new_node_id), and keep an index of their edges up to date so that one
+    can be chosen at random in constant time (see random_edge).
+
+    Topologies whose graphs are fixed once built can be cached on disk by
+    setting the topology_cache option in the [Experiment] section to a
+    directory.  The adjacency index and node coordinates are stored there in
+    NumPy's binary format, keyed by the Topology's type, version, settings,
+    and random stream (see load_cache and save_cache).  Later runs with the
+    same key, including other replicates running at the same time, map the
+    stored arrays into memory read-only rather than building the topology
+    again, so the operating system can share their pages among processes.
+    Only the arrays are shared, though.  A Topology that has a graph (the
+    default for MooreTopology, VonNeumannTopology, and CartesianTopology)
+    builds a NetworkX graph from them in each process, which takes memory
+    in proportion to the number of edges.  For these, the cache saves the
+    time spent building the topology but not memory.  To share the memory
+    among replicates, use a Topology without a graph: CartesianTopology
+    with graph = False, or an implicit lattice, which stores nothing per
+    node and needs no cache.
 
     """
 
+    config_schema = {}
+
+    # Whether or not the graph is built without random numbers, in which
+    # case it is cached independently of the random stream
+    deterministic = False
+
+    # Whether or not every node is equally likely to interact with every
+    # other node, in which case the Population can be represented only by its
+    # type counts (see Population's count update_mode)
+    well_mixed = False
+
+    # Whether or not the graph can not change once built, in which case one
+    # instance may be shared by the Population and any Resources configured
+    # with identical settings (see Experiment.get_topology)
+    shareable = False
+
     def __init__(self, experiment, label=None):
         """Initialize a Topology object.
 
@@ -60,14 +139,25 @@ class Topology(object):
         self.periodic = False
         self.label = label
         self.config_section = None
+        self.settings = None
+        self.rng = self.experiment.topology_rng.spawn("Topology", type(self).__name__, label)
         self.dimensions = 0
+        self.adjacency = None
+        self.positions = None
+        self.resample_neighbors = False
+        self._spatial_index = None
+        self._distance_tables = None
+        self._edge_index = None
+        self._free_ids = []
+        self._next_id = None
 
     def __str__(self):
         """Return a string to be used when a Topology object is printed"""
         return 'SEEDS Topology'
 
     def get_neighbors(self, node):
-        """Get a list of neighboring nodes (ids) for a given node
+        """Get the neighboring nodes (ids) for a given node.  This is a list,
+        or a read-only array when the adjacency index is compiled.
 
         Parameters:
         
@@ -76,10 +166,358 @@ class Topology(object):
         
         """
 
+        if self.adjacency is not None:
+            return self.adjacency.neighbors(node)
         return self.graph.neighbors(node)
 
+    def nodes(self):
+        """Get a list of the IDs of the nodes in the topology"""
+        if self.graph is None:
+            return range(len(self.adjacency))
+        return self.graph.nodes()
+
+    def has_node(self, node):
+        """Return whether or not the given node exists in the topology
+
+        Parameters:
+
+        *node*
+            The ID of the node in question
+
+        """
+
+        if self.graph is None:
+            return 0 <= node < len(self.adjacency)
+        return self.graph.has_node(node)
+
+    def has_edge(self, src, dest):
+        """Return whether or not the given two nodes are connected
+
+        Parameters:
+
+        *src*
+            The ID of the first node
+        *dest*
+            The ID of the second node
+
+        """
+
+        if self.graph is None:
+            return dest in self.adjacency.neighbors(src)
+        return self.graph.has_edge(src, dest)
+
+    def node_coords(self, node):
+        """Get the coordinates of the given node
+
+        Parameters:
+
+        *node*
+            The ID of the node in question
+
+        """
+
+        if self.graph is not None:
+            return self.graph.node[node]['coords']
+        elif self.positions is not None:
+            return tuple(self.positions[node].tolist())
+        return self.adjacency.coords(node)
+
+    def compile_adjacency(self):
+        """Compile a frozen compressed sparse row (CSR) index of the graph,
+        which is then used to answer neighbor queries.  If NumPy is not
+        available, no index is compiled and the graph is used directly.
+
+        Topologies whose graphs do not change after construction should call
+        this once the graph is built, so that neighbor queries are answered
+        from the index rather than the graph.  Cells and ResourceCells on
+        such topologies read their neighbors from the index when needed
+        rather than keeping lists of them.
+
+        """
+
+        if np is None:
+            self.adjacency = None
+        else:
+            self.adjacency = AdjacencyIndex(self.graph)
+
+        return self.adjacency
+
+    def neighbor_sum(self, values):
+        """Return an array containing, for every node, the sum of the given
+        per-node values over that node's neighbors.  This requires an
+        adjacency index (see compile_adjacency).  Lattice topologies may
+        override this with a faster method.
+
+        Parameters:
+
+        *values*
+            An array of values indexed by node ID
+
+        """
+
+        if self.adjacency is None:
+            raise SEEDSError("neighbor_sum requires a compiled adjacency index")
+
+        return self.adjacency.neighbor_sum(values)
+
+    def diffuse(self, values, rates):
+        """Return an array containing the given per-node values after one
+        step of diffusion.  Each node sends rates[n] / (degree + 1) of its
+        excess over each neighbor with a lower value to that neighbor.  All
+        transfers are computed from the values at the start of the step, and
+        every amount sent is received, so the total is conserved.  Since a
+        node sends at most a fraction rates[n] of its value, values stay
+        nonnegative for rates in [0, 1].  Several fields may be diffused
+        together by passing 2-D arrays with one row per field.  This
+        requires an adjacency index (see compile_adjacency).  Lattice
+        topologies may override this with a faster method.
+
+        Parameters:
+
+        *values*
+            An array of values indexed by node ID
+        *rates*
+            An array of the fraction of each node's excess that it sends
+
+        """
+
+        if self.adjacency is None:
+            raise SEEDSError("diffuse requires a compiled adjacency index")
+        elif np.ndim(values) == 2:
+            return np.vstack([self.diffuse(v, r) for (v, r) in zip(values, rates)])
+
+        adj = self.adjacency
+        num_nodes = len(adj)
+        (neighbors, owners) = adj.gather(np.arange(num_nodes))
+        share = rates / (adj.degrees() + 1.0)
+
+        excess = values[owners] - values[neighbors]
+        flux = np.where(excess > 0, excess * share[owners], 0.0)
+
+        return (values - np.bincount(owners, weights=flux, minlength=num_nodes)
+                + np.bincount(neighbors, weights=flux, minlength=num_nodes))
+
+    def diffusion_spectrum(self, rate):
+        """Return the eigenvalues of one step of diffusion (see diffuse)
+        with the same rate at every node, indexed like the array returned by
+        NumPy's rfft2 for the grid of node values, or None if the topology
+        is not a periodic lattice.  On a periodic lattice in which every
+        node has the same degree, such diffusion is linear (each edge moves
+        share * difference from the higher node to the lower), and its
+        eigenvectors are the Fourier modes, so many steps can be taken at
+        once in the frequency domain.
+
+        Parameters:
+
+        *rate*
+            The fraction of each node's excess that it sends
+
+        """
+
+        return None
+
+    def _node_coordinates(self, nodes):
+        """Return an array containing the coordinates of each of the given
+        nodes (an array of node IDs), one row per node"""
+        if self.graph is not None:
+            coords = [self.graph.node[n]['coords'] for n in nodes.tolist()]
+            return np.array(coords, dtype=np.float64).reshape(len(nodes), -1)
+        elif self.positions is not None:
+            return np.asarray(self.positions)[nodes]
+        return np.column_stack(self.adjacency.coords(nodes))
+
+    def distance_tables(self):
+        """Return a tuple (distances, weights, cumulative, starts) of arrays.
+        The first three have one entry per edge of the adjacency index, in
+        the order given by adjacency.gather for all nodes.  distances holds
+        the distance along each edge, and weights the inverse of that
+        distance as a fraction of the total for the edge's node.  cumulative
+        holds, for each edge, its node's ID plus the sum of the weights of
+        the node's edges up to and including it, so that it increases across
+        the whole array (see distance_weighted_positions).  starts holds the
+        position of the first edge of each node.
+
+        The tables are computed the first time they are needed and kept
+        until the adjacency index changes, so they suit topologies that do
+        not change.  An adjacency index is required.
+
+        """
+
+        adj = self.adjacency
+        if adj is None:
+            raise SEEDSError("distance_tables requires an adjacency index")
+        elif self._distance_tables is not None and self._distance_tables[0] is adj:
+            return self._distance_tables[1:]
+
+        nodes = np.arange(len(adj))
+        (neighbors, owners) = adj.gather(nodes)
+        degrees = adj.degrees(nodes)
+
+        # Only nodes with edges need coordinates, which also skips any gaps
+        # in the node IDs
+        linked = np.flatnonzero(degrees)
+        coords = np.zeros((len(adj), max(1, self.dimensions)))
+        if len(linked) > 0:
+            found = self._node_coordinates(linked)
+            coords = np.zeros((len(adj), found.shape[1]))
+            coords[linked] = found
+
+        delta = np.abs(coords[owners] - coords[neighbors])
+        if self.periodic:
+            delta = np.minimum(delta, 1 - delta)
+        distances = np.sqrt((delta * delta).sum(axis=1))
+
+        # A very small number is added to prevent division by zero, as in
+        # RPSCell
+        inverse = 1.0 / (distances + pow(1.02, -10000))
+        totals = np.bincount(owners, weights=inverse, minlength=len(adj))
+        weights = inverse / totals[owners]
+
+        starts = np.cumsum(degrees) - degrees
+        running = np.cumsum(weights)
+        before = np.where(starts > 0, running[starts - 1], 0.0)
+        cumulative = owners + (running - before[owners])
+
+        self._distance_tables = (adj, distances, weights, cumulative, starts)
+        return self._distance_tables[1:]
+
+    def distance_weighted_positions(self, nodes, draws):
+        """Choose a neighbor of each of the given nodes with probability
+        proportional to the inverse of its distance, and return its position
+        in the node's list of neighbors (see adjacency.select).  Each choice
+        uses one uniform random number and a binary search of the node's
+        cumulative weights (see distance_tables), so it takes O(log k) time
+        for a node with k neighbors.  Each node must have a neighbor.
+
+        Parameters:
+
+        *nodes*
+            A node ID or an array of node IDs
+        *draws*
+            A uniform random number in [0, 1) or an array with one per node
+
+        """
+
+        (distances, weights, cumulative, starts) = self.distance_tables()
+        positions = np.searchsorted(cumulative, nodes + draws, side='right') - starts[nodes]
+        return np.clip(positions, 0, self.adjacency.degrees(nodes) - 1)
+
+    def cache_key(self):
+        """Return a string identifying the graph this Topology builds: a hash
+        of its type, version, settings, and random stream (unless the
+        Topology is deterministic)"""
+
+        settings = {}
+        if self.settings is not None:
+            settings = dict((name, getattr(self.settings, name)) for name in self.settings._schema)
+
+        if self.deterministic:
+            stream = None
+        else:
+            stream = [self.rng.entropy, self.rng.spawn_key]
+
+        ident = json.dumps([type(self).__name__, getattr(self, '__version__', None),
+                            sorted(settings.items()), stream], default=str)
+        return hashlib.sha256(ident.encode('utf-8')).hexdigest()
+
+    def _cache_path(self):
+        """Return the directory in which this Topology is cached, or None if
+        caching is not used"""
+
+        cache_dir = self.experiment.settings.topology_cache
+        if not cache_dir or np is None:
+            return None
+
+        return os.path.join(cache_dir, "{t}-{k}".format(t=type(self).__name__,
+                                                         k=self.cache_key()[:32]))
+
+    def load_cache(self, graph=True):
+        """Load the Topology from the cache, if it has been stored there.
+        The adjacency index and coordinates are memory-mapped read-only.
+        Return whether or not the Topology was loaded.
+
+        Parameters:
+
+        *graph*
+            Whether or not to also build a NetworkX graph from the cached
+            data.  If not, the graph is None, and node coordinates are read
+            from the cached array.  The graph is built separately in each
+            process and is not shared, so only graph-less Topologies keep
+            their memory use per replicate small.
+
+        """
+
+        path = self._cache_path()
+        if path is None or not os.path.isdir(path):
+            return False
+
+        # Plain array views of the mapped files avoid the overhead of the
+        # memmap class on every operation
+        arrays = {}
+        for name in ['indptr', 'indices', 'coords']:
+            mapped = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+            arrays[name] = mapped.view(np.ndarray)
+
+        self.positions = arrays['coords']
+        self.adjacency = AdjacencyIndex.from_arrays(arrays['indptr'],
+                                                    arrays['indices'])
+
+        if graph:
+            G = nx.Graph()
+            G.add_nodes_from(range(len(self.adjacency)))
+            for (n, c) in enumerate(self.positions.tolist()):
+                G.node[n]['coords'] = tuple(c)
+
+            # Add each edge once, from its lower-numbered node
+            rows = np.repeat(np.arange(len(self.adjacency)), self.adjacency.degrees())
+            lower = rows < self.adjacency.indices
+            G.add_edges_from(zip(rows[lower].tolist(),
+                                 self.adjacency.indices[lower].tolist()))
+            self.graph = G
+        else:
+            self.graph = None
+
+        return True
+
+    def save_cache(self):
+        """Store the Topology's adjacency index and node coordinates in the
+        cache (if one is configured).  Topologies whose node IDs are not
+        numbered 0..N-1, and those without an AdjacencyIndex, are not
+        cached.  The data are written to a temporary directory and then
+        moved into place, so concurrent runs never see partial data.
+
+        """
+
+        path = self._cache_path()
+        if (path is None or os.path.isdir(path) or
+            not isinstance(self.adjacency, AdjacencyIndex) or
+            len(self.adjacency) != self.num_nodes()):
+            return
+
+        coords = np.array([self.node_coords(n) for n in range(len(self.adjacency))],
+                          dtype=np.float64)
+
+        cache_dir = os.path.dirname(path)
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                pass
+
+        tmp = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            np.save(os.path.join(tmp, 'indptr.npy'), self.adjacency.indptr)
+            np.save(os.path.join(tmp, 'indices.npy'), self.adjacency.indices)
+            np.save(os.path.join(tmp, 'coords.npy'), coords)
+            os.rename(tmp, path)
+        except OSError:
+            # Another process stored the same Topology first
+            shutil.rmtree(tmp, ignore_errors=True)
+
     def num_nodes(self):
         """Get the number of nodes in the topology"""
+        if self.graph is None:
+            return len(self.adjacency)
         return len(self.graph)
 
     def teardown(self):
@@ -101,13 +539,13 @@ class Topology(object):
 
         """
 
-        if src not in self.graph.nodes():
+        if not self.has_node(src):
             raise NonExistentNodeError(src)
-        elif dest not in self.graph.nodes():
+        elif not self.has_node(dest):
             raise NonExistentNodeError(dest)
 
-        return euclidean_distance(self.graph.node[src]['coords'],
-                                  self.graph.node[dest]['coords'],
+        return euclidean_distance(self.node_coords(src),
+                                  self.node_coords(dest),
                                   periodic=self.periodic)
 
     def add_node(self, id=None, neighbors=[], coords=None):
@@ -128,8 +566,8 @@ class Topology(object):
         Parameters:
 
         id
-            The ID to use for the new node.  If none is specified, the
-            ID used will be the current largest ID in the graph plus 1.
+            The ID to use for the new node.  If none is specified, one is
+            chosen by new_node_id.
         neighbors
             An optional list of node IDs that will be connected to the new node
             via an edge. NonExistentNodeError will be raised if any of these
@@ -142,20 +580,24 @@ class Topology(object):
 
         """
 
-        if not id:
-            id = max(self.graph.nodes()) + 1
+        if id is None:
+            id = self.new_node_id()
         if not coords:
             coords = tuple([0] * self.dimensions)
         elif self.dimensions != len(coords):
             raise SEEDSError("Cell coordinates do not match topology dimensions")
 
+        self.adjacency = None
+        self._spatial_index = None
         self.graph.add_node(id)
         self.graph.node[id]['coords'] = coords
 
         for n in neighbors:
-            if n not in self.graph.nodes():
+            if not self.graph.has_node(n):
                 raise NonExistentNodeError(n)
             self.graph.add_edge(id, n)
+            if self._edge_index is not None:
+                self._edge_index.add(id, n)
 
         self.size = len(self.graph)
 
@@ -174,12 +616,20 @@ class Topology(object):
 
         """
 
-        try:
-            self.graph.remove_node(id)
-            self.size = len(self.graph)
-        except NetworkXError as err:
+        if not self.graph.has_node(id):
             raise NonExistentNodeError(id)
 
+        self.adjacency = None
+        self._spatial_index = None
+
+        if self._edge_index is not None:
+            for n in self.graph.neighbors(id):
+                self._edge_index.remove(id, n)
+
+        self.graph.remove_node(id)
+        self.size = len(self.graph)
+        self._free_ids.append(id)
+
     def add_edge(self, src, dest):
         """Add an edge between the given two nodes.  Although NetworkX creates
         new node(s) when non-existent nodes are given as arguments to
@@ -195,12 +645,15 @@ class Topology(object):
 
         """
 
-        if src not in self.graph.nodes():
+        if not self.graph.has_node(src):
             raise NonExistentNodeError(src)
-        elif dest not in self.graph.nodes():
+        elif not self.graph.has_node(dest):
             raise NonExistentNodeError(dest)
         else:
+            self.adjacency = None
             self.graph.add_edge(src, dest)
+            if self._edge_index is not None:
+                self._edge_index.add(src, dest)
 
     def remove_edge(self, src, dest):
         """Remove the edge between the given two nodes.  This method will raise
@@ -216,11 +669,139 @@ class Topology(object):
 
         """
 
+        self.adjacency = None
+
         try:
             self.graph.remove_edge(src, dest)
         except NetworkXError as err:
             raise NonExistentEdgeError(src, dest)
 
+        if self._edge_index is not None:
+            self._edge_index.remove(src, dest)
+
+    def new_node_id(self):
+        """Return an unused ID for a new node.  The IDs of removed nodes are
+        kept in a free list and reused first (most recently removed first),
+        so the IDs stay dense and no search of the graph is needed.
+        Otherwise, the ID is one greater than the largest ID handed out so
+        far.
+
+        """
+
+        while self._free_ids:
+            id = self._free_ids.pop()
+            if not self.has_node(id):
+                return id
+
+        if self._next_id is None:
+            self._next_id = max(self.nodes()) + 1 if self.num_nodes() > 0 else 0
+
+        # Nodes may also have been added with explicit IDs
+        while self.has_node(self._next_id):
+            self._next_id += 1
+
+        self._next_id += 1
+        return self._next_id - 1
+
+    def edge_index(self):
+        """Return an EdgeIndex of the edges in the graph, which is built the
+        first time it is needed and then kept up to date as nodes and edges
+        are added and removed
+
+        """
+
+        if self._edge_index is None:
+            if self.graph is not None:
+                self._edge_index = EdgeIndex(self.graph.edges())
+            else:
+                (neighbors, owners) = self.adjacency.gather(np.arange(len(self.adjacency)))
+                lower = owners <= neighbors
+                self._edge_index = EdgeIndex(zip(owners[lower].tolist(),
+                                                 neighbors[lower].tolist()))
+
+        return self._edge_index
+
+    def random_edge(self, rng=None):
+        """Return an edge of the graph as a (src, dest) tuple, chosen
+        uniformly at random in O(1) time (see EdgeIndex).  If the graph has
+        no edges, None is returned.
+
+        Parameters:
+
+        rng
+            The random number generator to use (default: the Topology's)
+
+        """
+
+        return self.edge_index().choice(rng or self.rng)
+
+    def spatial_index(self):
+        """Return a CellList over the coordinates of the nodes, which is
+        built the first time it is needed and kept until nodes are added or
+        removed.  Point i of the index is node spatial_nodes()[i].  Only
+        two-dimensional topologies are supported.  Requires NumPy.
+
+        """
+
+        if self._spatial_index is None:
+            if np is None:
+                raise SEEDSError("Spatial queries require NumPy")
+            elif self.dimensions != 2:
+                raise SEEDSError("Spatial queries are only supported in 2 dimensions")
+
+            nodes = np.fromiter(self.nodes(), dtype=np.int64)
+            if self.graph is not None:
+                coords = np.array([self.graph.node[n]['coords'] for n in nodes.tolist()],
+                                  dtype=np.float64).reshape(-1, 2)
+            elif self.positions is not None:
+                coords = np.asarray(self.positions)[nodes]
+            else:
+                coords = np.column_stack(self.adjacency.coords(nodes))
+
+            self._spatial_nodes = nodes
+            self._spatial_index = CellList(coords, 0, periodic=self.periodic)
+
+        return self._spatial_index
+
+    def spatial_nodes(self):
+        """Return an array of the node IDs of the points in the spatial
+        index"""
+        self.spatial_index()
+        return self._spatial_nodes
+
+    def nearest_nodes(self, coords, n=1):
+        """Return an (M, n) array containing the IDs of the n nodes nearest
+        to each of M points, ordered by distance (see CellList.nearest).
+        Distances wrap around if the topology is periodic.
+
+        Parameters:
+
+        coords
+            An (M, 2) array of the coordinates of the points
+        n
+            The number of nearest nodes to find for each point
+
+        """
+
+        index = self.spatial_index()
+        return self._spatial_nodes[index.nearest(coords, k=n)]
+
+    def nodes_within(self, coords, radius):
+        """Return a list containing, for each of the given points, an array
+        of the IDs of the nodes within the given distance of it
+
+        Parameters:
+
+        coords
+            An (M, 2) array of the coordinates of the points
+        radius
+            The distance within which to find nodes
+
+        """
+
+        index = self.spatial_index()
+        return [self._spatial_nodes[found] for found in index.within(coords, radius)]
+
     def get_nearest_node(self, coords, n=1):
         """Return a list of  the node(s) located nearest the given coordinates
 
@@ -237,17 +818,652 @@ class Topology(object):
         if not coords or len(coords) < 1:
             return
         elif n < 1:
-            # TODO: print warning or throw an exception 
-            # TODO: search the KD tree for the coordinates
             return
 
+        return self.nearest_nodes([coords], n=n)[0].tolist()
+
     def relabel_nodes(self):
         """Relabel the nodes in the graph so that labels are numbers from
         0..len(graph) with no gaps.  This is done, for instance, after
         disconnected nodes have been removed from the graph.
         """
-        M = {}
-        for i in range(len(self.graph.nodes())):
-            M[self.graph.nodes()[i]] = i
-        
+        M = dict((n, i) for (i, n) in enumerate(self.graph.nodes()))
+
         self.graph = nx.relabel_nodes(self.graph, M)
+        self.adjacency = None
+        self._spatial_index = None
+        self._edge_index = None
+        self._free_ids = []
+        self._next_id = None
+
+
+class EdgeIndex(object):
+    """The edges of a graph kept in a list, along with a dict mapping each
+    edge to its position in the list.  An edge is removed by moving the last
+    edge into its place, so edges can be added, removed, and chosen
+    uniformly at random in O(1) time.  This suits models that rewire the
+    graph many times per epoch.
+
+    Each edge is stored once, as a (src, dest) tuple with src <= dest.
+
+    Properties:
+
+    edges
+        A list of the edges, in no particular order
+    positions
+        A dict mapping each edge to its position in edges
+
+    """
+
+    def __init__(self, edges=[]):
+        """Initialize an EdgeIndex
+
+        Parameters:
+
+        *edges*
+            An iterable of (src, dest) tuples
+
+        """
+
+        self.edges = []
+        self.positions = {}
+
+        for (src, dest) in edges:
+            self.add(src, dest)
+
+    def __len__(self):
+        """Return the number of edges in the index"""
+        return len(self.edges)
+
+    def __contains__(self, edge):
+        """Return whether or not the given (src, dest) edge is in the index"""
+        return self.key(*edge) in self.positions
+
+    @staticmethod
+    def key(src, dest):
+        """Return the tuple under which the given edge is stored"""
+        if dest < src:
+            return (dest, src)
+        return (src, dest)
+
+    def add(self, src, dest):
+        """Add an edge to the index.  Adding an edge that is already present
+        has no effect.
+
+        Parameters:
+
+        *src*
+            The ID of the first node
+        *dest*
+            The ID of the second node
+
+        """
+
+        edge = self.key(src, dest)
+        if edge not in self.positions:
+            self.positions[edge] = len(self.edges)
+            self.edges.append(edge)
+
+    def remove(self, src, dest):
+        """Remove an edge from the index.  If the edge is not present,
+        NonExistentEdgeError is raised.
+
+        Parameters:
+
+        *src*
+            The ID of the first node
+        *dest*
+            The ID of the second node
+
+        """
+
+        try:
+            position = self.positions.pop(self.key(src, dest))
+        except KeyError:
+            raise NonExistentEdgeError(src, dest)
+
+        last = self.edges.pop()
+        if position < len(self.edges):
+            self.edges[position] = last
+            self.positions[last] = position
+
+    def choice(self, rng):
+        """Return an edge chosen uniformly at random, or None if the index
+        is empty
+
+        Parameters:
+
+        *rng*
+            The random number generator to use
+
+        """
+
+        if not self.edges:
+            return None
+        return self.edges[int(rng.random() * len(self.edges))]
+
+
+class AdjacencyIndex(object):
+    """A frozen compressed sparse row (CSR) index of the edges in a graph.
+    The neighbors of node i are indices[indptr[i]:indptr[i+1]], in the same
+    order as given by the graph.  Node IDs must be non-negative integers.
+
+    Properties:
+
+    indptr
+        An int32 array of length num_nodes+1 containing the offset into
+        indices at which the neighbors of each node begin
+    indices
+        An int32 array containing the neighbors of every node
+    num_nodes
+        The number of rows in the index (the largest node ID plus one)
+
+    """
+
+    def __init__(self, graph):
+        """Compile an AdjacencyIndex from a NetworkX graph
+
+        Parameters:
+
+        *graph*
+            The graph to be indexed
+
+        """
+
+        adj = graph.adj
+
+        if len(adj) > 0:
+            self.num_nodes = max(adj) + 1
+        else:
+            self.num_nodes = 0
+
+        rows = [adj.get(n, {}) for n in range(self.num_nodes)]
+        degrees = np.fromiter((len(r) for r in rows), dtype=np.int32,
+                              count=self.num_nodes)
+
+        self.indptr = np.zeros(self.num_nodes + 1, dtype=np.int32)
+        np.cumsum(degrees, out=self.indptr[1:])
+        self.indices = np.fromiter(itertools.chain.from_iterable(rows),
+                                   dtype=np.int32, count=int(self.indptr[-1]))
+
+        self.indptr.flags.writeable = False
+        self.indices.flags.writeable = False
+
+    @classmethod
+    def from_edges(cls, num_nodes, edges):
+        """Compile an AdjacencyIndex directly from a list of edges, without
+        building a graph.  The neighbors of each node are given in the order
+        in which its edges appear, as they would be in a graph built by
+        adding the edges in order.
+
+        Parameters:
+
+        *num_nodes*
+            The number of nodes (node IDs are 0..num_nodes-1)
+        *edges*
+            An (E, 2) array of the pairs of connected nodes
+
+        """
+
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        src = np.concatenate((edges[:, 0], edges[:, 1]))
+        dest = np.concatenate((edges[:, 1], edges[:, 0]))
+        position = np.tile(np.arange(len(edges)), 2)
+        order = np.lexsort((position, src))
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+        return cls.from_arrays(indptr, dest[order].astype(np.int32))
+
+    @classmethod
+    def from_arrays(cls, indptr, indices):
+        """Create an AdjacencyIndex from existing indptr and indices arrays
+        (e.g., arrays memory-mapped from a file)
+
+        Parameters:
+
+        *indptr*
+            The offsets at which the neighbors of each node begin
+        *indices*
+            The neighbors of every node
+
+        """
+
+        index = cls.__new__(cls)
+        index.num_nodes = len(indptr) - 1
+        index.indptr = indptr
+        index.indices = indices
+
+        if index.indptr.flags.writeable:
+            index.indptr.flags.writeable = False
+        if index.indices.flags.writeable:
+            index.indices.flags.writeable = False
+        return index
+
+    def __len__(self):
+        """Return the number of rows (nodes) in the index"""
+        return self.num_nodes
+
+    def neighbors(self, node):
+        """Return a (read-only) array view of the neighbors of the given node
+
+        Parameters:
+
+        *node*
+            The ID of the node whose neighbors to get
+
+        """
+
+        return self.indices[self.indptr[node]:self.indptr[node+1]]
+
+    def gather(self, nodes):
+        """Return the neighbors of many nodes at once as a pair of arrays
+        (neighbors, owners), where owners[i] is the position in nodes of the
+        node whose neighbor is neighbors[i]
+
+        Parameters:
+
+        *nodes*
+            An array of node IDs
+
+        """
+
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        owners = np.repeat(np.arange(len(nodes)), counts)
+        offsets = np.cumsum(counts) - counts
+        positions = np.arange(len(owners)) - offsets[owners] + starts[owners]
+        return (self.indices[positions], owners)
+
+    def select(self, nodes, positions):
+        """Return an array containing, for each of the given nodes, the
+        neighbor at the given position in its list of neighbors
+
+        Parameters:
+
+        *nodes*
+            An array of node IDs
+        *positions*
+            An array of positions, each less than the degree of its node
+
+        """
+
+        return self.indices[self.indptr[nodes] + positions]
+
+    def degree(self, node):
+        """Return the number of neighbors of the given node"""
+        return int(self.indptr[node+1] - self.indptr[node])
+
+    def degrees(self, nodes=None):
+        """Return an array containing the degree of each of the given nodes
+        (default: every node)"""
+        if nodes is None:
+            return np.diff(self.indptr)
+        return self.indptr[nodes + 1] - self.indptr[nodes]
+
+    def num_edges(self):
+        """Return the number of (undirected) edges in the index"""
+        return len(self.indices) // 2
+
+    def neighbor_sum(self, values):
+        """Return an array containing, for every node, the sum of the given
+        per-node values over that node's neighbors
+
+        Parameters:
+
+        *values*
+            An array of values indexed by node ID
+
+        """
+
+        rows = np.repeat(np.arange(self.num_nodes), self.degrees())
+        return np.bincount(rows, weights=values[self.indices],
+                           minlength=self.num_nodes)
+
+
+def lattice_edges(rows, columns, offsets, periodic=False):
+    """Return a list of the edges of a lattice of rows x columns nodes in
+    which each node is connected to the nodes at the given (row, column)
+    offsets from it.  Nodes are numbered in row-major order.  The edges are
+    listed node by node, and for each node in the order of the offsets, so
+    that a graph built by adding them in order lists the neighbors of each
+    node as LatticeIndex does.  Each edge is listed from both of its nodes.
+    With periodic boundaries, offsets that wrap onto the node itself are
+    skipped.  When NumPy is available, the edges are computed with one array
+    operation over the whole lattice.
+
+    Parameters:
+
+    *rows*
+        The number of rows in the lattice
+    *columns*
+        The number of columns in the lattice
+    *offsets*
+        A list of (row, column) offsets to the neighbors of a node
+    *periodic*
+        Whether or not the edges of the lattice wrap around
+
+    """
+
+    if np is None:
+        edges = []
+        for n in range(rows * columns):
+            (r, c) = divmod(n, columns)
+            for (dr, dc) in offsets:
+                (nr, nc) = (r + dr, c + dc)
+                if periodic:
+                    (nr, nc) = (nr % rows, nc % columns)
+                elif nr < 0 or nr >= rows or nc < 0 or nc >= columns:
+                    continue
+
+                if nr * columns + nc != n:
+                    edges.append([n, nr * columns + nc])
+        return edges
+
+    nodes = np.arange(rows * columns, dtype=np.int64)[:, np.newaxis]
+    r = nodes // columns + np.array([o[0] for o in offsets], dtype=np.int64)
+    c = nodes % columns + np.array([o[1] for o in offsets], dtype=np.int64)
+
+    if periodic:
+        r %= rows
+        c %= columns
+        valid = np.ones(r.shape, dtype=bool)
+    else:
+        valid = (r >= 0) & (r < rows) & (c >= 0) & (c < columns)
+
+    neighbors = r * columns + c
+    valid &= neighbors != nodes
+    sources = np.broadcast_to(nodes, neighbors.shape)
+
+    return np.column_stack((sources[valid], neighbors[valid])).tolist()
+
+
+def lattice_diffuse(values, rates, degrees, size, offsets, periodic=False):
+    """Return an array containing the given per-node values of a square
+    lattice after one step of diffusion, as described in Topology.diffuse.
+    The transfers are computed with one whole-lattice array operation per
+    offset rather than per edge.  With periodic boundaries, no offset may
+    wrap onto another.
+
+    Parameters:
+
+    *values*
+        An array of values indexed by node ID (in row-major order), or a 2-D
+        array with one row per field to diffuse them all together
+    *rates*
+        An array of the fraction of each node's excess that it sends, with
+        the same shape as values
+    *degrees*
+        An array of the number of neighbors of each node
+    *size*
+        The width and height of the lattice
+    *offsets*
+        A list of (row, column) offsets to the neighbors of a node
+    *periodic*
+        Whether or not the edges of the lattice wrap around
+
+    """
+
+    n = size
+    shape = np.shape(values)
+    grid = np.asarray(values, dtype=np.float64).reshape(-1, n, n)
+    share = np.asarray(rates).reshape(-1, n, n) / (np.asarray(degrees).reshape(n, n) + 1.0)
+    result = grid.copy()
+
+    for (dr, dc) in offsets:
+        if periodic:
+            excess = grid - np.roll(grid, (-dr, -dc), axis=(1, 2))
+            flux = share * np.maximum(excess, 0.0)
+            result -= flux
+            result += np.roll(flux, (dr, dc), axis=(1, 2))
+        else:
+            # Nodes whose neighbor at this offset is in the lattice, and
+            # those neighbors
+            src = (Ellipsis, slice(max(0, -dr), n - max(0, dr)), slice(max(0, -dc), n - max(0, dc)))
+            dest = (Ellipsis, slice(max(0, dr), n + min(0, dr)), slice(max(0, dc), n + min(0, dc)))
+            flux = share[src] * np.maximum(grid[src] - grid[dest], 0.0)
+            result[src] -= flux
+            result[dest] += flux
+
+    return result.reshape(shape)
+
+
+def lattice_diffusion_spectrum(size, offsets, rate):
+    """Return the eigenvalues of one step of diffusion (see
+    Topology.diffuse) with the given rate at every node of a periodic square
+    lattice, indexed like the array returned by NumPy's rfft2 for the grid
+    of node values.  No offset may wrap onto another.
+
+    Parameters:
+
+    *size*
+        The width and height of the lattice
+    *offsets*
+        A list of (row, column) offsets to the neighbors of a node
+    *rate*
+        The fraction of each node's excess that it sends
+
+    """
+
+    share = rate / (len(offsets) + 1.0)
+    rows = np.fft.fftfreq(size)[:, np.newaxis]
+    cols = np.fft.rfftfreq(size)[np.newaxis, :]
+
+    # Each step adds share * (value of neighbor - own value) for every
+    # neighbor, whose shift multiplies each Fourier mode by a phase.  The
+    # offsets are symmetric, so the phases sum to a real number.
+    total = np.zeros((size, size // 2 + 1))
+    for (dr, dc) in offsets:
+        total += np.cos(2 * np.pi * (rows * dr + cols * dc))
+
+    return 1.0 + share * (total - len(offsets))
+
+
+class LatticeIndex(object):
+    """An implicit index of the neighbors of the nodes in a square lattice.
+    Nothing is stored per node.  Instead, the neighbors of a node are
+    computed from its row and column and a fixed list of (row, column)
+    offsets, which defines the neighborhood (e.g., Moore or von Neumann).
+    LatticeIndex answers the same queries as AdjacencyIndex, so it can be
+    used in its place by lattice topologies that do not build a graph.
+
+    Node n is located at row n // size and column n % size.  The neighbors
+    of a node are given in the order in which a graph built by visiting the
+    nodes (and then the offsets) in order would list them.  Without periodic
+    boundaries, this is ascending order.
+
+    Properties:
+
+    size
+        The width and height of the lattice
+    periodic
+        Whether or not the edges of the lattice wrap around
+    row_offsets
+        An array containing the row offset of each neighbor
+    col_offsets
+        An array containing the column offset of each neighbor
+    num_nodes
+        The number of nodes in the lattice (size * size)
+
+    """
+
+    def __init__(self, size, offsets, periodic=False):
+        """Create a LatticeIndex
+
+        Parameters:
+
+        *size*
+            The width and height of the lattice
+        *offsets*
+            A list of (row, column) offsets to the neighbors of a node, in
+            row-major order.  (0, 0) must not be included.
+        *periodic*
+            Whether or not the edges of the lattice wrap around.  Offsets
+            may not wrap onto each other, so no offset may exceed
+            (size - 1) / 2 when the lattice is periodic.
+
+        """
+
+        self.size = size
+        self.periodic = periodic
+        self.num_nodes = size * size
+        self.row_offsets = np.array([o[0] for o in offsets], dtype=np.int64)
+        self.col_offsets = np.array([o[1] for o in offsets], dtype=np.int64)
+
+        if periodic and len(offsets) > 0:
+            reach = max(np.abs(self.row_offsets).max(), np.abs(self.col_offsets).max())
+            if 2 * reach + 1 > size:
+                raise SEEDSError("LatticeIndex: neighborhood wraps onto itself")
+
+    def __len__(self):
+        """Return the number of nodes in the lattice"""
+        return self.num_nodes
+
+    def _table(self, nodes):
+        """Return a pair (ids, valid) of arrays with one row for each of the
+        given nodes and one column for each offset.  ids holds the neighbor
+        IDs, and valid marks those that are in the lattice (None if all
+        are).
+
+        """
+
+        nodes = np.asarray(nodes, dtype=np.int64)
+        r = (nodes // self.size)[:, np.newaxis] + self.row_offsets
+        c = (nodes % self.size)[:, np.newaxis] + self.col_offsets
+
+        if self.periodic:
+            ids = (r % self.size) * self.size + (c % self.size)
+
+            # Smaller IDs come first in ascending order, followed by larger
+            # IDs in offset order
+            key = np.where(ids < nodes[:, np.newaxis], ids,
+                           self.num_nodes + np.arange(len(self.row_offsets)))
+            ids = np.take_along_axis(ids, np.argsort(key, axis=1, kind='stable'), axis=1)
+            return (ids, None)
+
+        valid = (r >= 0) & (r < self.size) & (c >= 0) & (c < self.size)
+        return (r * self.size + c, valid)
+
+    def neighbors(self, node):
+        """Return an array of the neighbors of the given node
+
+        Parameters:
+
+        *node*
+            The ID of the node whose neighbors to get
+
+        """
+
+        (ids, valid) = self._table([node])
+        if valid is None:
+            return ids[0]
+        return ids[0][valid[0]]
+
+    def gather(self, nodes):
+        """Return the neighbors of many nodes at once as a pair of arrays
+        (neighbors, owners), where owners[i] is the position in nodes of the
+        node whose neighbor is neighbors[i]
+
+        Parameters:
+
+        *nodes*
+            An array of node IDs
+
+        """
+
+        (ids, valid) = self._table(nodes)
+        if valid is None:
+            return (ids.ravel(), np.repeat(np.arange(len(ids)), ids.shape[1]))
+        return (ids[valid], np.nonzero(valid)[0])
+
+    def select(self, nodes, positions):
+        """Return an array containing, for each of the given nodes, the
+        neighbor at the given position in its list of neighbors
+
+        Parameters:
+
+        *nodes*
+            An array of node IDs
+        *positions*
+            An array of positions, each less than the degree of its node
+
+        """
+
+        (ids, valid) = self._table(nodes)
+        if valid is not None:
+            # Find the column of the valid entry at each position
+            positions = (np.cumsum(valid, axis=1) > positions[:, np.newaxis]).argmax(axis=1)
+        return ids[np.arange(len(ids)), positions]
+
+    def degree(self, node):
+        """Return the number of neighbors of the given node"""
+        return len(self.neighbors(node))
+
+    def degrees(self, nodes=None):
+        """Return an array containing the degree of each of the given nodes
+        (default: every node)"""
+
+        if nodes is not None:
+            (ids, valid) = self._table(nodes)
+            if valid is None:
+                return np.full(len(ids), ids.shape[1], dtype=np.int64)
+            return valid.sum(axis=1)
+
+        if self.periodic:
+            return np.full(self.num_nodes, len(self.row_offsets), dtype=np.int64)
+
+        # Count the offsets that stay in the lattice, one offset at a time
+        index = np.arange(self.size)
+        degrees = np.zeros((self.size, self.size), dtype=np.int64)
+        for (dr, dc) in zip(self.row_offsets, self.col_offsets):
+            rows = (index + dr >= 0) & (index + dr < self.size)
+            cols = (index + dc >= 0) & (index + dc < self.size)
+            degrees += rows[:, np.newaxis] & cols
+        return degrees.ravel()
+
+    def num_edges(self):
+        """Return the number of (undirected) edges in the lattice"""
+        if self.periodic:
+            return self.num_nodes * len(self.row_offsets) // 2
+
+        pairs = [max(0, self.size - abs(dr)) * max(0, self.size - abs(dc))
+                 for (dr, dc) in zip(self.row_offsets, self.col_offsets)]
+        return int(sum(pairs)) // 2
+
+    def neighbor_sum(self, values):
+        """Return an array containing, for every node, the sum of the given
+        per-node values over that node's neighbors.  The sum is computed
+        with one whole-lattice array operation per offset.
+
+        Parameters:
+
+        *values*
+            An array of values indexed by node ID
+
+        """
+
+        n = self.size
+        grid = np.asarray(values).reshape(n, n)
+        total = np.zeros((n, n))
+
+        for (dr, dc) in zip(self.row_offsets, self.col_offsets):
+            if self.periodic:
+                total += np.roll(grid, (-dr, -dc), axis=(0, 1))
+            else:
+                total[max(0, -dr):n - max(0, dr), max(0, -dc):n - max(0, dc)] += \
+                    grid[max(0, dr):n + min(0, dr), max(0, dc):n + min(0, dc)]
+
+        return total.ravel()
+
+    def coords(self, node):
+        """Return the coordinates of the given node in the unit square
+
+        Parameters:
+
+        *node*
+            The ID of the node
+
+        """
+
+        return ((node // self.size) / float(self.size),
+                (node % self.size) / float(self.size))
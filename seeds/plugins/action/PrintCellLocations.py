@@ -60,17 +60,16 @@ class PrintCellLocations(Action, Plugin):
     __type__ = 4
     __requirements__ = []
 
+    config_schema = dict(Action.config_schema,
+                         filename=(str, 'cell_locations'),
+                         header=(bool, True))
+
     def __init__(self, experiment, label=None):
         """Initialize the PrintCellLocations Action"""
         super(PrintCellLocations, self).__init__(experiment, name="PrintCellLocations", label=label)
 
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end',
-                                                  default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-        self.filename = self.experiment.config.get(self.config_section, 'filename', 'cell_locations')
-        self.header = self.experiment.config.getboolean(self.config_section, 'header', default=True)
+        self.filename = self.settings.filename
+        self.header = self.settings.header
 
     def update(self):
         """Execute the Action"""
@@ -79,17 +78,23 @@ class PrintCellLocations(Action, Plugin):
 
         filename = "%s-%06d.csv" % (self.filename, self.experiment.epoch)
         data_file = self.datafile_path(filename)
-        self.writer = csv.writer(open(data_file, 'w'))
-
-        if self.header:
-            header = ['epoch','cell_id','node_id','x','y','type']
-            self.writer.writerow(header)
-
-        g = self.experiment.population.topology.graph
-        for n in g.nodes():
-            cell = g.node[n]['cell']
-            (xpos, ypos) = cell.coords()
-
-            row = [self.experiment.epoch, cell.id, cell.node, xpos, ypos, cell.type]
-            self.writer.writerow(row)
+        with open(data_file, 'w') as datafile:
+            self.writer = csv.writer(datafile)
+
+            if self.header:
+                header = ['epoch','cell_id','node_id','x','y','type']
+                self.writer.writerow(header)
+
+            pop = self.experiment.population
+            topology = pop.topology
+            for n in topology.nodes():
+                cell = pop.get_cell(n)
+                (xpos, ypos) = topology.node_coords(n)
+
+                if cell:
+                    row = [self.experiment.epoch, cell.id, cell.node, xpos, ypos, cell.type]
+                else:
+                    # Without Cell objects, the node ID identifies the Cell
+                    row = [self.experiment.epoch, n, n, xpos, ypos, pop.get_cell_type(n)]
+                self.writer.writerow(row)
 
@@ -58,6 +58,10 @@ class PrintCellTypeTransitions(Action, Plugin):
     __requirements__ = []
 
 
+    config_schema = dict(Action.config_schema,
+                         filename=(str, 'cell_type_transitions.csv'),
+                         header=(bool, True))
+
     def __init__(self, experiment, label=None):
         """Initialize the PrintCellTypeTransitions Action"""
 
@@ -65,18 +69,15 @@ class PrintCellTypeTransitions(Action, Plugin):
                                                  name="PrintCellTypeTransitions",
                                                  label=label)
 
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end', default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-        self.filename = self.experiment.config.get(self.config_section, 'filename', 'cell_type_transitions.csv')
-        self.header = self.experiment.config.getboolean(self.config_section, 'header', default=True)
+        self.filename = self.settings.filename
+        self.header = self.settings.header
 
         self.types = self.experiment.population._cell_class.types
         self.max_types = self.experiment.population._cell_class.max_types
 
         data_file = self.datafile_path(self.filename)
-        self.writer = csv.writer(open(data_file, 'w'))
+        self.datafile = open(data_file, 'w')
+        self.writer = csv.writer(self.datafile)
 
         if self.header:
             header = ['epoch']
@@ -102,3 +103,7 @@ class PrintCellTypeTransitions(Action, Plugin):
                     row.append(self.experiment.data['population']['transitions'][f][t])
 
         self.writer.writerow(row)
+
+    def teardown(self):
+        """Close the data file"""
+        self.datafile.close()
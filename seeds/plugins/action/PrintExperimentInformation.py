@@ -66,6 +66,10 @@ class PrintExperimentInformation(Action, Plugin):
     __type__ = 4        
     __requirements__ = [] 
 
+    config_schema = dict(Action.config_schema,
+                         epoch_start=(int, 1),
+                         outfile=(str, 'experiment_information.json'))
+
     def __init__(self, experiment, label=None):
         """Initialize the PrintExperimentInformation Action"""
 
@@ -73,11 +77,7 @@ class PrintExperimentInformation(Action, Plugin):
                                                          name="PrintExperimentInformation",
                                                          label=label)
 
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 1)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end', default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-        self.outfile = self.experiment.config.get(self.config_section, 'outfile', 'experiment_information.json')
+        self.outfile = self.settings.outfile
 
     def update(self):
         """Execute the action"""
@@ -133,8 +133,8 @@ class PrintExperimentInformation(Action, Plugin):
         configuration['file'] = self.experiment.config.filename
 
         sha256_checksum = hashlib.sha256()
-        config_file = open(self.experiment.config.filename, 'rb')
-        sha256_checksum.update(config_file.read())
+        with open(self.experiment.config.filename, 'rb') as config_file:
+            sha256_checksum.update(config_file.read())
 
         configuration['checksum'] = sha256_checksum.hexdigest()
 
@@ -148,5 +148,6 @@ class PrintExperimentInformation(Action, Plugin):
         information['configuration'] = configuration
 
         data_file = self.datafile_path(self.outfile)
-        json.dump(information, open(data_file, 'w'), indent=True)
+        with open(data_file, 'w') as outfile:
+            json.dump(information, outfile, indent=True)
 
@@ -14,6 +14,7 @@ import csv
 
 from seeds.Action import *
 from seeds.Plugin import *
+from seeds.SEEDSError import *
 from seeds.utils.statistics import mean, std
 
 
@@ -62,6 +63,10 @@ class PrintPopulationGraphProperties(Action, Plugin):
     __type__ = 4        
     __requirements__ = [] 
 
+    config_schema = dict(Action.config_schema,
+                         filename=(str, 'population_graph_properties.csv'),
+                         header=(bool, True))
+
     def __init__(self, experiment, label=None):
         """Initialize the PrintPopulationGraphProperties Action"""
 
@@ -69,15 +74,15 @@ class PrintPopulationGraphProperties(Action, Plugin):
                                                              name="PrintPopulationGraphProperties",
                                                              label=label)
 
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end', default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-        self.filename = self.experiment.config.get(self.config_section, 'filename', 'population_graph_properties.csv')
-        self.header = self.experiment.config.get(self.config_section, 'header', default=True)
+        self.filename = self.settings.filename
+        self.header = self.settings.header
+
+        if self.experiment.population.topology.graph is None:
+            raise ConfigurationError("PrintPopulationGraphProperties: topologies without a graph (e.g., implicit lattices) are not supported")
 
         data_file = self.datafile_path(self.filename)
-        self.writer = csv.writer(open(data_file, 'w'))
+        self.datafile = open(data_file, 'w')
+        self.writer = csv.writer(self.datafile)
 
         if self.header:
             header = ['epoch', 'nodes', 'edges', 'avg_degree', 'std_degree',
@@ -95,3 +100,6 @@ class PrintPopulationGraphProperties(Action, Plugin):
         row = [self.experiment.epoch, nx.number_of_nodes(g), nx.number_of_edges(g), mean(degrees), std(degrees), nx.average_clustering(g), nx.diameter(g), nx.number_connected_components(g)]
         self.writer.writerow(row)
 
+    def teardown(self):
+        """Close the data file"""
+        self.datafile.close()
@@ -9,7 +9,6 @@ __credits__ = "Brian Connelly"
 import networkx as nx
 
 import csv
-import random
 
 from seeds.Action import *
 from seeds.utils.statistics import mean, std
@@ -60,6 +59,10 @@ class PrintPopulationTypeClusters(Action):
     __type__ = 4        
     __requirements__ = [] 
 
+    config_schema = dict(Action.config_schema,
+                         filename=(str, 'population_type_clusters.csv'),
+                         header=(bool, True))
+
     def __init__(self, experiment, label=None):
         """Initialize the PrintPopulationTypeClusters Action"""
 
@@ -67,17 +70,14 @@ class PrintPopulationTypeClusters(Action):
                                                           name="PrintPopulationTypeClusters",
                                                           label=label)
 
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end', default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-        self.filename = self.experiment.config.get(self.config_section, 'filename', 'population_type_clusters.csv')
-        self.header = self.experiment.config.get(self.config_section, 'header', default=True)
+        self.filename = self.settings.filename
+        self.header = self.settings.header
         self.name = "PrintPopulationTypeClusters"
         self.types = self.experiment.population._cell_class.types
 
         data_file = self.datafile_path(self.filename)
-        self.writer = csv.writer(open(data_file, 'w'))
+        self.datafile = open(data_file, 'w')
+        self.writer = csv.writer(self.datafile)
 
         if self.header:
             header = ['epoch', 'total_clusters', 'total_size_mean', 'total_size_std']
@@ -92,20 +92,20 @@ class PrintPopulationTypeClusters(Action):
         if self.skip_update():
 	        return
 
-        g = self.experiment.population.topology.graph
+        pop = self.experiment.population
         cluster_counts = [0] * len(self.types)
         cluster_sizes = {}
 
         for i in range(len(self.types) + 1):
             cluster_sizes[i] = []
 
-        unvisited = g.nodes()
+        unvisited = list(pop.topology.nodes())
 
         while len(unvisited) > 0:
-            node = random.choice(unvisited)
-            type = g.node[node]["cell"].type
+            node = self.rng.choice(unvisited)
+            type = pop.get_cell_type(node)
 
-            c = cluster(g, node)
+            c = cluster(pop, node)
             c_size = len(c)
             cluster_counts[type] += 1
             cluster_sizes[type].append(c_size)
@@ -125,15 +125,28 @@ class PrintPopulationTypeClusters(Action):
 
         self.writer.writerow(row)
 
-def cluster(graph, node):
-    visited_nodes = []
+    def teardown(self):
+        """Close the data file"""
+        self.datafile.close()
 
-    def visit(node):
-        visited_nodes.append(node)
-        for n in graph.neighbors(node):
-            if n not in visited_nodes and graph.node[n]['cell'].type == graph.node[node]['cell'].type:
-                visit(n)
 
-    visit(node)
-    return visited_nodes
+def cluster(population, node):
+    """Return a list of the nodes in the cluster of same-typed Cells that
+    contains the given node.  Neighbors are read from the topology, so this
+    works whether or not it has a graph."""
+    topology = population.topology
+    get_type = population.get_cell_type
+    type = get_type(node)
+
+    visited_nodes = [node]
+    seen = set(visited_nodes)
+    stack = [node]
 
+    while stack:
+        for n in topology.get_neighbors(stack.pop()):
+            if n not in seen and get_type(n) == type:
+                seen.add(n)
+                visited_nodes.append(n)
+                stack.append(n)
+
+    return visited_nodes
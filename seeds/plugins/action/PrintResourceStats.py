@@ -8,6 +8,11 @@ __credits__ = "Brian Connelly"
 
 import csv
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Action import *
 from seeds.Plugin import *
 from seeds.SEEDSError import *
@@ -64,6 +69,11 @@ class PrintResourceStats(Action, Plugin):
     __type__ = 4        
     __requirements__ = [] 
 
+    config_schema = dict(Action.config_schema,
+                         filename=(str, 'resource'),
+                         header=(bool, True),
+                         resource=(str, None))
+
     def __init__(self, experiment, label=None):
         """Initialize the PrintResourceStats Action"""
 
@@ -71,13 +81,9 @@ class PrintResourceStats(Action, Plugin):
                                                  name="PrintResourceStats",
                                                  label=label)
 
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end', default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-        self.filename = self.experiment.config.get(self.config_section, 'filename', 'resource')
-        self.header = self.experiment.config.getboolean(self.config_section, 'header', default=True)
-        self.resource = self.experiment.config.get(self.config_section, 'resource')
+        self.filename = self.settings.filename
+        self.header = self.settings.header
+        self.resource = self.settings.resource
 
         try:
             self.res = self.experiment.resources[self.resource]
@@ -86,7 +92,8 @@ class PrintResourceStats(Action, Plugin):
 
         full_filename = "%s-%s.csv" % (self.filename, self.resource)
         data_file = self.datafile_path(full_filename)
-        self.writer = csv.writer(open(data_file, 'w'))
+        self.datafile = open(data_file, 'w')
+        self.writer = csv.writer(self.datafile)
 
         if self.header:
             header = ['epoch', 'mean', 'standard_deviation', 'available']
@@ -97,7 +104,14 @@ class PrintResourceStats(Action, Plugin):
         if self.skip_update():
 	        return
 
-        levels = self.experiment.data['resources'][self.resource]['levels']
-        row = [self.experiment.epoch, mean(levels), std(levels), int(self.res.available)]
+        # The levels are read directly from the Resource's level array
+        levels = self.res.field.levels
+        if np is not None:
+            row = [self.experiment.epoch, float(levels.mean()), float(levels.std()), int(self.res.available)]
+        else:
+            row = [self.experiment.epoch, mean(levels), std(levels), int(self.res.available)]
         self.writer.writerow(row)
 
+    def teardown(self):
+        """Close the data file"""
+        self.datafile.close()
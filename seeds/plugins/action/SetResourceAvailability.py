@@ -56,6 +56,10 @@ class SetResourceAvailability(Action, Plugin):
     __type__ = 4        
     __requirements__ = [] 
 
+    config_schema = dict(Action.config_schema,
+                         resource=(str, None),
+                         available=(str, None))
+
     def __init__(self, experiment, label=None):
         """Initialize the SetResourceAvailability Action"""
 
@@ -63,21 +67,14 @@ class SetResourceAvailability(Action, Plugin):
                                                 name="SetResourceAvailability",
                                                 label=label)
 
-        self.threshold = self.experiment.config.getint(self.config_section, 'threshold', 0)
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end',
-                                                  default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-
-        self.resource = self.experiment.config.get(self.config_section, 'resource')
+        self.resource = self.settings.resource
 
         try:
             self.res = self.experiment.resources[self.resource]
         except KeyError:
             raise ConfigurationError("SetResourceAvailability: Resource '%s' is undefined" % (self.resource))
 
-        self.available = self.experiment.config.get(self.config_section, 'available')
+        self.available = self.settings.available
 
         if str(self.available).lower() in ['available', 'on', '1', 'yes', 'true']:
             self.val = True
@@ -56,6 +56,9 @@ class StopOnConvergence(Action, Plugin):
     __type__ = 4        
     __requirements__ = [] 
 
+    config_schema = dict(Action.config_schema,
+                         threshold=(int, 0))
+
     def __init__(self, experiment, label=None):
         """Initialize the StopOnConvergence Action"""
 
@@ -63,12 +66,7 @@ class StopOnConvergence(Action, Plugin):
                                                 name="StopOnConvergence",
                                                 label=label)
 
-        self.threshold = self.experiment.config.getint(self.config_section, 'threshold', 0)
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end',
-                                                  default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
+        self.threshold = self.settings.threshold
 
         if self.threshold < 0:
             raise ConfigurationError("StopOnConvergence: threshold value must be at least 0")
@@ -15,6 +15,11 @@ __credits__ = "Brian Connelly"
 
 import random
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Cell import *
 from seeds.Plugin import *
 from seeds.SEEDSError import *
@@ -28,6 +33,25 @@ class GameOfLifeCell(Cell, Plugin):
         ALIVE: Cells that are alive
         DEAD: Cells that are dead
 
+    The Game of Life is defined with synchronous updates, where every cell
+    is updated at once based on the previous generation.  This is done by
+    setting update_mode = synchronous and array_state = True in the
+    [Population] section.  In that case, each epoch is one generation and is
+    computed for the whole population with array operations (see
+    Topology.neighbor_sum).  On a MooreTopology lattice, the neighbor counts
+    are computed directly on the grid.
+
+    Example:
+        [Population]
+        topology = MooreTopology
+        cell = GameOfLifeCell
+        array_state = True
+        update_mode = synchronous
+
+        [MooreTopology]
+        size = 4096
+        periodic = True
+
     """
 
     __name__ = "Game of Life Cell"
@@ -45,6 +69,8 @@ class GameOfLifeCell(Cell, Plugin):
     ALIVE = 0
     DEAD = 1
 
+    state_only = True
+
     def __init__(self, experiment, population, node, type=None, name="GameOfLifeCell", label=None):
         """Initialize a GameOfLifeCell object
 
@@ -107,4 +133,43 @@ class GameOfLifeCell(Cell, Plugin):
             self.population.update_type_count(self.ALIVE, self.DEAD)            
         elif self.type == self.DEAD and num_live_neighbors == 3:
             self.type = self.ALIVE
-            self.population.update_type_count(self.DEAD, self.ALIVE)            
+            self.population.update_type_count(self.DEAD, self.ALIVE)
+
+    @classmethod
+    def update_state(cls, population, node):
+        """Update the given node following the rules described in update.
+        This operates directly on the Population's CellState.
+
+        """
+
+        neighbors = population.topology.get_neighbors(node)
+
+        if len(neighbors) < 1:
+            warn("Can not update GameOfLifeCell with 0 neighbors")
+            return
+
+        types = population.state.types
+        num_live_neighbors = 0
+        for n in neighbors:
+            if types[n] == cls.ALIVE: num_live_neighbors += 1
+
+        mytype = types[node]
+        if mytype == cls.ALIVE and (num_live_neighbors < 2 or num_live_neighbors > 3):
+            types[node] = cls.DEAD
+            population.update_type_count(cls.ALIVE, cls.DEAD)
+        elif mytype == cls.DEAD and num_live_neighbors == 3:
+            types[node] = cls.ALIVE
+            population.update_type_count(cls.DEAD, cls.ALIVE)
+
+    @classmethod
+    def update_state_synchronous(cls, population):
+        """Compute the next generation of the whole population at once"""
+        types = population.state.types
+        alive = types == cls.ALIVE
+        num_live_neighbors = population.topology.neighbor_sum(alive)
+
+        # Cells with 3 live neighbors are alive in the next generation, as are
+        # live cells with 2 live neighbors
+        lives = (num_live_neighbors == 3) | (alive & (num_live_neighbors == 2))
+
+        return np.where(lives, types.dtype.type(cls.ALIVE), types.dtype.type(cls.DEAD))
@@ -21,8 +21,12 @@ __credits__ = "Brian Connelly, Luis Zaman, Ben Kerr"
 
 from seeds.Cell import *
 from seeds.Plugin import *
+from seeds.utils.sampling import hypergeometric_pmf
 
-import random
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Kerr07Cell(Cell, Plugin):
@@ -65,6 +69,10 @@ class Kerr07Cell(Cell, Plugin):
         death_producer = 0.333
         toxicity = 0.650
 
+    When the Population uses array state, Kerr07Cell runs without Cell
+    objects (see Cell.state_only).  In well-mixed Populations, it can also be
+    run from the type counts alone (see Population's count update_mode).
+
     """
 
     __name__ = "Kerr07 Cell"
@@ -84,6 +92,13 @@ class Kerr07Cell(Cell, Plugin):
     RESISTANT = 2
     PRODUCER = 3
 
+    state_only = True
+
+    config_schema = {'death_sensitive': (float, None),
+                     'death_resistant': (float, None),
+                     'death_producer': (float, None),
+                     'toxicity': (float, None)}
+
     def __init__(self, experiment, population, node, type=None, name="Kerr07Cell", label=None):
         """Initialize a Kerr07Cell object
 
@@ -109,10 +124,10 @@ class Kerr07Cell(Cell, Plugin):
         super(Kerr07Cell, self).__init__(experiment, population, node=node, type=type, name=name, label=label)
         self.population.increment_type_count(self.type)
 
-        self.ds = self.experiment.config.getfloat(self.config_section, 'death_sensitive')
-        self.dr = self.experiment.config.getfloat(self.config_section, 'death_resistant')
-        self.dp = self.experiment.config.getfloat(self.config_section, 'death_producer')
-        self.tp = self.experiment.config.getfloat(self.config_section, 'toxicity')
+        self.ds = self.settings.death_sensitive
+        self.dr = self.settings.death_resistant
+        self.dp = self.settings.death_producer
+        self.tp = self.settings.toxicity
 
     def __str__(self):
         """Produce a string to be used when the object is printed"""
@@ -139,7 +154,7 @@ class Kerr07Cell(Cell, Plugin):
         typecount = {0: 0, 1: 0, 2: 0, 3: 0}
 
         if self.type == self.EMPTY:
-            parent = random.choice(self.neighbors)
+            parent = self.rng.choice(self.neighbors)
             self.type = parent.type
             self.population.update_type_count(self.EMPTY, self.type)            
 
@@ -153,19 +168,201 @@ class Kerr07Cell(Cell, Plugin):
             fr = float(typecount[self.RESISTANT])/num_neighbors
             fp = float(typecount[self.PRODUCER])/num_neighbors
            
-            if random.random() < (self.ds + self.tp * fp):
+            if self.rng.random() < (self.ds + self.tp * fp):
                 self.type = self.EMPTY
                 self.population.update_type_count(self.SENSITIVE, self.EMPTY)            
                 
         elif self.type == self.RESISTANT:
-            if random.random() < self.dr:
+            if self.rng.random() < self.dr:
                 self.type = self.EMPTY
                 self.population.update_type_count(self.RESISTANT, self.EMPTY)            
 
         elif self.type == self.PRODUCER:
-            if random.random() < self.dp:
+            if self.rng.random() < self.dp:
                 self.type = self.EMPTY
                 self.population.update_type_count(self.PRODUCER, self.EMPTY)            
 
         else:
             print("Error: Invalid cell type %d for cell %d" % (self.type, self.id))
+
+    @classmethod
+    def setup_state(cls, population, label=None):
+        """Read the Kerr07Cell configuration for running without Cell
+        objects"""
+        settings = population.experiment.config.compile(cls.state_config_section(label),
+                                                        cls.config_schema)
+        return {'ds': settings.death_sensitive,
+                'dr': settings.death_resistant,
+                'dp': settings.death_producer,
+                'tp': settings.toxicity}
+
+    @classmethod
+    def update_state(cls, population, node):
+        """Update the given node based on its neighbors.  This follows the
+        same rules as update, but operates directly on the Population's
+        CellState.
+
+        """
+
+        types = population.state.types
+        params = population.state.params
+        mytype = types[node]
+
+        if mytype == cls.EMPTY:
+            parent = population.rng.choice(population.topology.get_neighbors(node))
+            types[node] = types[parent]
+            population.update_type_count(cls.EMPTY, int(types[parent]))
+
+        elif mytype == cls.SENSITIVE:
+            neighbors = population.topology.get_neighbors(node)
+            num_producers = 0
+            for n in neighbors:
+                if types[n] == cls.PRODUCER:
+                    num_producers += 1
+
+            fp = float(num_producers)/len(neighbors)
+
+            if population.rng.random() < (params['ds'] + params['tp'] * fp):
+                types[node] = cls.EMPTY
+                population.update_type_count(cls.SENSITIVE, cls.EMPTY)
+
+        elif mytype == cls.RESISTANT:
+            if population.rng.random() < params['dr']:
+                types[node] = cls.EMPTY
+                population.update_type_count(cls.RESISTANT, cls.EMPTY)
+
+        elif mytype == cls.PRODUCER:
+            if population.rng.random() < params['dp']:
+                types[node] = cls.EMPTY
+                population.update_type_count(cls.PRODUCER, cls.EMPTY)
+
+        else:
+            print("Error: Invalid cell type %d for node %d" % (mytype, node))
+
+    @classmethod
+    def update_state_batch(cls, population, nodes, draws):
+        """Update many non-interacting nodes at once using array operations.
+        For Empty nodes, the draw selects the parent neighbor.  For all
+        others, it decides whether the Cell dies.  Used by the Population's
+        batched update mode.
+
+        """
+
+        adj = population.topology.adjacency
+        types = population.state.types
+        params = population.state.params
+
+        mytypes = types[nodes]
+        newtypes = mytypes.copy()
+
+        degrees = adj.degrees(nodes)
+
+        # Empty nodes are taken over by a randomly-chosen neighbor
+        empty = np.flatnonzero(mytypes == cls.EMPTY)
+        parents = adj.select(nodes[empty], (draws[empty] * degrees[empty]).astype(np.int64))
+        newtypes[empty] = types[parents]
+
+        # Sensitive cells die at a rate that increases with the fraction of
+        # neighboring Producers
+        sensitive = np.flatnonzero(mytypes == cls.SENSITIVE)
+        (neighbors, owners) = adj.gather(nodes[sensitive])
+        producers = np.bincount(owners, weights=(types[neighbors] == cls.PRODUCER),
+                                minlength=len(sensitive))
+        fp = producers / degrees[sensitive]
+        dies = draws[sensitive] < (params['ds'] + params['tp'] * fp)
+        newtypes[sensitive[dies]] = cls.EMPTY
+
+        # Resistant and Producer cells die at their own rate
+        death = np.zeros(len(nodes))
+        death[mytypes == cls.RESISTANT] = params['dr']
+        death[mytypes == cls.PRODUCER] = params['dp']
+        newtypes[draws < death] = cls.EMPTY
+
+        types[nodes] = newtypes
+        population.record_transitions(mytypes, newtypes)
+
+    @classmethod
+    def state_rates(cls, population, nodes):
+        """Return the probability that an event at each of the given nodes
+        changes its state.  This is the fraction of non-Empty neighbors for
+        Empty nodes and the death rate for all others.  Used by the
+        Population's rate update mode.
+
+        """
+
+        adj = population.topology.adjacency
+        types = population.state.types
+        params = population.state.params
+
+        mytypes = types[nodes]
+        degrees = np.maximum(adj.degrees(nodes), 1)
+
+        (neighbors, owners) = adj.gather(nodes)
+        ntypes = types[neighbors]
+        occupied = np.bincount(owners, weights=(ntypes != cls.EMPTY), minlength=len(nodes))
+        producers = np.bincount(owners, weights=(ntypes == cls.PRODUCER), minlength=len(nodes))
+
+        rates = np.zeros(len(nodes))
+        rates[mytypes == cls.EMPTY] = (occupied / degrees)[mytypes == cls.EMPTY]
+        sensitive = mytypes == cls.SENSITIVE
+        rates[sensitive] = np.minimum(1.0, params['ds'] + params['tp'] * producers[sensitive] / degrees[sensitive])
+        rates[mytypes == cls.RESISTANT] = params['dr']
+        rates[mytypes == cls.PRODUCER] = params['dp']
+
+        return rates
+
+    @classmethod
+    def fire_state(cls, population, node):
+        """Carry out an event that changes the given node: an Empty node is
+        taken over by a randomly-chosen non-Empty neighbor, and any other
+        Cell dies.  Used by the Population's rate update mode.
+
+        """
+
+        types = population.state.types
+        mytype = int(types[node])
+
+        if mytype == cls.EMPTY:
+            neighbors = population.topology.adjacency.neighbors(node)
+            candidates = neighbors[types[neighbors] != cls.EMPTY]
+            parent = candidates[int(population.rng.random() * len(candidates))]
+            types[node] = types[parent]
+            population.update_type_count(cls.EMPTY, int(types[parent]))
+        else:
+            types[node] = cls.EMPTY
+            population.update_type_count(mytype, cls.EMPTY)
+
+    @classmethod
+    def count_transitions(cls, population, counts):
+        """Return the probability that an event changes a Cell of each type
+        to each other type in a well-mixed Population with the given type
+        counts.  An Empty Cell takes the type of a parent that is equally
+        likely to be any other Cell.  A Sensitive Cell dies with its death
+        rate plus the toxicity times the fraction of Producers among the
+        num_interactions neighbors it is given, which follows a
+        hypergeometric distribution.  Used by the Population's count update
+        mode.
+
+        """
+
+        params = population.count_params
+        others = counts.sum() - 1
+
+        p = np.zeros((cls.max_types, cls.max_types))
+        p[cls.EMPTY] = counts / float(others)
+
+        k = min(population.topology.num_interactions, others)
+        if params['ds'] + params['tp'] <= 1.0 or k == others:
+            # The probability of death is linear in the number of Producers,
+            # so only the expected fraction of Producers matters
+            fp = counts[cls.PRODUCER] / float(others)
+            p[cls.SENSITIVE, cls.EMPTY] = min(1.0, params['ds'] + params['tp'] * fp)
+        else:
+            pmf = hypergeometric_pmf(k, int(counts[cls.PRODUCER]), int(others))
+            p[cls.SENSITIVE, cls.EMPTY] = sum(w * min(1.0, params['ds'] + params['tp'] * h / float(k))
+                                              for (h, w) in enumerate(pmf))
+
+        p[cls.RESISTANT, cls.EMPTY] = params['dr']
+        p[cls.PRODUCER, cls.EMPTY] = params['dp']
+
+        return p
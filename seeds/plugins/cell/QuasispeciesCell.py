@@ -31,7 +31,10 @@ __credits__ = "Luis Zaman, Brian Connelly"
 from seeds.Cell import *
 from seeds.Plugin import *
 
-import random
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class QuasispeciesCell(Cell, Plugin):
     """
@@ -65,6 +68,13 @@ class QuasispeciesCell(Cell, Plugin):
         narrow_polynomail_order = 4
         wide_max_value = 0.75
 
+    When the Population uses array state, QuasispeciesCell runs without Cell
+    objects (see Cell.state_only), and it supports the Population's rate
+    update_mode.  Since fitness depends only on the peak bit and the number
+    of other bits set to 1, and each site mutates independently, a genotype
+    is then stored as its type along with that number (the ones state
+    attribute).  Empty Cells have no fitness.
+
     """
 
     __name__ = "Quasispecies Cell"
@@ -83,6 +93,15 @@ class QuasispeciesCell(Cell, Plugin):
     NARROW = 1
     WIDE = 2
 
+    state_attributes = {'ones': 'i4'}
+    state_only = True
+
+    config_schema = {'death_rate': (float, None),
+                     'genotype_length': (int, None),
+                     'site_mut_rate': (float, None),
+                     'narrow_polynomail_order': (float, None),
+                     'wide_max_value': (float, None)}
+
     def __init__(self, experiment, population, node, type=None, name="QuasispeciesCell", label=None):
         """Initialize a QuasispeciesCell object
 
@@ -107,11 +126,11 @@ class QuasispeciesCell(Cell, Plugin):
 
         super(QuasispeciesCell, self).__init__(experiment, population, node=node, type=type, name=name, label=label)
 
-        self.death_rate = self.experiment.config.getfloat(self.config_section, 'death_rate')
-        self.genotype_length = self.experiment.config.getint(self.config_section, 'genotype_length')
-        self.site_mut_rate = self.experiment.config.getfloat(self.config_section, 'site_mut_rate')
-        self.narrow_polynomail_order = self.experiment.config.getfloat(self.config_section, 'narrow_polynomail_order')
-        self.wide_max_value = self.experiment.config.getfloat(self.config_section, 'wide_max_value')
+        self.death_rate = self.settings.death_rate
+        self.genotype_length = self.settings.genotype_length
+        self.site_mut_rate = self.settings.site_mut_rate
+        self.narrow_polynomail_order = self.settings.narrow_polynomail_order
+        self.wide_max_value = self.settings.wide_max_value
         
         #make sure all of the parameters are okay
         assert self.death_rate >= 0
@@ -121,22 +140,15 @@ class QuasispeciesCell(Cell, Plugin):
         assert self.wide_max_value >= 0
 
         #generate a random genotype
-        self.genotype = [random.randint(0,1) for i in range(self.genotype_length)]
-        
-        if type == -1:
-            #determine type from bitstring genotype, we'll say that 0 = narrow and 1 = wide
-            #that way we can just add one to get our defined types 
-            self.type = random.randint(0,len(self.types)-1)
-        else:
-            self.type = type
-            
-            #don't let this bit go negative... even though it will only happen wwith empty types
-            #and they don't technically have genotypes anyway
-        
-        #set first bit of genotype appropriately 
+        self.genotype = [self.rng.randint(0,1) for i in range(self.genotype_length)]
+
+        #set first bit of genotype appropriately, we'll say that 0 = narrow and 1 = wide
+        #that way we can just add one to get our defined types.  don't let this bit go
+        #negative... even though it will only happen with empty types and they don't
+        #technically have genotypes anyway
         self.genotype[0] = max(self.type-1,0)
-        
-        self.world.increment_type_count(self.type)
+
+        self.population.increment_type_count(self.type)
         
     def flip_bit(self, bit):
         """Helper function to handle single bit mutations"""
@@ -149,7 +161,7 @@ class QuasispeciesCell(Cell, Plugin):
         """Mutate genotype based on mutation rate"""
         new_genotype = []
         for bit in genotype:
-            if random.random() < self.site_mut_rate:
+            if self.rng.random() < self.site_mut_rate:
                 new_genotype.append(self.flip_bit(bit))
             else:
                 new_genotype.append(bit)
@@ -176,18 +188,20 @@ class QuasispeciesCell(Cell, Plugin):
             
     def choose_neighbor(self, orgs):
         """Do roulettle wheel selection between passed organisms (neighbors)
-        and return winner
+        and return winner.  Empty organisms have no fitness, so None is
+        returned if none of the organisms has any fitness.
 
         """
 
-        fitnesses = [self.get_fitness(o.genotype) for o in orgs]
-        #add small amount to avoid division by 0
-        sum_fitness = sum(fitnesses) + 0.0000001
+        fitnesses = [0.0 if o.type == self.EMPTY else self.get_fitness(o.genotype) for o in orgs]
+        sum_fitness = sum(fitnesses)
+        if sum_fitness <= 0:
+            return None
         #would be faster with numpy arrays!
         norm_fitnesses = [f/float(sum_fitness) for f in fitnesses]
         
         #roll the ball, see where it falls
-        r = random.random()
+        r = self.rng.random()
         partial_sum = 0
         for i in range(len(norm_fitnesses)):
             if partial_sum <= r <= partial_sum + norm_fitnesses[i]:
@@ -215,17 +229,153 @@ class QuasispeciesCell(Cell, Plugin):
 
         if self.type == self.EMPTY:
             parent = self.choose_neighbor(self.neighbors)
-            self.type = parent.type
-            
-            #if we're not staying empty, mutate
-            if self.type != self.EMPTY:
-                self.genotype = self.mutate(parent.genotype)
-                #and update type to reflect the new genotype
-                self.type = self.genotype[0]+1
-            self.world.update_type_count(self.EMPTY, self.type)
+
+            #stay empty if no neighbor can reproduce
+            if parent is None:
+                return
+
+            self.genotype = self.mutate(parent.genotype)
+            #and update type to reflect the new genotype
+            self.type = self.genotype[0]+1
+            self.population.update_type_count(self.EMPTY, self.type)
         else:
             #check if we should die
-            if random.random() < self.death_rate:
-                self.world.update_type_count(self.type, self.EMPTY)
+            if self.rng.random() < self.death_rate:
+                self.population.update_type_count(self.type, self.EMPTY)
                 self.type = self.EMPTY
-                
+
+    @classmethod
+    def setup_state(cls, population, label=None):
+        """Read the QuasispeciesCell configuration for running without Cell
+        objects"""
+        settings = population.experiment.config.compile(cls.state_config_section(label),
+                                                        cls.config_schema)
+
+        assert settings.death_rate >= 0
+        assert settings.genotype_length > 1
+        assert settings.site_mut_rate >= 0
+        assert settings.narrow_polynomail_order > 0
+        assert settings.wide_max_value >= 0
+
+        return {'death_rate': settings.death_rate,
+                'genotype_length': settings.genotype_length,
+                'site_mut_rate': settings.site_mut_rate,
+                'narrow_polynomail_order': settings.narrow_polynomail_order,
+                'wide_max_value': settings.wide_max_value}
+
+    @classmethod
+    def init_state(cls, population, node, type=None):
+        """Initialize the given node with a random type and genotype"""
+        super(QuasispeciesCell, cls).init_state(population, node, type=type)
+
+        bits = population.state.params['genotype_length'] - 1
+        population.state.attributes['ones'][node] = sum(population.rng.randint(0,1) for i in range(bits))
+
+    @classmethod
+    def state_fitness(cls, population, nodes):
+        """Return an array with the fitness of the Cell in each of the given
+        nodes (see get_fitness).  Empty Cells have no fitness.
+
+        """
+
+        params = population.state.params
+        mytypes = population.state.types[nodes]
+        perc_one = population.state.attributes['ones'][nodes] / float(params['genotype_length'] - 1)
+
+        fitness = np.zeros(len(mytypes))
+        narrow = mytypes == cls.NARROW
+        fitness[narrow] = perc_one[narrow]**params['narrow_polynomail_order']
+        wide = mytypes == cls.WIDE
+        fitness[wide] = perc_one[wide] * params['wide_max_value']
+
+        return fitness
+
+    @classmethod
+    def reproduce_state(cls, population, node, neighbors):
+        """Fill the given Empty node with a mutated offspring of one of the
+        given neighbors, chosen proportional to fitness (see choose_neighbor
+        and mutate).  Returns False, leaving the node Empty, if none of the
+        neighbors has any fitness.
+
+        """
+
+        neighbors = np.asarray(neighbors)
+        cumulative = np.cumsum(cls.state_fitness(population, neighbors))
+        if len(cumulative) == 0 or cumulative[-1] <= 0:
+            return False
+
+        position = np.searchsorted(cumulative, population.rng.random() * cumulative[-1], side='right')
+        parent = neighbors[min(position, len(neighbors) - 1)]
+
+        # Each site mutates independently, so only the number of 1 bits that
+        # flip to 0 and the number of 0 bits that flip to 1 matter
+        types = population.state.types
+        ones = population.state.attributes['ones']
+        params = population.state.params
+        (rng, rate) = (population.rng, params['site_mut_rate'])
+
+        peak = int(types[parent]) - 1
+        if rng.random() < rate:
+            peak = 1 - peak
+
+        parent_ones = int(ones[parent])
+        lost = sum(rng.random() < rate for i in range(parent_ones))
+        gained = sum(rng.random() < rate for i in range(params['genotype_length'] - 1 - parent_ones))
+
+        types[node] = peak + 1
+        ones[node] = parent_ones - lost + gained
+        population.update_type_count(cls.EMPTY, peak + 1)
+        return True
+
+    @classmethod
+    def update_state(cls, population, node):
+        """Update the given node based on its neighbors.  This follows the
+        same rules as update, but operates directly on the Population's
+        CellState.
+
+        """
+
+        mytype = int(population.state.types[node])
+
+        if mytype == cls.EMPTY:
+            cls.reproduce_state(population, node, population.topology.get_neighbors(node))
+        elif population.rng.random() < population.state.params['death_rate']:
+            population.state.types[node] = cls.EMPTY
+            population.update_type_count(mytype, cls.EMPTY)
+
+    @classmethod
+    def state_rates(cls, population, nodes):
+        """Return the probability that an event at each of the given nodes
+        changes its state.  This is 1 for Empty nodes with a neighbor that
+        has fitness, 0 for other Empty nodes, and the death rate for all
+        others.  Used by the Population's rate update mode.
+
+        """
+
+        adj = population.topology.adjacency
+        mytypes = population.state.types[nodes]
+
+        (neighbors, owners) = adj.gather(nodes)
+        fitness = np.bincount(owners, weights=cls.state_fitness(population, neighbors),
+                              minlength=len(nodes))
+
+        rates = np.where(fitness > 0, 1.0, 0.0)
+        rates[mytypes != cls.EMPTY] = population.state.params['death_rate']
+
+        return rates
+
+    @classmethod
+    def fire_state(cls, population, node):
+        """Carry out an event that changes the given node: an Empty node is
+        filled by the offspring of a neighbor, and any other Cell dies.  Used
+        by the Population's rate update mode.
+
+        """
+
+        mytype = int(population.state.types[node])
+
+        if mytype == cls.EMPTY:
+            cls.reproduce_state(population, node, population.topology.adjacency.neighbors(node))
+        else:
+            population.state.types[node] = cls.EMPTY
+            population.update_type_count(mytype, cls.EMPTY)
@@ -12,7 +12,10 @@ always win the game).
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
-import random
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from seeds.Cell import *
 from seeds.Plugin import *
@@ -36,8 +39,13 @@ class RPSCell(Cell, Plugin):
     distance_dependent
         Whether or not a Cell is more likely to interact with nearby
         neighboring Cells.  In this case, the probability of interacting with a
-        given neighbor is proportional to the distance to that neighbor.
-        (Default: False)
+        given neighbor is proportional to the inverse of the distance to that
+        neighbor.  If the topology has an adjacency index, the distances are
+        computed once (see Topology.distance_tables).  (Default: False)
+
+    When the Population uses array state, RPSCell runs without Cell objects
+    (see Cell.state_only).  In well-mixed Populations, it can also be run
+    from the type counts alone (see Population's count update_mode).
 
     """
 
@@ -57,6 +65,10 @@ class RPSCell(Cell, Plugin):
     PAPER = 1
     SCISSORS = 2
 
+    state_only = True
+
+    config_schema = {'distance_dependent': (bool, False)}
+
     def __init__(self, experiment, population, node, type=None, name="RPSCell", label=None):
         """Initialize a RPSCell object
 
@@ -82,9 +94,7 @@ class RPSCell(Cell, Plugin):
         super(RPSCell, self).__init__(experiment, population, node=node, type=type, name=name, label=label)
         self.population.increment_type_count(self.type)
 
-        self.distance_dependent = self.experiment.config.getboolean(section=self.config_section,
-                                                                    name='distance_dependent',
-                                                                    default=False)
+        self.distance_dependent = self.settings.distance_dependent
 
     def __str__(self):
         """Produce a string to be used when the object is printed"""
@@ -107,11 +117,23 @@ class RPSCell(Cell, Plugin):
 
         """
 
-        if len(self.neighbors) < 1:
+        topology = self.population.topology
+        if topology.adjacency is not None:
+            num_neighbors = topology.adjacency.degree(self.node)
+        else:
+            num_neighbors = len(self.neighbors)
+
+        if num_neighbors < 1:
             warn("Can not update RPSCell with 0 neighbors")
             return
 
-        if self.distance_dependent:
+        if self.distance_dependent and topology.adjacency is not None:
+            # The competitor's position among the node's neighbors is chosen
+            # from the adjacency index's precomputed weights, and the index
+            # gives the node at that position
+            position = topology.distance_weighted_positions(self.node, self.rng.random())
+            competitor = self.population.get_cell(int(topology.adjacency.select(self.node, position)))
+        elif self.distance_dependent:
             # Select a competitor with probability proportional to the
             # closeness of that neighbor (roulette wheel)
 
@@ -121,11 +143,11 @@ class RPSCell(Cell, Plugin):
 
             distances = self.get_neighbor_distances()
             inv_dist = [1.0/(d + pow(1.02,-10000)) for d in distances]
-            competitor = roulette_select(items=self.neighbors, fitnesses=inv_dist, k=1)[0]
+            competitor = roulette_select(items=self.neighbors, fitnesses=inv_dist, k=1, rng=self.rng)[0]
         else:
             # Pick a random neighbor to compete with.  If that neighbor wins, it
             # gets the current cell.
-            competitor = random.choice(self.neighbors)
+            competitor = self.rng.choice(self.neighbors)
 
         if self.type == self.ROCK and competitor.type == self.PAPER:
             self.type = self.PAPER
@@ -139,3 +161,140 @@ class RPSCell(Cell, Plugin):
             self.type = self.ROCK
             self.population.update_type_count(self.SCISSORS, self.type)            
             self.id = self.population.get_cell_id()
+
+    @classmethod
+    def setup_state(cls, population, label=None):
+        """Read the RPSCell configuration for running without Cell objects"""
+        settings = population.experiment.config.compile(cls.state_config_section(label),
+                                                        cls.config_schema)
+        return {'distance_dependent': settings.distance_dependent}
+
+    @classmethod
+    def update_state(cls, population, node):
+        """Update the given node based on a competition with a
+        randomly-selected neighbor.  This follows the same rules as update,
+        but operates directly on the Population's CellState.
+
+        """
+
+        neighbors = population.topology.get_neighbors(node)
+
+        if len(neighbors) < 1:
+            warn("Can not update RPSCell with 0 neighbors")
+            return
+
+        if population.state.params['distance_dependent'] and population.topology.adjacency is not None:
+            position = population.topology.distance_weighted_positions(node, population.rng.random())
+            competitor = neighbors[position]
+        elif population.state.params['distance_dependent']:
+            distances = [population.topology.node_distance(node, n) for n in neighbors]
+            inv_dist = [1.0/(d + pow(1.02,-10000)) for d in distances]
+            competitor = roulette_select(items=neighbors, fitnesses=inv_dist, k=1, rng=population.rng)[0]
+        else:
+            competitor = population.rng.choice(neighbors)
+
+        types = population.state.types
+        mytype = types[node]
+        ctype = types[competitor]
+
+        if ((mytype == cls.ROCK and ctype == cls.PAPER) or
+            (mytype == cls.PAPER and ctype == cls.SCISSORS) or
+            (mytype == cls.SCISSORS and ctype == cls.ROCK)):
+            types[node] = ctype
+            population.update_type_count(int(mytype), int(ctype))
+
+    @classmethod
+    def update_state_batch(cls, population, nodes, draws):
+        """Update many non-interacting nodes at once using array operations.
+        The competitor of each node is the neighbor selected by its draw.
+        Used by the Population's batched update mode.
+
+        """
+
+        adj = population.topology.adjacency
+        types = population.state.types
+
+        degrees = adj.degrees(nodes)
+
+        if not degrees.all():
+            warn("Can not update RPSCell with 0 neighbors")
+            keep = degrees > 0
+            (nodes, draws, degrees) = (nodes[keep], draws[keep], degrees[keep])
+
+        if population.state.params['distance_dependent']:
+            positions = population.topology.distance_weighted_positions(nodes, draws)
+        else:
+            positions = (draws * degrees).astype(np.int64)
+        competitors = adj.select(nodes, positions)
+
+        mytypes = types[nodes]
+        ctypes = types[competitors]
+
+        # Paper beats Rock, Scissors beat Paper, and Rock beats Scissors: the
+        # winning type always follows the losing type (modulo 3)
+        newtypes = np.where((ctypes - mytypes) % 3 == 1, ctypes, mytypes)
+
+        types[nodes] = newtypes
+        population.record_transitions(mytypes, newtypes)
+
+    @classmethod
+    def state_rates(cls, population, nodes):
+        """Return the probability that an event at each of the given nodes
+        changes its state, which is the fraction of its neighbors whose type
+        beats its own (weighted by inverse distance if distance_dependent).
+        Used by the Population's rate update mode.
+
+        """
+
+        adj = population.topology.adjacency
+        types = population.state.types
+
+        degrees = adj.degrees(nodes)
+        (neighbors, owners) = adj.gather(nodes)
+        beats = (types[neighbors] - types[nodes][owners]) % 3 == 1
+
+        if population.state.params['distance_dependent']:
+            # Find each gathered edge in the tables of all edges
+            (distances, weights, cumulative, starts) = population.topology.distance_tables()
+            offsets = np.cumsum(degrees) - degrees
+            edges = starts[nodes][owners] + np.arange(len(owners)) - offsets[owners]
+            return np.bincount(owners, weights=beats * weights[edges], minlength=len(nodes))
+
+        winners = np.bincount(owners, weights=beats, minlength=len(nodes))
+        return winners / np.maximum(degrees, 1)
+
+    @classmethod
+    def fire_state(cls, population, node):
+        """Replace the Cell in the given node with the type that beats it.
+        Used by the Population's rate update mode.
+
+        """
+
+        types = population.state.types
+        mytype = int(types[node])
+        winner = (mytype + 1) % 3
+
+        types[node] = winner
+        population.update_type_count(mytype, winner)
+
+    @classmethod
+    def count_transitions(cls, population, counts):
+        """Return the probability that an event changes a Cell of each type
+        to each other type in a well-mixed Population with the given type
+        counts.  The competitor is equally likely to be any other Cell, so a
+        Cell is replaced with the probability that the competitor is of the
+        type that beats it.  Used by the Population's count update mode.
+
+        """
+
+        if population.count_params['distance_dependent']:
+            raise ConfigurationError("RPSCell: count updates do not support distance_dependent")
+
+        others = float(counts.sum() - 1)
+
+        p = np.zeros((cls.max_types, cls.max_types))
+        for t in range(cls.max_types):
+            winner = (t + 1) % 3
+            p[t, winner] = counts[winner] / others
+
+        return p
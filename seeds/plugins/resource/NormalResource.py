@@ -9,6 +9,11 @@ __credits__ = "Brian Connelly"
 
 from operator import attrgetter
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Action import *
 from seeds.Plugin import *
 from seeds.ResourceCell import *
@@ -70,6 +75,21 @@ class NormalResource(ResourceCell, Plugin):
     The effects of diffusion will depend on the topology, specifically the number
     of neighboring resource cells.
 
+    NormalResource supports the field update mode of Resource (see
+    update_field), in which the levels of all nodes are advanced at once.
+    Diffusion means something different in field mode.  When a node is
+    updated, it sends diffusion / (degree + 1) of its excess to each
+    neighbor with a lower level.  All of these transfers are based on the
+    levels at the start of the epoch, and the amounts sent are removed from
+    the node.  A node surrounded by empty neighbors therefore loses
+    diffusion * degree / (degree + 1) of its level per update (e.g., 26.7%
+    with diffusion 0.3 and the 8 neighbors of a Moore lattice), and the
+    total amount of resource is conserved.  In random mode, each update
+    instead sends diffusion times the remaining excess to each lower
+    neighbor in turn and then restores the node's own level, so it adds
+    resource.  Settings tuned for one mode should be re-tuned for the
+    other.
+
     """
 
     __name__ = "NormalResource"
@@ -80,6 +100,13 @@ class NormalResource(ResourceCell, Plugin):
     __type__ = 3
     __requirements__ = []
 
+    config_schema = {'inflow': (float, 0.0),
+                     'diffusion': (float, 0.5),
+                     'decay': (float, 0.0),
+                     'initial': (float, 0.0)}
+
+    field_attributes = ['inflow', 'diffusion', 'decay']
+
     def __init__(self, experiment, resource, config_section, id):
         """ Initialize a NormalResource object
 
@@ -101,10 +128,10 @@ class NormalResource(ResourceCell, Plugin):
                                              config_section=config_section,
                                              id=id)
 
-        self.inflow = self.experiment.config.getfloat(self.config_section, "inflow", default=0.0)
-        self.diffusion = self.experiment.config.getfloat(self.config_section, "diffusion", default=0.5)
-        self.decay = self.experiment.config.getfloat(self.config_section, "decay", default=0.0)
-        self.initial = self.experiment.config.getfloat(self.config_section, "initial", default=0.0)
+        self.inflow = self.settings.inflow
+        self.diffusion = self.settings.diffusion
+        self.decay = self.settings.decay
+        self.initial = self.settings.initial
 
         self.level = self.initial * 1.0
 
@@ -195,7 +222,148 @@ class NormalResource(ResourceCell, Plugin):
                 self.level -= xfer
 
         self.level = max(0, newlevel)
-        self.experiment.data['resources'][self.resource.name]['levels'][self.id] = self.level
+
+    @classmethod
+    def update_field(cls, resource, counts):
+        """Advance the levels of all nodes of the given Resource by one
+        epoch using whole-field array operations.  This is used by the
+        Resource's field update mode.
+
+        Node n is treated as if it were updated counts[n] times.  Decay and
+        inflow are applied that many times in closed form, and the node then
+        diffuses with the rate 1 - (1 - diffusion)**counts[n].  Diffusion is
+        carried out by the topology (see Topology.diffuse): each node sends
+        rate / (degree + 1) of its excess to every neighbor with a lower
+        level, with all transfers based on the levels after inflow and
+        decay.  Unlike the per-node update, the amount a node sends is
+        removed from its level, so diffusion conserves the total amount of
+        resource.  The 1 / (degree + 1) scaling keeps every level
+        nonnegative for any diffusion up to 1.
+
+        Parameters:
+
+        *resource*
+            The Resource to update
+        *counts*
+            An array containing the number of updates of each node
+
+        """
+
+        cls.update_fields([resource], counts[np.newaxis])
+
+    @classmethod
+    def update_fields(cls, resources, counts):
+        """Advance several NormalResource Resources that share a topology by
+        one epoch in a single pass, as update_field does for one.  Their
+        levels and parameters are stacked into 2-D arrays with one row per
+        Resource, so each array operation (including each step of the
+        diffusion stencil) covers all of them at once.
+
+        Parameters:
+
+        *resources*
+            A list of the Resources to update
+        *counts*
+            A 2-D array containing the number of updates of each node, with
+            one row per Resource
+
+        """
+
+        fields = [r.field for r in resources]
+        level = np.vstack([f.levels for f in fields])
+        inflow = np.vstack([f.array('inflow') for f in fields])
+        decay = np.vstack([f.array('decay') for f in fields])
+        diffusion = np.vstack([f.array('diffusion') for f in fields])
+
+        # After k updates, level * (1-decay)**k + inflow * (1 + (1-decay) +
+        # ... + (1-decay)**(k-1)) remains
+        keep = (1 - decay)**counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            added = np.where(decay > 0, inflow * (1 - keep) / decay, inflow * counts)
+        level = np.maximum(level * keep + added, 0.0)
+
+        rates = 1 - (1 - diffusion)**counts
+        level = resources[0].topology.diffuse(level, rates)
+
+        for (f, row) in zip(fields, level):
+            f.levels[:] = row
+
+    @classmethod
+    def advance_field(cls, resource, epochs):
+        """Advance the levels of the given Resource by several epochs at
+        once, as that many calls to update_field would.  Between
+        interactions with Cells, the dynamics are linear, so they can be
+        solved rather than stepped:
+
+        - Without diffusion, each node is independent, and decay and inflow
+          are applied in closed form for the total number of updates of the
+          node over all of the epochs.
+        - On a periodic lattice where inflow, decay, and diffusion are the
+          same at every node (and sample_events is not set), diffusion is a
+          linear operator whose eigenvectors are the Fourier modes (see
+          Topology.diffusion_spectrum).  The levels are transformed with an
+          FFT, each mode is scaled by its per-epoch factor raised to the
+          number of epochs (the mean level also gains the inflow, as a
+          geometric series), and the result is transformed back.
+
+        Otherwise, update_field is called once per epoch.
+
+        Parameters:
+
+        *resource*
+            The Resource to update
+        *epochs*
+            The number of epochs
+
+        """
+
+        field = resource.field
+        inflow = field.array('inflow')
+        decay = field.array('decay')
+        diffusion = field.array('diffusion')
+
+        if not diffusion.any():
+            counts = resource.field_counts(epochs)
+            keep = (1 - decay)**counts
+            with np.errstate(divide='ignore', invalid='ignore'):
+                added = np.where(decay > 0, inflow * (1 - keep) / decay, inflow * counts)
+            field.levels[:] = np.maximum(field.levels * keep + added, 0.0)
+            return
+
+        uniform = all(np.ptp(a) == 0 for a in (inflow, decay, diffusion))
+        if uniform and not resource.settings.sample_events:
+            count = resource.field_counts()[0]
+            rate = 1 - (1 - diffusion[0])**count
+            spectrum = resource.topology.diffusion_spectrum(rate)
+        else:
+            spectrum = None
+
+        if spectrum is None:
+            for i in range(epochs):
+                cls.update_field(resource, resource.field_counts())
+            return
+
+        # Each epoch maps the levels L to A(keep * L + added), where A is the
+        # diffusion operator.  A leaves uniform levels unchanged, so only the
+        # mean (zero-frequency) mode receives the inflow.
+        keep = (1 - decay[0])**count
+        if decay[0] > 0:
+            added = inflow[0] * (1 - keep) / decay[0]
+        else:
+            added = inflow[0] * count
+
+        n = resource.topology.size
+        modes = np.fft.rfft2(np.asarray(field.levels, dtype=np.float64).reshape(n, n))
+        modes *= (spectrum * keep)**epochs
+
+        if keep < 1:
+            growth = (1 - keep**epochs) / (1 - keep)
+        else:
+            growth = float(epochs)
+        modes[0, 0] += added * n * n * growth
+
+        level = np.fft.irfft2(modes, s=(n, n))
+        field.levels[:] = np.maximum(level.ravel(), 0.0)
 
 
 class SetNormalResourceProperties(Action):
@@ -246,6 +414,14 @@ class SetNormalResourceProperties(Action):
 
     """
 
+    config_schema = dict(Action.config_schema,
+                         resource=(str, None),
+                         inflow=(float, None),
+                         decay=(float, None),
+                         diffusion=(float, None),
+                         level=(float, None),
+                         cells=(str, None))
+
     def __init__(self, experiment, label=None):
         """Initialize the SetNormalResourceProperties Action"""
 
@@ -253,14 +429,7 @@ class SetNormalResourceProperties(Action):
                                                 name="SetNormalResourceProperties",
                                                 label=label)
 
-        self.threshold = self.experiment.config.getint(self.config_section, 'threshold', 0)
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end',
-                                                  default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-
-        self.resource = self.experiment.config.get(self.config_section, 'resource')
+        self.resource = self.settings.resource
 
         try:
             self.res = self.experiment.resources[self.resource]
@@ -271,30 +440,30 @@ class SetNormalResourceProperties(Action):
             raise ConfigurationError("SetNormalResourceProperties: Resource '%s' is not a NormalResource" % (self.resource))
             
 
-        self.inflow = self.experiment.config.getfloat(self.config_section, 'inflow')
+        self.inflow = self.settings.inflow
         if self.inflow and self.inflow < 0:
             raise ConfigurationError("SetNormalResourceProperties: Invalid value for inflow '%f'.  Must be nonnegative." % (self.inflow))
 
-        self.decay = self.experiment.config.getfloat(self.config_section, 'decay')
+        self.decay = self.settings.decay
         if self.decay and self.decay < 0:
             raise ConfigurationError("SetNormalResourceProperties: Invalid value for decay '%f'.  Must be nonnegative." % (self.decay))
         elif self.decay and self.decay > 1:
             raise ConfigurationError("SetNormalResourceProperties: Invalid value for decay '%f'.  Must not be greater than 1." % (self.decay))
 
-        self.diffusion = self.experiment.config.getfloat(self.config_section, 'diffusion')
+        self.diffusion = self.settings.diffusion
         if self.diffusion and self.diffusion < 0:
             raise ConfigurationError("SetNormalResourceProperties: Invalid value for diffusion '%f'.  Must be nonnegative." % (self.diffusion))
         elif self.diffusion and self.diffusion > 1:
             raise ConfigurationError("SetNormalResourceProperties: Invalid value for diffusion '%f'.  Must not be greater than 1." % (self.diffusion))
 
-        self.level = self.experiment.config.getfloat(self.config_section, 'level')
+        self.level = self.settings.level
         if self.level and self.level < 0:
             raise ConfigurationError("SetNormalResourceProperties: Invalid value for level '%f'.  Must be nonnegative." % (self.level))
 
         if not self.inflow and self.inflow != 0 and not self.decay and self.decay != 0 and not self.diffusion and self.diffusion != 0 and not self.level and self.level != 0:
             raise ConfigurationError("SetNormalResourceProperties: Must specify value for inflow, decay, diffusion, or level")
 
-        self.cells_str = self.experiment.config.get(self.config_section, 'cells')
+        self.cells_str = self.settings.cells
 
         if not self.cells_str:
             self.cells = self.res.topology.graph.nodes()
@@ -312,11 +481,10 @@ class SetNormalResourceProperties(Action):
 
         for c in self.cells:
             if self.inflow:
-                self.res.topology.graph.node[c]['resource'].inflow = self.inflow
+                self.res.cells[c].inflow = self.inflow
             if self.diffusion:
-                self.res.topology.graph.node[c]['resource'].diffusion = self.diffusion
+                self.res.cells[c].diffusion = self.diffusion
             if self.decay:
-                self.res.topology.graph.node[c]['resource'].decay = self.decay
+                self.res.cells[c].decay = self.decay
             if self.level:
-                self.res.topology.graph.node[c]['resource'].level = self.level
-                self.experiment.data['resources'][self.resource]['levels'][c] = self.res.topology.graph.node[c]['resource'].level
+                self.res.cells[c].level = self.level
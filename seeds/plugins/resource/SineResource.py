@@ -10,6 +10,11 @@ __credits__ = "Brian Connelly"
 
 from math import sin, pi
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Action import *
 from seeds.Plugin import *
 from seeds.ResourceCell import *
@@ -52,6 +57,10 @@ class SineResource(ResourceCell, Plugin):
         period = 100
         phase = 5
 
+    Since the level depends only on the epoch and these parameters, the
+    Resource computes it once per epoch for each distinct set of parameters
+    (see epoch_levels).
+
     """
 
     __name__ = "SineResource"
@@ -62,6 +71,12 @@ class SineResource(ResourceCell, Plugin):
     __type__ = 3
     __requirements__ = []
 
+    config_schema = {'amplitude': (float, 0.0),
+                     'period': (int, 0),
+                     'phase': (int, 0)}
+
+    field_attributes = ['amplitude', 'period', 'phase']
+
     def __init__(self, experiment, resource, config_section, id):
         """ Initialize a SineResource object
 
@@ -83,9 +98,9 @@ class SineResource(ResourceCell, Plugin):
                                            config_section=config_section,
                                            id=id)
 
-        self.amplitude = self.experiment.config.getfloat(self.config_section, "amplitude", default=0.0)
-        self.period = self.experiment.config.getint(self.config_section, "period", default=0)
-        self.phase = self.experiment.config.getint(self.config_section, "phase", default=0)
+        self.amplitude = self.settings.amplitude
+        self.period = self.settings.period
+        self.phase = self.settings.phase
 
         if self.amplitude < 0:
             raise ConfigurationError("SineResource: amplitude for '%s' must be at least 0" % (self.resource.name))
@@ -144,7 +159,25 @@ class SineResource(ResourceCell, Plugin):
         position_radians = ((self.experiment.epoch * 1.0) / self.period) * 2 * pi
         phase_radians = ((self.phase * 1.0) / self.period) * 2 * pi
         self.level = (self.amplitude * sin(position_radians + phase_radians)) + self.amplitude
-        self.experiment.data['resources'][self.resource.name]['levels'][self.id] = self.level
+
+    @classmethod
+    def epoch_levels(cls, epoch, params):
+        """Return an array containing the level at the given epoch for each
+        row of (amplitude, period, phase) parameters
+
+        Parameters:
+
+        *epoch*
+            The epoch
+        *params*
+            A 2-D array with one row of parameters per group of nodes
+
+        """
+
+        (amplitude, period, phase) = params.T
+        position_radians = ((epoch * 1.0) / period) * 2 * np.pi
+        phase_radians = ((phase * 1.0) / period) * 2 * np.pi
+        return (amplitude * np.sin(position_radians + phase_radians)) + amplitude
 
 
 class SetSineResourceProperties(Action):
@@ -189,6 +222,12 @@ class SetSineResourceProperties(Action):
 
     """
 
+    config_schema = dict(Action.config_schema,
+                         resource=(str, None),
+                         period=(float, None),
+                         amplitude=(float, None),
+                         cells=(str, None))
+
     def __init__(self, experiment, label=None):
         """Initialize the SetSineResourceProperties Action"""
 
@@ -196,14 +235,7 @@ class SetSineResourceProperties(Action):
                                                 name="SetSineResourceProperties",
                                                 label=label)
 
-        self.threshold = self.experiment.config.getint(self.config_section, 'threshold', 0)
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end',
-                                                  default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-
-        self.resource = self.experiment.config.get(self.config_section, 'resource')
+        self.resource = self.settings.resource
 
         try:
             self.res = self.experiment.resources[self.resource]
@@ -214,15 +246,15 @@ class SetSineResourceProperties(Action):
             raise ConfigurationError("SetSineResourceProperties: Resource '%s' is not a SineResource" % (self.resource))
             
 
-        self.period = self.experiment.config.getfloat(self.config_section, 'period')
+        self.period = self.settings.period
         if self.period and self.period <= 0:
             raise ConfigurationError("SetSineResourceProperties: Invalid value for period '%f'.  Must be nonzero and nonnegative." % (self.period))
 
-        self.amplitude = self.experiment.config.getfloat(self.config_section, 'amplitude')
+        self.amplitude = self.settings.amplitude
         if self.amplitude and self.amplitude < 0:
             raise ConfigurationError("SetSineResourceProperties: Invalid value for amplitude '%f'.  Must be nonnegative." % (self.amplitude))
 
-        self.cells_str = self.experiment.config.get(self.config_section, 'cells')
+        self.cells_str = self.settings.cells
 
         if not self.cells_str:
             self.cells = self.res.topology.graph.nodes()
@@ -240,6 +272,6 @@ class SetSineResourceProperties(Action):
 
         for c in self.cells:
             if self.period:
-                self.res.topology.graph.node[c]['resource'].period = self.period
+                self.res.cells[c].period = self.period
             if self.amplitude:
-                self.res.topology.graph.node[c]['resource'].amplitude = self.amplitude
+                self.res.cells[c].amplitude = self.amplitude
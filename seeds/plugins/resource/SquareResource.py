@@ -8,6 +8,11 @@ can be configured.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Action import *
 from seeds.Plugin import *
 from seeds.ResourceCell import *
@@ -58,6 +63,10 @@ class SquareResource(ResourceCell, Plugin):
         duty_cycle = 0.33
         offset = 5
 
+    Since the level depends only on the epoch and these parameters, the
+    Resource computes it once per epoch for each distinct set of parameters
+    (see epoch_levels).
+
     """
 
     __name__ = "SineResource"
@@ -68,6 +77,14 @@ class SquareResource(ResourceCell, Plugin):
     __type__ = 3
     __requirements__ = []
 
+    config_schema = {'period': (int, 0),
+                     'high': (float, 0.0),
+                     'low': (float, 0.0),
+                     'duty_cycle': (float, 0.5),
+                     'offset': (int, 0)}
+
+    field_attributes = ['period', 'high', 'low', 'duty_cycle', 'offset']
+
     def __init__(self, experiment, resource, config_section, id):
         """ Initialize a SquareResource object
 
@@ -89,11 +106,11 @@ class SquareResource(ResourceCell, Plugin):
                                              config_section=config_section,
                                              id=id)
 
-        self.period = self.experiment.config.getint(self.config_section, "period", default=0)
-        self.high = self.experiment.config.getfloat(self.config_section, "high", default=0.0)
-        self.low = self.experiment.config.getfloat(self.config_section, "low", default=0.0)
-        self.duty_cycle = self.experiment.config.getfloat(self.config_section, "duty_cycle", default=0.5)
-        self.offset = self.experiment.config.getint(self.config_section, "offset", default=0)
+        self.period = self.settings.period
+        self.high = self.settings.high
+        self.low = self.settings.low
+        self.duty_cycle = self.settings.duty_cycle
+        self.offset = self.settings.offset
 
         if self.period <= 0:
             raise ConfigurationError("SqureResource: period for '%s' must be greater than 0" % (self.resource.name))
@@ -187,7 +204,23 @@ class SquareResource(ResourceCell, Plugin):
         else:
             self.level = self.low
 
-        self.experiment.data['resources'][self.resource.name]['levels'][self.id] = self.level
+    @classmethod
+    def epoch_levels(cls, epoch, params):
+        """Return an array containing the level at the given epoch for each
+        row of (period, high, low, duty_cycle, offset) parameters
+
+        Parameters:
+
+        *epoch*
+            The epoch
+        *params*
+            A 2-D array with one row of parameters per group of nodes
+
+        """
+
+        (period, high, low, duty_cycle, offset) = params.T
+        position = np.mod(epoch - offset, period) / (period * 1.0)
+        return np.where(position < duty_cycle, high, low)
 
 
 class SetSquareResourceProperties(Action):
@@ -241,6 +274,14 @@ class SetSquareResourceProperties(Action):
 
     """
 
+    config_schema = dict(Action.config_schema,
+                         resource=(str, None),
+                         period=(float, None),
+                         high=(float, None),
+                         low=(float, None),
+                         duty_cycle=(float, None),
+                         cells=(str, None))
+
     def __init__(self, experiment, label=None):
         """Initialize the SetSquareResourceProperties Action"""
 
@@ -248,14 +289,7 @@ class SetSquareResourceProperties(Action):
                                                 name="SetSquareResourceProperties",
                                                 label=label)
 
-        self.threshold = self.experiment.config.getint(self.config_section, 'threshold', 0)
-        self.epoch_start = self.experiment.config.getint(self.config_section, 'epoch_start', 0)
-        self.epoch_end = self.experiment.config.getint(self.config_section, 'epoch_end',
-                                                  default=self.experiment.config.getint('Experiment', 'epochs', default=-1))
-        self.frequency = self.experiment.config.getint(self.config_section, 'frequency', 1)
-        self.priority = self.experiment.config.getint(self.config_section, 'priority', 0)
-
-        self.resource = self.experiment.config.get(self.config_section, 'resource')
+        self.resource = self.settings.resource
 
         try:
             self.res = self.experiment.resources[self.resource]
@@ -266,13 +300,13 @@ class SetSquareResourceProperties(Action):
             raise ConfigurationError("SetSquareResourceProperties: Resource '%s' is not a SquareResource" % (self.resource))
             
 
-        self.period = self.experiment.config.getfloat(self.config_section, 'period')
+        self.period = self.settings.period
         if self.period and self.period < 0:
             raise ConfigurationError("SetSquareResourceProperties: Invalid value for period '%f'.  Must be nonnegative." % (self.period))
 
 
-        self.high = self.experiment.config.getfloat(self.config_section, 'high')
-        self.low = self.experiment.config.getfloat(self.config_section, 'low')
+        self.high = self.settings.high
+        self.low = self.settings.low
 
 
         if self.high and self.low and self.high < self.low:
@@ -280,14 +314,14 @@ class SetSquareResourceProperties(Action):
 
         # NOTE: should also make sure that new high or low values (if one is not specified) is valid with the current configuration
 
-        self.duty_cycle = self.experiment.config.getfloat(self.config_section, 'duty_cycle')
+        self.duty_cycle = self.settings.duty_cycle
         if self.duty_cycle and self.duty_cycle < 0:
             raise ConfigurationError("SetSquareResourceProperties: Invalid value for duty_cycle '%f'.  Must be nonnegative." % (self.duty_cycle))
 
         if not self.period and not self.high and not self.low and not self.duty_cycle:
             raise ConfigurationError("SetSquareResourceProperties: Must specify value for period, high, low, or duty_cycle")
 
-        self.cells_str = self.experiment.config.get(self.config_section, 'cells')
+        self.cells_str = self.settings.cells
 
         if not self.cells_str:
             self.cells = self.res.topology.graph.nodes()
@@ -305,10 +339,10 @@ class SetSquareResourceProperties(Action):
 
         for c in self.cells:
             if self.low:
-                self.res.topology.graph.node[c]['resource'].low = self.low
+                self.res.cells[c].low = self.low
             if self.high:
-                self.res.topology.graph.node[c]['resource'].high = self.high
+                self.res.cells[c].high = self.high
             if self.duty_cycle:
-                self.res.topology.graph.node[c]['resource'].duty_cycle = self.duty_cycle
+                self.res.cells[c].duty_cycle = self.duty_cycle
             if self.period:
-                self.res.topology.graph.node[c]['resource'].period = self.period
+                self.res.cells[c].period = self.period
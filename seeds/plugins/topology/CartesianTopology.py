@@ -17,13 +17,17 @@ __author__ = "Luis Zaman <zamanlui@msu.edu>"
 __credits__ = "Luis Zaman, Brian Connelly, Philip McKinley, Charles Ofria"
 
 import networkx as nx
-import random
 from math import sqrt, floor, ceil, pi
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Plugin import *
 from seeds.SEEDSError import *
 from seeds.Topology import *
-from seeds.utils.geometry import euclidean_distance
+from seeds.utils.geometry import CellList, euclidean_distance
 
 
 class CartesianTopology(Topology, Plugin):
@@ -51,6 +55,13 @@ class CartesianTopology(Topology, Plugin):
         Whether or not to remove nodes that do not have neighbors within the
         calculated radius.  If False, node is connected to a randomly-chosen
         neighbor (Boolean.  Default: True)
+    graph
+        Whether or not to build a NetworkX graph.  Without one, the
+        connections are stored only in an adjacency index built directly from
+        the list of edges, which is much faster and smaller for large
+        topologies, but the topology can then only be used by Populations of
+        state-only Cells (see Population.array_state).  Requires NumPy.
+        (Boolean.  Default: True)
     config_section
         The name of the section in which this topology is configured
 
@@ -71,6 +82,12 @@ class CartesianTopology(Topology, Plugin):
     __type__ = 2
     __requirements__ = []
 
+    config_schema = {'size': (int, None),
+                     'periodic': (bool, False),
+                     'expected_neighbors': (int, 0),
+                     'remove_disconnected': (bool, True),
+                     'graph': (bool, True)}
+
     def __init__(self, experiment, label=None):
         """Initialize a CartesianTopology object
 
@@ -90,10 +107,12 @@ class CartesianTopology(Topology, Plugin):
         else:
             self.config_section="%s" % ("CartesianTopology")
 
-        self.size = self.experiment.config.getint(self.config_section, 'size')
-        self.periodic = self.experiment.config.getboolean(self.config_section, 'periodic', default=False)
-        self.expected_neighbors = self.experiment.config.getint(self.config_section, 'expected_neighbors', default=0)
-        self.remove_disconnected = self.experiment.config.getboolean(self.config_section, 'remove_disconnected', default=True)
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+        self.size = self.settings.size
+        self.periodic = self.settings.periodic
+        self.expected_neighbors = self.settings.expected_neighbors
+        self.remove_disconnected = self.settings.remove_disconnected
         self.dimensions = 2
 
         if not self.size:
@@ -104,17 +123,110 @@ class CartesianTopology(Topology, Plugin):
             raise ConfigurationError("CartesianTopology: expected_neighbors can not be negative")
         elif self.expected_neighbors > self.size:
             raise ConfigurationError("CartesianTopology: expected_neighbors can not exceed size")
+        elif not self.settings.graph and np is None:
+            raise ConfigurationError("CartesianTopology: building without a graph requires NumPy")
+
+        if self.load_cache(graph=self.settings.graph):
+            return
+
+        if not self.settings.graph:
+            # Keep only the coordinates and a compressed index of the edges
+            (self.positions, edges) = self.build_edges(size=self.size,
+                                                       expected_neighbors=self.expected_neighbors,
+                                                       periodic=self.periodic)
+            self.graph = None
+            self.adjacency = AdjacencyIndex.from_edges(len(self.positions), edges)
+        else:
+            self.graph = self.build_graph(size=self.size,
+                                          expected_neighbors=self.expected_neighbors,
+                                          periodic=self.periodic)
+            self.compile_adjacency()
+
+        self.save_cache()
+
+    def neighbor_radius(self, size, expected_neighbors):
+        """Return the distance within which a node has the given expected
+        number of neighbors
+
+        Parameters:
+
+        *size*
+            The number of nodes
+        *expected_neighbors*
+            The expected degree of each node
+
+        """
+
+        if size == 1:
+            return 1
+        else:
+            return sqrt( (expected_neighbors / (size - 1.0)) / pi)
+
+    def build_edges(self, size=0, expected_neighbors=0, periodic=False):
+        """Place the nodes and find the edges between them using array
+        operations.  Return a tuple (coords, edges), where coords is an
+        (N, 2) array containing the coordinates of each node and edges is an
+        (E, 2) array of the pairs of connected nodes.  Nodes without
+        neighbors are removed (and the remaining nodes renumbered) or
+        connected to a random nearby node, depending on remove_disconnected.
+        Requires NumPy.
+
+        Parameters:
+
+        *size*
+            The number of nodes to be in the graph
+        *expected_neighbors*
+            The expected degree of each node in the graph
+        *periodic*
+            Whether or not to use periodic boundary conditions
+
+        """
+
+        radius = self.neighbor_radius(size, expected_neighbors)
+
+        random = np.random.RandomState(self.rng.numpy_seed())
+        coords = random.random_sample((size, 2))
+
+        cells = CellList(coords, radius, periodic=periodic)
+        edges = cells.pairs()
+
+        degrees = np.bincount(edges.ravel(), minlength=size)
+        isolated = np.flatnonzero(degrees == 0)
+
+        if len(isolated) == 0:
+            return (coords, edges)
+        elif self.remove_disconnected:
+            keep = degrees > 0
+            new_ids = np.cumsum(keep) - 1
+            return (coords[keep], new_ids[edges])
+
+        # Connect each node without neighbors to a randomly-chosen node in
+        # the surrounding cells (or anywhere, if there are none)
+        extra = []
+        for node in isolated.tolist():
+            if degrees[node] > 0 or size < 2:
+                continue
 
-        self.graph = self.build_graph(size=self.size,
-                                      expected_neighbors=self.expected_neighbors,
-                                      periodic=self.periodic)
+            candidates = cells.neighborhood(node)
+            candidates = candidates[candidates != node]
+            if len(candidates) > 0:
+                other = int(candidates[random.randint(len(candidates))])
+            else:
+                other = (node + 1 + random.randint(size - 1)) % size
 
-        if self.remove_disconnected and len(self.graph.nodes()) < self.size:
-            self.relabel_nodes()
+            extra.append((node, other))
+            degrees[node] += 1
+            degrees[other] += 1
+
+        if extra:
+            edges = np.concatenate((edges, np.array(extra, dtype=edges.dtype)))
+
+        return (coords, edges)
 
     def build_graph(self, size=0, expected_neighbors=0,
                     periodic=False):
-        """Build the graph
+        """Build the graph.  When NumPy is available, the nodes and edges are
+        found with build_edges and then added to the graph.
 
         Parameters:
 
@@ -127,11 +239,21 @@ class CartesianTopology(Topology, Plugin):
 
         """
 
+        G = nx.empty_graph()
+        G.name = "Cartesian Topology Graph"
+
+        if np is not None:
+            (coords, edges) = self.build_edges(size=size,
+                                               expected_neighbors=expected_neighbors,
+                                               periodic=periodic)
+            G.add_nodes_from(range(len(coords)))
+            for (n, c) in enumerate(coords.tolist()):
+                G.node[n]['coords'] = tuple(c)
+            G.add_edges_from(edges.tolist())
+            return G
+
         # Calculate the distance required to yield the expected # neighbors
-        if size == 1:
-            radius = 1
-        else:
-            radius = sqrt( (expected_neighbors / (size - 1.0)) / pi)
+        radius = self.neighbor_radius(size, expected_neighbors)
 
         # Create bins in which to put node so we only check a fraction of
         # candidate neighbors
@@ -142,13 +264,11 @@ class CartesianTopology(Topology, Plugin):
             for j in range(num_bins):
                 neighbor_bins[i].append([])
 
-        G = nx.empty_graph()
-        G.name = "Cartesian Topology Graph"
         G.add_nodes_from(list(range(size)))
 
         # Create the collection of nodes and put them into bins with
         # candidate neighbors
-        _rndm = random.random
+        _rndm = self.rng.random
         for n in G.nodes():
             xcoord = _rndm()
             ycoord = _rndm()
@@ -170,14 +290,14 @@ class CartesianTopology(Topology, Plugin):
                         (px < 0 or px >= num_bins)):
                         continue
 
-                    for py in range(y-y, y+1+1):
+                    for py in range(y-1, y+1+1):
                         if (periodic == False and
                             (py < 0 or py >= num_bins)):
                             continue
 
                         potentials += neighbor_bins[px % num_bins][py % num_bins]
 
-                for node in neighbor_bins[x][y]:
+                for node in list(neighbor_bins[x][y]):
                     node_coords = G.node[node]['coords']
                     for potential in potentials:
                         p_coords = G.node[potential]['coords']
@@ -191,10 +311,14 @@ class CartesianTopology(Topology, Plugin):
                             G.remove_node(node)
                             neighbor_bins[x][y].remove(node)
                         else:
-                            G.add_edge(node, random.choice(potentials))
+                            G.add_edge(node, self.rng.choice(potentials))
 
                 neighbor_bins[x][y] = []
 
+        # Renumber the remaining nodes so that there are no gaps
+        if self.remove_disconnected and len(G) < size:
+            G = nx.relabel_nodes(G, dict((n, i) for (i, n) in enumerate(G.nodes())))
+
         return G
 
     def within_range(self, node1, node2, distance, periodic):
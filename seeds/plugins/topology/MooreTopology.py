@@ -16,10 +16,13 @@ This topology was originally presented and used used in the publication:
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly, Luis Zaman, Philip McKinley, Charles Ofria"
 
-from math import floor
-
 import networkx as nx
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Plugin import *
 from seeds.SEEDSError import *
 from seeds.Topology import *
@@ -45,6 +48,11 @@ class MooreTopology(Topology, Plugin):
             nodes on the right border. (default: False)
         radius: Number of hops within a focal node's neighborhood
             (default: 1)
+        implicit: Whether or not to compute neighbors and coordinates from
+            each node's row and column rather than building a graph.  This
+            uses almost no memory, but the topology has no graph, so it can
+            only be used by Populations of state-only Cells (see
+            Population.array_state).  (default: False)
 
     Example:
         [MooreTopology]
@@ -62,6 +70,14 @@ class MooreTopology(Topology, Plugin):
     __type__ = 2
     __requirements__ = []
 
+    config_schema = {'size': (int, None),
+                     'periodic': (bool, False),
+                     'radius': (int, 1),
+                     'implicit': (bool, False)}
+
+    deterministic = True
+    shareable = True
+
     def __init__(self, experiment, label=None):
         """Initialize a MooreTopology object"""
         super(MooreTopology, self).__init__(experiment, label=label)
@@ -71,9 +87,12 @@ class MooreTopology(Topology, Plugin):
         else:
             self.config_section = "%s" % ("MooreTopology")
 
-        self.size = self.experiment.config.getint(self.config_section, 'size')
-        self.periodic = self.experiment.config.getboolean(self.config_section, 'periodic', default=False)
-        self.radius = self.experiment.config.getint(self.config_section, 'radius', default=1)
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+        self.size = self.settings.size
+        self.periodic = self.settings.periodic
+        self.radius = self.settings.radius
+        self.implicit = self.settings.implicit
         self.dimensions = 2
 
         if not self.size:
@@ -85,6 +104,22 @@ class MooreTopology(Topology, Plugin):
         elif self.radius >= self.size:
             raise ConfigurationError("MooreTopology: radius can not exceed grid size")
 
+        if self.implicit:
+            if np is None:
+                raise ConfigurationError("MooreTopology: implicit lattices require NumPy")
+            elif self.periodic and 2 * self.radius + 1 > self.size:
+                raise ConfigurationError("MooreTopology: implicit periodic lattices require size of at least 2 * radius + 1")
+
+            # No graph is built.  Neighbors and coordinates are computed from
+            # each node's row and column.
+            self.graph = None
+            self.adjacency = LatticeIndex(self.size, self.offsets(self.radius),
+                                          periodic=self.periodic)
+            return
+
+        if self.load_cache():
+            return
+
         self.graph = self.moore_2d_graph(self.size, self.size,
                                          radius=self.radius,
                                          periodic=self.periodic)
@@ -92,6 +127,9 @@ class MooreTopology(Topology, Plugin):
         for n in self.graph.nodes():
             self.graph.node[n]['coords'] = (self.row(n)/float(self.size), self.column(n)/float(self.size))
 
+        self.compile_adjacency()
+        self.save_cache()
+
     def __str__(self):
         """Produce a string to be used when an object is printed"""
         return 'Moore Topology (%d nodes, %d radius)' % (self.size * self.size, self.radius)
@@ -131,6 +169,109 @@ class MooreTopology(Topology, Plugin):
         """
         return row * self.size + col
 
+    def neighbor_sum(self, values):
+        """Return an array containing, for every node, the sum of the given
+        per-node values over that node's Moore neighborhood.  The lattice is
+        treated as a grid, so the sum is computed with a few whole-grid array
+        operations (a separable box sum) rather than through the adjacency
+        index.
+
+        Parameters:
+
+        *values*
+            An array of values indexed by node ID
+
+        """
+
+        r = self.radius
+        if 2 * r + 1 > self.size:
+            # Periodic neighborhoods would wrap onto themselves
+            return super(MooreTopology, self).neighbor_sum(values)
+
+        # Boolean values (e.g., whether each Cell is alive) are counted in the
+        # narrowest type that can hold a full neighborhood.  Other integers
+        # are summed as int64, since they may be large or negative.
+        grid = np.asarray(values).reshape(self.size, self.size)
+        if grid.dtype.kind == 'b':
+            if (2 * r + 1)**2 < 256:
+                grid = grid.astype(np.uint8)
+            else:
+                grid = grid.astype(np.int32)
+        elif grid.dtype.kind in 'ui':
+            grid = grid.astype(np.int64)
+
+        if self.periodic:
+            padded = np.pad(grid, r, mode='wrap')
+        else:
+            padded = np.pad(grid, r, mode='constant')
+
+        n = self.size
+        rowsum = padded[0:n].copy()
+        for k in range(1, 2 * r + 1):
+            rowsum += padded[k:k+n]
+
+        total = rowsum[:, 0:n].copy()
+        for k in range(1, 2 * r + 1):
+            total += rowsum[:, k:k+n]
+
+        total -= grid
+        return total.ravel()
+
+    def diffuse(self, values, rates):
+        """Return an array containing the given per-node values after one
+        step of diffusion (see Topology.diffuse).  The lattice is treated as
+        a grid, so the transfers are computed with whole-grid array
+        operations (see lattice_diffuse).
+
+        Parameters:
+
+        *values*
+            An array of values indexed by node ID
+        *rates*
+            An array of the fraction of each node's excess that it sends
+
+        """
+
+        if self.periodic and 2 * self.radius + 1 > self.size:
+            # Periodic neighborhoods would wrap onto themselves
+            return super(MooreTopology, self).diffuse(values, rates)
+
+        return lattice_diffuse(values, rates, self.adjacency.degrees(),
+                               self.size, self.offsets(self.radius),
+                               periodic=self.periodic)
+
+    def diffusion_spectrum(self, rate):
+        """Return the eigenvalues of one step of diffusion with the same
+        rate at every node, or None if the lattice is not periodic (see
+        Topology.diffusion_spectrum)
+
+        Parameters:
+
+        *rate*
+            The fraction of each node's excess that it sends
+
+        """
+
+        if not self.periodic or 2 * self.radius + 1 > self.size:
+            return None
+
+        return lattice_diffusion_spectrum(self.size, self.offsets(self.radius), rate)
+
+    def offsets(self, radius):
+        """Return a list of the (row, column) offsets from a node to the
+        nodes in its Moore neighborhood of the given radius, in row-major
+        order
+
+        Parameters:
+
+        *radius*
+            The radius of the neighborhood
+
+        """
+        return [(dr, dc) for dr in range(-radius, radius + 1)
+                for dc in range(-radius, radius + 1)
+                if (dr, dc) != (0, 0)]
+
     def moore_2d_graph(self, rows=0, columns=0, radius=0,
                        periodic=False):
         """ Return the 2d grid graph of rows x columns nodes,
@@ -138,6 +279,8 @@ class MooreTopology(Topology, Plugin):
             a given radius.
             Optional argument periodic=True will connect
             boundary nodes via periodic boundary conditions.
+            The edges are generated at once from the neighborhood's
+            offsets (see lattice_edges).
 
         Parameters:
 
@@ -154,26 +297,9 @@ class MooreTopology(Topology, Plugin):
         """
         G = nx.empty_graph()
         G.name = "moore_2d_radius_graph"
-        G.add_nodes_from(list(range(rows * columns)))
-
-        for n in G.nodes():
-            myrow = self.row(n)
-            mycol = self.column(n)
-
-            for r in range(myrow - radius, myrow + radius + 1):
-                if periodic == False and (r < 0 or r >= rows):
-                    continue
-
-                for c in range(mycol - radius, mycol + radius + 1):
-                    if periodic == False and (c < 0 or c >= columns):
-                        continue
-
-                    nid = self.node_id(r % rows, c % columns)
-
-                    if nid != n:
-                        neighbor_id = ((r % rows) * self.size) + (c % columns)
-                        G.add_edge(n, neighbor_id)
-
+        G.add_nodes_from(range(rows * columns))
+        G.add_edges_from(lattice_edges(rows, columns, self.offsets(radius),
+                                       periodic=periodic))
         return G
 
     def add_node(self, id=-1, neighbors=[]):
@@ -197,46 +323,3 @@ class MooreTopology(Topology, Plugin):
         type"""
         raise ConfigurationError("remove_edge is not supported by MooreTopology")
         return
-
-
-    def get_nearest_node(self, coords, n=1):
-        """Return a list of the node(s) located nearest the given coordinates
-
-        Note that this overwrites the get_nearest_node method defined by
-        Topology (due to its simplicity vs using a k-d Tree).  This specific
-        implementation may be removed in future releases if the more complete
-        version in Topology is found to be better.
-
-        Parameters:
-
-        coords
-            Tuple defining the point in question.  The number of dimensions
-            should match the number of dimensions of the topology.
-        n
-            The number of nearest neighbors to find
-
-        """
-
-        if not coords or len(coords) < 1:
-            print("ERROR: Invalid coordinates for get_nearest_node")
-            return
-        elif n < 1:
-            print("ERROR: Invalid number of neighbors for get_nearest_node")
-            return
-
-        cell_width = 1.0 / self.size
-
-        nearest_x = floor(float(coords[0]) / cell_width) * cell_width
-        nearest_y = floor(float(coords[1]) / cell_width) * cell_width
-
-        nearest_col = int(floor(coords[0] / cell_width))
-        nearest_row = int(floor(coords[1] / cell_width))
-        nearest_node = self.node_id(nearest_row, nearest_col)
-
-        nearest = [nearest_node]
-
-        for i in range(n - 1):
-            print("ERROR: get_nearest_node only supports 1 neighbor at the moment")
-            # TODO: look at neighbors of calculated nearest point and expand out.  Append to nearest.
-
-        return nearest
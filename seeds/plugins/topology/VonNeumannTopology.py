@@ -8,9 +8,13 @@ neighbor.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
-
 import networkx as nx
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.Plugin import *
 from seeds.SEEDSError import *
 from seeds.Topology import *
@@ -37,6 +41,12 @@ class VonNeumannTopology(Topology, Plugin):
             border. (default: False)
         radius
             Number of hops within a focal node's neighborhood (default: 1)
+        implicit
+            Whether or not to compute neighbors and coordinates from each
+            node's row and column rather than building a graph.  This uses
+            almost no memory, but the topology has no graph, so it can only
+            be used by Populations of state-only Cells (see
+            Population.array_state).  (default: False)
 
     Example:
         [VonNeumannTopology]
@@ -54,6 +64,14 @@ class VonNeumannTopology(Topology, Plugin):
     __type__ = 2        
     __requirements__ = []
 
+    config_schema = {'size': (int, None),
+                     'periodic': (bool, False),
+                     'radius': (int, 1),
+                     'implicit': (bool, False)}
+
+    deterministic = True
+    shareable = True
+
     def __init__(self, experiment, label=None):
         """Initialize a VonNeumannTopology object"""
         super(VonNeumannTopology, self).__init__(experiment, label=label)
@@ -63,9 +81,12 @@ class VonNeumannTopology(Topology, Plugin):
         else:
             self.config_section = "%s" % ("VonNeumannTopology")
 
-        self.size = self.experiment.config.getint(self.config_section, 'size')
-        self.periodic = self.experiment.config.getboolean(self.config_section, 'periodic', default=False)
-        self.radius = self.experiment.config.getint(self.config_section, 'radius', default=1)
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+        self.size = self.settings.size
+        self.periodic = self.settings.periodic
+        self.radius = self.settings.radius
+        self.implicit = self.settings.implicit
         self.dimensions = 2
 
         if not self.size:
@@ -77,6 +98,22 @@ class VonNeumannTopology(Topology, Plugin):
         elif self.radius >= self.size:
             raise ConfigurationError("VonNeumannTopology: radius can not exceed grid size")
 
+        if self.implicit:
+            if np is None:
+                raise ConfigurationError("VonNeumannTopology: implicit lattices require NumPy")
+            elif self.periodic and 2 * self.radius + 1 > self.size:
+                raise ConfigurationError("VonNeumannTopology: implicit periodic lattices require size of at least 2 * radius + 1")
+
+            # No graph is built.  Neighbors and coordinates are computed from
+            # each node's row and column.
+            self.graph = None
+            self.adjacency = LatticeIndex(self.size, self.offsets(self.radius),
+                                          periodic=self.periodic)
+            return
+
+        if self.load_cache():
+            return
+
         self.graph = self.vonneumann_2d_graph(self.size, self.size,
                                               radius=self.radius,
                                               periodic=self.periodic)
@@ -84,6 +121,9 @@ class VonNeumannTopology(Topology, Plugin):
         for n in self.graph.nodes():
             self.graph.node[n]['coords'] = (self.row(n)/float(self.size), self.column(n)/float(self.size))
 
+        self.compile_adjacency()
+        self.save_cache()
+
     def __str__(self):
         """Produce a string to be used when an object is printed"""
         return 'Von Neumann Topology (%d nodes, %d radius)' % (self.size * self.size, self.radius)
@@ -97,7 +137,7 @@ class VonNeumannTopology(Topology, Plugin):
             The ID of the node in question
 
         """
-        return (nodeid/self.size)
+        return (nodeid//self.size)
 
     def column(self, nodeid):
         """Get the number of the column in which the given node is located
@@ -123,12 +163,69 @@ class VonNeumannTopology(Topology, Plugin):
         """
         return row * self.size + col
 
+    def diffuse(self, values, rates):
+        """Return an array containing the given per-node values after one
+        step of diffusion (see Topology.diffuse).  The lattice is treated as
+        a grid, so the transfers are computed with whole-grid array
+        operations (see lattice_diffuse).
+
+        Parameters:
+
+        *values*
+            An array of values indexed by node ID
+        *rates*
+            An array of the fraction of each node's excess that it sends
+
+        """
+
+        if self.periodic and 2 * self.radius + 1 > self.size:
+            # Periodic neighborhoods would wrap onto themselves
+            return super(VonNeumannTopology, self).diffuse(values, rates)
+
+        return lattice_diffuse(values, rates, self.adjacency.degrees(),
+                               self.size, self.offsets(self.radius),
+                               periodic=self.periodic)
+
+    def diffusion_spectrum(self, rate):
+        """Return the eigenvalues of one step of diffusion with the same
+        rate at every node, or None if the lattice is not periodic (see
+        Topology.diffusion_spectrum)
+
+        Parameters:
+
+        *rate*
+            The fraction of each node's excess that it sends
+
+        """
+
+        if not self.periodic or 2 * self.radius + 1 > self.size:
+            return None
+
+        return lattice_diffusion_spectrum(self.size, self.offsets(self.radius), rate)
+
+    def offsets(self, radius):
+        """Return a list of the (row, column) offsets from a node to the
+        nodes in its von Neumann neighborhood (those within the given
+        Manhattan distance), in row-major order
+
+        Parameters:
+
+        *radius*
+            The radius of the neighborhood
+
+        """
+        return [(dr, dc) for dr in range(-radius, radius + 1)
+                for dc in range(-radius, radius + 1)
+                if 0 < abs(dr) + abs(dc) <= radius]
+
     def vonneumann_2d_graph(self, rows=0, columns=0, radius=0,
                             periodic=False):
         """ Return the 2d grid graph of rows x columns nodes, each connected to
         its nearest Von Neumann neighbors within a given radius.  Optional
         argument periodic=True will connect boundary nodes via periodic
-        boundary conditions.
+        boundary conditions.  The edges to all nodes within the radius are
+        generated at once from the neighborhood's offsets (see
+        lattice_edges).
 
         Parameters:
 
@@ -143,28 +240,12 @@ class VonNeumannTopology(Topology, Plugin):
             Prevent edge effects using periodic boundaries
 
         """
-        
-        if radius == 0:
-            G = nx.empty_graph()
-            G.add_edges_from(rows * columns)
-        else:
-            H = nx.grid_graph(dim=[rows,columns], periodic=periodic)
-
-            m = {}
-            for r in range(rows):
-                for c in range(columns):
-                    m[(r,c)] = (r * columns) + c
-
-            H = nx.relabel_nodes(H, m)
-            G = H.copy()
-
-            for i in range(radius - 1):
-                for n in H.nodes():
-                    for neighbor in H.neighbors(n):
-                        for nn in H.neighbors(neighbor):
-                            G.add_edge(n, nn)
 
+        G = nx.empty_graph()
         G.name = "vonneumann_2d_radius_graph"
+        G.add_nodes_from(range(rows * columns))
+        G.add_edges_from(lattice_edges(rows, columns, self.offsets(radius),
+                                       periodic=periodic))
         return G
 
     def add_node(self, id=-1, neighbors=[]):
@@ -188,45 +269,3 @@ class VonNeumannTopology(Topology, Plugin):
         type"""
         raise ConfigurationError("remove_edge is not supported by VonNeumannTopology")
         return
-
-    def get_nearest_node(self, coords, n=1):
-        """Return a list of the node(s) located nearest the given coordinates
-
-        Note that this overwrites the get_nearest_node method defined by
-        Topology (due to its simplicity vs using a k-d Tree).  This specific
-        implementation may be removed in future releases if the more complete
-        version in Topology is found to be better.
-
-        Parameters:
-
-        coords
-            Tuple defining the point in question.  The number of dimensions
-            should match the number of dimensions of the topology.
-        n
-            The number of nearest neighbors to find
-
-        """
-
-        if not coords or len(coords) < 1:
-            print("ERROR: Invalid coordinates for get_nearest_node")
-            return
-        elif n < 1:
-            print("ERROR: Invalid number of neighbors for get_nearest_node")
-            return
-
-        cell_width = 1.0 / self.size
-
-        nearest_x = floor(float(coords[0]) / cell_width) * cell_width
-        nearest_y = floor(float(coords[1]) / cell_width) * cell_width
-
-        nearest_col = int(floor(coords[0] / cell_width))
-        nearest_row = int(floor(coords[1] / cell_width))
-        nearest_node = self.node_id(nearest_row, nearest_col)
-
-        nearest = [nearest_node]
-
-        for i in range(n - 1):
-            print("ERROR: get_nearest_node only supports 1 neighbor at the moment")
-            # TODO: look at neighbors of calculated nearest point and expand out.  Append to nearest.
-
-        return nearest
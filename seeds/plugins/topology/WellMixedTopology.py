@@ -17,7 +17,6 @@ be located throughout the environment.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
-import random
 import networkx as nx
 
 from seeds.Plugin import *
@@ -43,11 +42,28 @@ class WellMixedTopology(Topology, Plugin):
         dimensions
             The number of dimensions in space that this topology occupies.
             (default: 2)
+        resample_neighbors
+            Whether or not to draw a new set of neighbors each time a Cell is
+            updated.  Cells then do not keep a list of their neighbors, which
+            saves memory in large populations.  Otherwise, each Cell's
+            neighbors are drawn once, when the population is created.
+            (default: False)
+
+    Neighbors are drawn uniformly from the other nodes, without replacement.
+    Only the num_interactions sampled IDs are generated, so drawing a set of
+    neighbors takes time proportional to num_interactions rather than the
+    size of the population.
+
+    The graph, along with the coordinates of its nodes, is built the first
+    time it is used.  Populations that only keep the number of Cells of each
+    type (see Population's count update_mode) need nothing but the number of
+    nodes, so no per-node objects are created for them.
 
     Example:
         [WellMixedTopology]
         size = 100000
         num_interactions = 10
+        resample_neighbors = True
 
 
     """
@@ -60,6 +76,13 @@ class WellMixedTopology(Topology, Plugin):
     __type__ = 2        
     __requirements__ = []
 
+    config_schema = {'size': (int, None),
+                     'num_interactions': (int, None),
+                     'dimensions': (int, 2),
+                     'resample_neighbors': (bool, False)}
+
+    well_mixed = True
+
     def __init__(self, experiment, label=None):
         """Initialize a WellMixedTopology object
 
@@ -79,14 +102,15 @@ class WellMixedTopology(Topology, Plugin):
         else:
             self.config_section="%s" % ("WellMixedTopology")
 
-        self.size = self.experiment.config.getint(section=self.config_section,
-                                                  name='size')
-        self.num_interactions = self.experiment.config.getint(section=self.config_section,
-                                                              name='num_interactions',
-                                                              default=self.size)
-        self.dimensions = self.experiment.config.getint(section=self.config_section,
-                                                        name="dimensions",
-                                                        default=2)
+        self.settings = self.experiment.config.compile(self.config_section,
+                                                       self.config_schema)
+        self.size = self.settings.size
+        if self.settings.num_interactions is None:
+            self.num_interactions = self.size
+        else:
+            self.num_interactions = self.settings.num_interactions
+        self.dimensions = self.settings.dimensions
+        self.resample_neighbors = self.settings.resample_neighbors
         if not self.size:
             raise ConfigurationError("WellMixedTopology: size must be defined")
         elif self.size < 1:
@@ -98,12 +122,62 @@ class WellMixedTopology(Topology, Plugin):
         elif self.dimensions < 1:
             raise ConfigurationError("GrowthTopology: Number of dimensions must be at least 1")
 
-        self.graph = nx.empty_graph()
-        self.graph.name = "well_mixed_graph"
-        self.graph.add_nodes_from(list(range(self.size)))
+        # The graph is built when it is first used (see graph)
+        self._graph = None
+
+        # The IDs of the nodes, from which neighbors are drawn by position.
+        # This is a list only once nodes have been added or removed, and
+        # _node_positions then maps each ID to its position in the list.
+        self.node_ids = range(self.size)
+        self._node_positions = None
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = self.build_graph()
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    def build_graph(self):
+        """Build the graph: one node for each of the size nodes, with no
+        edges, each placed at random coordinates"""
+        G = nx.empty_graph()
+        G.name = "well_mixed_graph"
+        G.add_nodes_from(range(self.size))
+
+        for n in G.nodes():
+            G.node[n]['coords'] = tuple([self.rng.random() for i in range(self.dimensions)])
 
-        for n in self.graph.nodes():
-            self.graph.node[n]['coords'] = tuple([random.random() for i in xrange(self.dimensions)])
+        return G
+
+    def nodes(self):
+        """Get a list of the IDs of the nodes in the topology"""
+        if self._graph is None:
+            return self.node_ids
+        return self._graph.nodes()
+
+    def num_nodes(self):
+        """Get the number of nodes in the topology"""
+        if self._graph is None:
+            return self.size
+        return len(self._graph)
+
+    def has_node(self, node):
+        """Return whether or not the given node exists in the topology
+
+        Parameters:
+
+        *node*
+            The ID of the node in question
+
+        """
+
+        if self._graph is None:
+            return 0 <= node < self.size
+        return self._graph.has_node(node)
 
     def __str__(self):
         """Produce a string to be used when an object is printed"""
@@ -119,7 +193,35 @@ class WellMixedTopology(Topology, Plugin):
 
         """
 
-        return random.sample(self.graph.nodes(), self.num_interactions)
+        ids = self.node_ids
+        n = len(ids)
+        k = min(self.num_interactions, n - 1)
+        if k < 1:
+            return []
+
+        if 2 * k < n:
+            # Draw positions until k distinct nodes other than the given node
+            # have been found.  Few draws are rejected when k is small.
+            random = self.rng.random
+            drawn = set([node])
+            neighbors = []
+            while len(neighbors) < k:
+                neighbor = ids[int(random() * n)]
+                if neighbor not in drawn:
+                    drawn.add(neighbor)
+                    neighbors.append(neighbor)
+            return neighbors
+
+        # Draw one extra node and reject the given node if it was drawn.
+        # Otherwise, the last node drawn is dropped, which leaves a uniform
+        # sample of the others since sample returns nodes in selection order.
+        neighbors = [ids[i] for i in self.rng.sample(range(n), k + 1)]
+        try:
+            neighbors.remove(node)
+        except ValueError:
+            neighbors.pop()
+
+        return neighbors
 
     def add_edge(self, src, dest):
         """Add an edge to the graph.  Not supported by this topology type"""
@@ -132,7 +234,13 @@ class WellMixedTopology(Topology, Plugin):
         raise ConfigurationError("remove_edge is not supported by WellMixedTopology")
         return
 
-    def add_node(self, id=-1, neighbors=[]):
+    def _track_nodes(self):
+        """Make node_ids a list that can be changed in place"""
+        if self._node_positions is None:
+            self.node_ids = list(self.node_ids)
+            self._node_positions = dict((n, i) for (i, n) in enumerate(self.node_ids))
+
+    def add_node(self, id=None, neighbors=[], coords=None):
         """Add a node to the graph.  Topologies that do not wish to support
         this should redefine this method to do nothing.  This method will
         not place a Cell or ResourceCell in the newly-created node.  That
@@ -144,19 +252,49 @@ class WellMixedTopology(Topology, Plugin):
         Parameters:
 
         id
-            The ID to use for the new node.  If none is specified (or -1), the
-            ID used will be the current largest ID in the graph plus 1.
+            The ID to use for the new node.  If none is specified (or -1), one
+            is chosen by new_node_id.
         neighbors
             An optional list of node IDs that will be connected to the new node
             via an edge. NonExistentNodeError will be raised if any of these
             nodes do not exist. ***This argument is ignored***
+        coords
+            A tuple containing the coordinates of the new node.  If none are
+            given, random coordinates are used.
 
         """
 
-        if id == -1:
-            self.graph.add_node(max(self.graph.nodes()) + 1)
-        else:
-            self.graph.add_node(id)
+        if id is None or id == -1:
+            id = self.new_node_id()
+        elif self.graph.has_node(id):
+            return
+        if not coords:
+            coords = tuple([self.rng.random() for i in range(self.dimensions)])
+
+        self._track_nodes()
+        self.graph.add_node(id)
+        self.graph.node[id]['coords'] = coords
+        self.size = len(self.graph)
+        self._node_positions[id] = len(self.node_ids)
+        self.node_ids.append(id)
+
+    def remove_node(self, id):
+        """Remove a node from the graph
+
+        Parameters:
+
+        id
+            The ID to use of the node to be deleted.
+
+        """
+
+        super(WellMixedTopology, self).remove_node(id)
 
-        self.graph.node[id]['coords'] = (random.random(),random.random())
+        # Move the last ID into the removed node's place
+        self._track_nodes()
+        position = self._node_positions.pop(id)
+        last = self.node_ids.pop()
+        if position < len(self.node_ids):
+            self.node_ids[position] = last
+            self._node_positions[last] = position
 
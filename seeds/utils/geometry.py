@@ -7,6 +7,13 @@ calculating distances.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
+from math import ceil, sqrt
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from seeds.utils.numeric import is_numeric
 
 def minkowski_distance_p(point1, point2, p=2, periodic=False):
@@ -132,3 +139,350 @@ def manhattan_distance(p1, p2, periodic=False):
 
     return minkowski_distance(point1=p1, point2=p2, p=1, periodic=periodic)
 
+
+class CellList(object):
+    """A cell list of points in the unit square.  The square is divided into
+    a grid of cells that are at least as wide as a given radius, and the
+    points are sorted by the cell in which they fall.  All points within the
+    radius of a point then lie in its own cell or one of the 8 surrounding
+    cells, so only those need to be searched.  A CellList can also answer
+    nearest-point and radius queries for arbitrary coordinates (see nearest
+    and within), for which a radius of 0 gives cells holding about one
+    point each.  Requires NumPy.
+
+    Properties:
+
+    points
+        An (N, 2) array containing the coordinates of the points
+    radius
+        The radius of the searches to be done
+    periodic
+        Whether or not periodic boundaries are used
+    num_cells
+        The number of cells along each side of the square
+    order
+        An array of point indices sorted by cell
+    starts
+        An array containing the position in order at which the points of
+        each cell begin
+    counts
+        An array containing the number of points in each cell
+
+    """
+
+    # The cells adjacent to a cell, omitting those that are the mirror of
+    # another, so that each pair of neighboring cells is visited once
+    HALF_NEIGHBORHOOD = [(0, 1), (1, -1), (1, 0), (1, 1)]
+
+    def __init__(self, points, radius, periodic=False):
+        """Create a CellList
+
+        Parameters:
+
+        *points*
+            An (N, 2) array containing the coordinates of the points, each
+            in [0, 1)
+        *radius*
+            The radius of the searches to be done
+        *periodic*
+            Whether or not periodic boundaries are used
+
+        """
+
+        self.points = np.asarray(points, dtype=np.float64)
+        self.radius = radius
+        self.periodic = periodic
+
+        # Cells must be at least radius wide.  More cells than points only
+        # adds overhead, and with periodic boundaries, fewer than 3 cells per
+        # side would make a cell neighbor another from two directions.
+        n = len(self.points)
+        if radius > 0:
+            num_cells = min(int(1.0 / radius), max(1, int(sqrt(n))))
+        else:
+            num_cells = max(1, int(sqrt(n)))
+        if periodic and num_cells < 3:
+            num_cells = 1
+        self.num_cells = max(1, num_cells)
+
+        cells = self._cells(self.points[:, 0], self.points[:, 1])
+        self.order = np.argsort(cells, kind='stable')
+        self.counts = np.bincount(cells, minlength=self.num_cells**2)
+        self.starts = np.cumsum(self.counts) - self.counts
+        self._sorted_cells = cells[self.order]
+        self._x = self.points[self.order, 0]
+        self._y = self.points[self.order, 1]
+
+    def _cells(self, x, y):
+        """Return the cell containing each of the given coordinates"""
+        cx = np.clip(np.floor(x * self.num_cells).astype(np.int64), 0, self.num_cells - 1)
+        cy = np.clip(np.floor(y * self.num_cells).astype(np.int64), 0, self.num_cells - 1)
+        return cx * self.num_cells + cy
+
+    def _offset_cells(self, cells, dx, dy):
+        """Return the cells at the given offset from the given cells, along
+        with a mask of those that exist"""
+        cx = cells // self.num_cells + dx
+        cy = cells % self.num_cells + dy
+
+        if self.periodic:
+            valid = np.ones(len(cells), dtype=bool)
+            cx %= self.num_cells
+            cy %= self.num_cells
+        else:
+            valid = (cx >= 0) & (cx < self.num_cells) & (cy >= 0) & (cy < self.num_cells)
+
+        return (cx * self.num_cells + cy, valid)
+
+    def _distance_squared(self, a, b):
+        """Return the squared distances between the sorted points at
+        positions a and b"""
+        dx = np.abs(self._x[a] - self._x[b])
+        dy = np.abs(self._y[a] - self._y[b])
+
+        if self.periodic:
+            dx = np.minimum(dx, 1 - dx)
+            dy = np.minimum(dy, 1 - dy)
+
+        return dx * dx + dy * dy
+
+    def pairs(self, chunk_size=1<<22):
+        """Return an (E, 2) array of all pairs of points (by index) that are
+        less than radius apart.  Each pair is given once.  The candidate pairs
+        of each pair of neighboring cells are tested in vectorized chunks of
+        about chunk_size pairs.
+
+        Parameters:
+
+        *chunk_size*
+            The approximate number of candidate pairs to test at once
+
+        """
+
+        n = len(self.points)
+        if n < 2 or self.radius <= 0:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        occupancy = max(1, n // (self.num_cells**2))
+        step = max(1, chunk_size // occupancy)
+        r2 = self.radius * self.radius
+
+        if self.num_cells > 1:
+            offsets = [(0, 0)] + self.HALF_NEIGHBORHOOD
+        else:
+            offsets = [(0, 0)]
+
+        found = []
+        for (dx, dy) in offsets:
+            for first in range(0, n, step):
+                src = np.arange(first, min(n, first + step))
+                (targets, valid) = self._offset_cells(self._sorted_cells[src], dx, dy)
+                src = src[valid]
+                targets = targets[valid]
+
+                counts = self.counts[targets]
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+
+                a = np.repeat(src, counts)
+                within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                b = np.repeat(self.starts[targets], counts) + within
+
+                if (dx, dy) == (0, 0):
+                    keep = b > a
+                    (a, b) = (a[keep], b[keep])
+
+                keep = self._distance_squared(a, b) < r2
+                found.append(np.column_stack((self.order[a[keep]],
+                                              self.order[b[keep]])))
+
+        if len(found) == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        return np.concatenate(found)
+
+    def _covers(self, r):
+        """Return whether or not the cells within r cells of any cell
+        include every cell"""
+        if self.periodic:
+            return 2 * r + 1 >= self.num_cells
+        return r >= self.num_cells - 1
+
+    def _candidates(self, cells, r):
+        """Return arrays (q, b) pairing each of the given cells (by position
+        q) with the sorted positions b of the points in the cells within r
+        cells of it, including itself.  Each point is given at most once per
+        cell, and the pairs are grouped by q.
+
+        """
+
+        if self.periodic and self._covers(r):
+            steps = range(self.num_cells)
+        else:
+            r = min(r, self.num_cells - 1)
+            steps = range(-r, r + 1)
+
+        targets = []
+        valid = []
+        for dx in steps:
+            for dy in steps:
+                (t, v) = self._offset_cells(cells, dx, dy)
+                targets.append(np.where(v, t, 0))
+                valid.append(v)
+
+        # One row per query cell, so that its points are listed together
+        targets = np.column_stack(targets).ravel()
+        counts = np.where(np.column_stack(valid).ravel(), self.counts[targets], 0)
+        total = int(counts.sum())
+
+        q = np.repeat(np.arange(len(cells)), len(targets) // max(1, len(cells)))
+        q = np.repeat(q, counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        b = np.repeat(self.starts[targets], counts) + within
+
+        return (q, b)
+
+    def _query_distance_squared(self, coords, q, b):
+        """Return the squared distances between the query coordinates at
+        positions q and the sorted points at positions b"""
+        dx = np.abs(coords[q, 0] - self._x[b])
+        dy = np.abs(coords[q, 1] - self._y[b])
+
+        if self.periodic:
+            dx = np.minimum(dx, 1 - dx)
+            dy = np.minimum(dy, 1 - dy)
+
+        return dx * dx + dy * dy
+
+    def nearest(self, coords, k=1, chunk_size=1<<22):
+        """Return an (M, k) array containing, for each of M query points, the
+        indices of the k points nearest it, ordered by distance.  The cells
+        around each query are searched in growing blocks until the k nearest
+        points found are closer than any point outside the block.  If there
+        are fewer than k points, all of them are given.
+
+        Parameters:
+
+        *coords*
+            An (M, 2) array containing the coordinates of the query points
+        *k*
+            The number of points to find for each query
+        *chunk_size*
+            The approximate number of candidate points to test at once
+
+        """
+
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if self.periodic:
+            coords = coords % 1.0
+        n = len(self.points)
+        k = min(k, n)
+
+        result = np.zeros((len(coords), k), dtype=np.int64)
+        if k < 1 or len(coords) == 0:
+            return result
+
+        cells = self._cells(coords[:, 0], coords[:, 1])
+        width = 1.0 / self.num_cells
+        occupancy = max(float(n) / self.num_cells**2, 1e-9)
+
+        # Start with a block of cells that is expected to hold k points
+        r = max(1, int(ceil((sqrt(k / occupancy) - 1) / 2)))
+        pending = np.arange(len(coords))
+
+        while len(pending) > 0:
+            step = max(1, int(chunk_size / ((2 * r + 1)**2 * occupancy)))
+            unresolved = []
+
+            for first in range(0, len(pending), step):
+                queries = pending[first:first + step]
+                (q, b) = self._candidates(cells[queries], r)
+                d2 = self._query_distance_squared(coords[queries], q, b)
+
+                # Lay the candidates of each query out in a row, padded with
+                # infinite distances, and sort the rows
+                counts = np.bincount(q, minlength=len(queries))
+                starts = np.cumsum(counts) - counts
+                columns = np.arange(len(q)) - starts[q]
+                span = max(k, int(counts.max()))
+
+                distances = np.full((len(queries), span), np.inf)
+                distances[q, columns] = d2
+                points = np.zeros((len(queries), span), dtype=np.int64)
+                points[q, columns] = b
+
+                ranked = np.argsort(distances, axis=1)[:, :k]
+                rows = np.arange(len(queries))[:, np.newaxis]
+
+                # Points outside the block are at least r cells away
+                done = counts >= k
+                if not self._covers(r):
+                    kth = distances[rows[:, 0], ranked[:, -1]]
+                    done &= kth <= (r * width)**2
+
+                nearest = points[rows[done], ranked[done]]
+                result[queries[done]] = self.order[nearest]
+                unresolved.append(queries[~done])
+
+            pending = np.concatenate(unresolved)
+            r += 1
+
+        return result
+
+    def within(self, coords, radius):
+        """Return a list containing, for each query point, an array of the
+        indices of the points within the given distance of it, ordered by
+        index
+
+        Parameters:
+
+        *coords*
+            An (M, 2) array containing the coordinates of the query points
+        *radius*
+            The distance within which to find points
+
+        """
+
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(coords) == 0:
+            return []
+        elif self.periodic:
+            coords = coords % 1.0
+
+        cells = self._cells(coords[:, 0], coords[:, 1])
+        r = int(ceil(radius * self.num_cells))
+
+        (q, b) = self._candidates(cells, r)
+        keep = self._query_distance_squared(coords, q, b) <= radius * radius
+        (q, found) = (q[keep], self.order[b[keep]])
+
+        order = np.argsort(q * len(self.points) + found)
+        counts = np.bincount(q, minlength=len(coords))
+        return np.split(found[order], np.cumsum(counts)[:-1])
+
+    def neighborhood(self, index):
+        """Return an array of the points (by index) in the cell containing
+        the given point and in the cells surrounding it.  This includes the
+        point itself.
+
+        Parameters:
+
+        *index*
+            The index of the point
+
+        """
+
+        cell = self._cells(self.points[index:index+1, 0], self.points[index:index+1, 1])
+        offsets = [(0, 0)] + self.HALF_NEIGHBORHOOD + [(-x, -y) for (x, y) in self.HALF_NEIGHBORHOOD]
+        if self.num_cells == 1:
+            offsets = [(0, 0)]
+
+        found = []
+        for (dx, dy) in offsets:
+            (target, valid) = self._offset_cells(cell, dx, dy)
+            if valid[0]:
+                t = target[0]
+                found.append(self.order[self.starts[t]:self.starts[t] + self.counts[t]])
+
+        return np.concatenate(found)
@@ -25,7 +25,7 @@ def parse_int_rangelist(s, sorted=False):
 
     """
 
-    range_pattern = "\s*(\-?\d+)\s*\-\s*(\-?\d+)\s*"
+    range_pattern = r"\s*(\-?\d+)\s*\-\s*(\-?\d+)\s*"
 
     retval = []
 
@@ -61,7 +61,7 @@ def parse_version_string(s):
 
     """
 
-    pattern = '^\s*(?P<operator>[<>=]+)?\s*(?P<major>\d+)\.(?P<minor>\d+)(\.(?P<patch>\d+))?\s*$'
+    pattern = r'^\s*(?P<operator>[<>=]+)?\s*(?P<major>\d+)\.(?P<minor>\d+)(\.(?P<patch>\d+))?\s*$'
     match = re.match(pattern, s)
 
     if match:
@@ -83,3 +83,52 @@ def parse_version_string(s):
         return retval
     else:
         raise VersionStringFormatError("'{s}' is not a valid version string".format(s=s))
+
+def parse_sweep_spec(s):
+    """Parse the definition of a parameter to sweep over and return a tuple
+    (section, parameter, values), where values is a list of strings.
+    Definitions are of the form:
+
+        <section>.<parameter>=<value>,<value>,...
+        <section>.<parameter>=<start>:<stop>:<step>
+
+    The first form lists the values to use.  The second defines a grid of
+    evenly-spaced values from start to stop (inclusive).  For example,
+    'Kerr07Cell.toxicity=0:0.5:0.25' gives the values 0, 0.25, and 0.5.
+
+    """
+
+    pattern = r'^\s*(?P<section>[A-Za-z0-9:_]+)\.(?P<parameter>[A-Za-z0-9_]+)\s*=\s*(?P<values>.+?)\s*$'
+    match = re.match(pattern, s)
+
+    if not match:
+        raise ConfigurationError("'{s}' is not a valid sweep definition".format(s=s))
+
+    valstr = match.group('values')
+    grid = valstr.split(':')
+
+    if len(grid) == 3:
+        try:
+            if all(re.match(r'^\s*-?\d+\s*$', g) for g in grid):
+                (start, stop, step) = [int(g) for g in grid]
+            else:
+                (start, stop, step) = [float(g) for g in grid]
+        except ValueError:
+            raise ConfigurationError("'{s}' is not a valid sweep grid".format(s=s))
+
+        if step <= 0 or stop < start:
+            raise ConfigurationError("'{s}' is not a valid sweep grid".format(s=s))
+
+        # Allow for rounding when deciding whether stop is included
+        count = int((stop - start) / float(step) + 1e-9) + 1
+        if isinstance(step, int) and isinstance(start, int):
+            values = [str(start + i * step) for i in range(count)]
+        else:
+            values = [repr(round(start + i * step, 12)) for i in range(count)]
+    else:
+        values = [v.strip() for v in valstr.split(',') if v.strip()]
+
+    if len(values) < 1:
+        raise ConfigurationError("'{s}' does not define any values".format(s=s))
+
+    return (match.group('section'), match.group('parameter'), values)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Pseudorandom number generators owned by an Experiment.
+
+Rather than sharing the global state of Python's random module, each
+Experiment creates an RNG from its seed, and each part of the experiment
+(topologies, the population, resources, actions, workers) draws from its own
+child stream spawned from it.  A child stream is determined only by the
+experiment's seed and the key used to spawn it, so the numbers a component
+draws do not depend on the order in which components are created or on how
+work is divided among threads or processes.
+"""
+
+__author__ = "Brian Connelly <bdc@bconnelly.net>"
+__credits__ = "Brian Connelly"
+
+import hashlib
+import random
+
+
+def derive_seed(entropy, spawn_key=()):
+    """Derive a 128-bit seed from the given entropy (e.g., an experiment's
+    seed) and a spawn key.  Different keys give unrelated seeds, and the
+    result is the same on every platform and in every process.
+
+    Parameters:
+
+    *entropy*
+        An integer seed
+    *spawn_key*
+        A tuple of strings or integers identifying a child stream
+
+    """
+
+    path = "/".join(["{0}".format(entropy)] + ["{0}".format(k) for k in spawn_key])
+    digest = hashlib.sha256(path.encode("utf-8")).hexdigest()
+    return int(digest[:32], 16)
+
+
+class RNG(random.Random):
+    """A pseudorandom number generator that can spawn independent child
+    streams.  RNG objects provide all of the methods of random.Random (e.g.,
+    random, randint, choice, sample, expovariate).
+
+    Properties:
+
+    entropy
+        The seed from which this stream and all of its children are derived
+    spawn_key
+        A tuple identifying this stream among the children of entropy.  The
+        root stream has an empty key.
+
+    Example:
+
+        rng = RNG(seed=1234)
+        topology_rng = rng.spawn("topology")
+        worker_rngs = [rng.spawn("worker", i) for i in range(4)]
+
+    """
+
+    def __init__(self, seed=0, spawn_key=()):
+        """Create an RNG
+
+        Parameters:
+
+        *seed*
+            An integer seed
+        *spawn_key*
+            A tuple identifying the child stream (default: the root stream)
+
+        """
+
+        self.entropy = seed
+        self.spawn_key = tuple(spawn_key)
+        super(RNG, self).__init__(derive_seed(self.entropy, self.spawn_key))
+
+    def __reduce__(self):
+        """Support pickling, e.g., for passing an RNG to another process"""
+        return (self.__class__, (self.entropy, self.spawn_key), self.getstate())
+
+    def spawn(self, *key):
+        """Return a new RNG for the child stream identified by the given key.
+        Spawning the same key always gives a stream with the same numbers,
+        independent of how much of this stream has been used.
+
+        Parameters:
+
+        *key*
+            One or more strings or integers identifying the child stream
+
+        """
+
+        return RNG(self.entropy, self.spawn_key + key)
+
+    def numpy_seed(self):
+        """Draw a seed suitable for a NumPy RandomState from this stream"""
+        return self.getrandbits(32)
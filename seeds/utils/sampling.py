@@ -7,11 +7,18 @@ algorithms, such as roulette selection.
 __author__ = "Brian Connelly <bdc@bconnelly.net>"
 __credits__ = "Brian Connelly"
 
+import bisect
 import itertools
 import random
+from math import exp, lgamma
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-def roulette_select(items=[], fitnesses=[], k=1):
+
+def roulette_select(items=[], fitnesses=[], k=1, rng=None):
     """Perform a fitness-proportional selection using a roulette wheel
 
     Parameters:
@@ -26,6 +33,9 @@ def roulette_select(items=[], fitnesses=[], k=1):
         this function.
     *k*
         Number of items to select (default: 1)
+    *rng*
+        The random number generator to use, such as an Experiment's RNG
+        (default: Python's random module)
 
     """
 
@@ -34,22 +44,50 @@ def roulette_select(items=[], fitnesses=[], k=1):
     elif len(items) < 1:
         print("Error: Must supply items to choose from")
 
-    total_fitness = float(sum(fitnesses))
-    rel_fitnesses = [f/total_fitness for f in fitnesses]
-    p = [sum(rel_fitnesses[:i+1]) for i in range(len(rel_fitnesses))]
+    if rng is None:
+        rng = random
+
+    # Items are selected by binary search of the cumulative fitnesses
+    total_fitness = 0.0
+    cumulative = []
+    for f in fitnesses:
+        total_fitness += f
+        cumulative.append(total_fitness)
+
+    _random, _bisect = rng.random, bisect.bisect_right
+    last = len(items) - 1
+    return [items[min(_bisect(cumulative, _random() * total_fitness), last)] for i in itertools.repeat(None, k)]
+
+def alias_select(items=[], fitnesses=[], k=1, rng=None):
+    """Perform a fitness-proportional selection using an alias table.  This
+    takes O(n) time to build the table, after which each selection takes
+    O(1) time, so it is faster than roulette_select when k is large.  To
+    select from the same items repeatedly, create an AliasTable once and
+    reuse it.
 
-    _random = random.random
+    Parameters:
+
+    *items*
+        A list of items from which to select
+    *fitnesses*
+        A list of (non-negative) fitnesses of the corresponding items
+    *k*
+        Number of items to select (default: 1)
+    *rng*
+        The random number generator to use (default: Python's random module)
 
-    winners = []
-    while len(winners) < k:
-        for i in range(len(items)):
-            if _random() < p[i]:
-                winners.append(items[i])
-                break
+    """
 
-    return winners
+    if len(items) != len(fitnesses):
+        print("Error: Must supply items")
+    elif len(items) < 1:
+        print("Error: Must supply items to choose from")
 
-def sample_with_replacement(items=[], k=1):
+    table = AliasTable(fitnesses)
+    _draw = table.draw
+    return [items[_draw(rng)] for i in itertools.repeat(None, k)]
+
+def sample_with_replacement(items=[], k=1, sampler=None, rng=None):
     """Get a list of samples from a given set of items with replacement.
 
     Parameters:
@@ -58,6 +96,12 @@ def sample_with_replacement(items=[], k=1):
         A list of items from which to select
     *k*
         Number of items to select (default: 1)
+    *sampler*
+        An optional BlockSampler.  If given, the samples are drawn from its
+        blocks of random numbers rather than one at a time.
+    *rng*
+        The random number generator to use when no sampler is given
+        (default: Python's random module)
 
     """
 
@@ -70,10 +114,16 @@ def sample_with_replacement(items=[], k=1):
     if k < 1:
         print("Error: Invalid number of samples")
 
-    _random, _int = random.random, int
+    if sampler is not None:
+        return sampler.sample(items, k)
+
+    if rng is None:
+        rng = random
+
+    _random, _int = rng.random, int
     return [items[_int(_random() * popsize)] for i in itertools.repeat(None, k)]
 
-def sample_without_replacement(items=[], k=1):
+def sample_without_replacement(items=[], k=1, rng=None):
     """Get a list of samples from a given set of items without replacement.
 
     This function is merely a wrapper for Python's random.sample()
@@ -84,7 +134,355 @@ def sample_without_replacement(items=[], k=1):
         A list of items from which to select
     *k*
         Number of items to select (default: 1)
+    *rng*
+        The random number generator to use (default: Python's random module)
+
+    """
+
+    if rng is None:
+        rng = random
+
+    return rng.sample(items, k)
+
+def hypergeometric_pmf(k, successes, total):
+    """Return a list containing the probability of drawing each number of
+    successes (0..k) when k items are drawn without replacement from a set
+    of total items, of which the given number are successes
+
+    Parameters:
+
+    *k*
+        The number of items drawn
+    *successes*
+        The number of successes among the items
+    *total*
+        The total number of items
+
+    """
+
+    def log_choose(n, r):
+        return lgamma(n + 1) - lgamma(r + 1) - lgamma(n - r + 1)
+
+    pmf = [0.0] * (k + 1)
+    for h in range(max(0, k - (total - successes)), min(k, successes) + 1):
+        pmf[h] = exp(log_choose(successes, h) +
+                     log_choose(total - successes, k - h) -
+                     log_choose(total, k))
+    return pmf
+
+
+class AliasTable(object):
+    """A table for selecting items with probability proportional to their
+    weights in O(1) time per selection (Walker's alias method, as described
+    by Vose).  Building the table takes O(n) time.
+
+    Each of the n slots holds one item and, with some probability, an alias
+    to a second item.  A selection picks a slot uniformly at random and
+    returns its item with the slot's probability, or otherwise its alias.
+
+    Properties:
+
+    size
+        The number of items
+    prob
+        List of the probability of returning the item of each slot
+    alias
+        List of the item returned by each slot otherwise
+
+    """
+
+    def __init__(self, weights):
+        """Build an AliasTable
+
+        Parameters:
+
+        *weights*
+            A sequence of the (non-negative) weights of the items.  At least
+            one weight must be positive.
+
+        """
+
+        self.size = len(weights)
+        total = float(sum(weights))
+        scaled = [w * self.size / total for w in weights]
+
+        self.prob = [1.0] * self.size
+        self.alias = list(range(self.size))
+        self._arrays = None
+
+        small = [i for i in range(self.size) if scaled[i] < 1.0]
+        large = [i for i in range(self.size) if scaled[i] >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # Any slots left over are due to rounding and keep probability 1
+
+    def __len__(self):
+        """Return the number of items"""
+        return self.size
+
+    def draw(self, rng=None):
+        """Select the index of one item
+
+        Parameters:
+
+        *rng*
+            The random number generator to use (default: Python's random
+            module)
+
+        """
+
+        if rng is None:
+            rng = random
+
+        # One random number picks both the slot and the outcome within it
+        x = rng.random() * self.size
+        i = int(x)
+        if x - i < self.prob[i]:
+            return i
+        else:
+            return self.alias[i]
+
+    def draw_indices(self, k, sampler):
+        """Select the indices of k items at once using random numbers from
+        the given BlockSampler, returned as an array.  Requires NumPy.
+
+        Parameters:
+
+        *k*
+            Number of items to select
+        *sampler*
+            The BlockSampler from which to draw random numbers
+
+        """
+
+        if self._arrays is None:
+            self._arrays = (np.array(self.prob), np.array(self.alias, dtype=np.intp))
+        prob, alias = self._arrays
+
+        x = sampler.uniform(k) * self.size
+        slots = np.minimum(x.astype(np.intp), self.size - 1)
+        return np.where(x - slots < prob[slots], slots, alias[slots])
+
+
+class BlockSampler(object):
+    """A source of uniform random numbers that are generated by NumPy in
+    large blocks and handed out as needed.  This avoids calling
+    random.random once per number.  Each block is kept as NumPy returns it,
+    without being copied.  Requires NumPy.
+
+    BlockSamplers are seeded from Python's random module by default, so the
+    numbers they produce are determined by the experiment's seed.
+
+    Properties:
+
+    block_size
+        The number of random numbers generated at a time
+    rng
+        The NumPy RandomState used to generate blocks
+
+    """
+
+    def __init__(self, seed=None, block_size=65536):
+        """Create a BlockSampler
+
+        Parameters:
+
+        *seed*
+            Seed for the generator.  If none is given, one is drawn from
+            Python's random module.
+        *block_size*
+            The number of random numbers to generate at a time (default:
+            65536)
+
+        """
+
+        if seed is None:
+            seed = random.randint(0, 2**32 - 1)
+
+        self.rng = np.random.RandomState(seed)
+        self.block_size = block_size
+        self._block = None
+        self._position = block_size
+
+    def _refill(self):
+        """Generate the next block of random numbers"""
+        self._block = self.rng.random_sample(self.block_size)
+        self._position = 0
+
+    def uniform(self, k):
+        """Return an array of k uniform random numbers in [0, 1)
+
+        Parameters:
+
+        *k*
+            The number of random numbers to get
+
+        """
+
+        out = np.empty(k)
+        filled = 0
+
+        while filled < k:
+            if self._position == self.block_size:
+                self._refill()
+
+            n = min(k - filled, self.block_size - self._position)
+            out[filled:filled + n] = self._block[self._position:self._position + n]
+            self._position += n
+            filled += n
+
+        return out
+
+    def indices(self, n, k):
+        """Return an array of k indices selected uniformly at random, with
+        replacement, from range(n)
+
+        Parameters:
+
+        *n*
+            The number of possible indices
+        *k*
+            The number of indices to select
+
+        """
+
+        # Guard against rounding up to n
+        return np.minimum((self.uniform(k) * n).astype(np.intp), n - 1)
+
+    def sample(self, items, k):
+        """Return a list of k items selected uniformly at random, with
+        replacement
+
+        Parameters:
+
+        *items*
+            A list of items from which to select
+        *k*
+            The number of items to select
+
+        """
+
+        return [items[i] for i in self.indices(len(items), k).tolist()]
+
+
+class SumTree(object):
+    """A binary tree of non-negative weights in which each internal node
+    stores the sum of its children.  Items can be selected with probability
+    proportional to their weights, and weights can be changed, in O(log n)
+    time.  This is used, for example, to choose the next event in
+    continuous-time (Gillespie) simulations.  Requires NumPy.
+
+    Properties:
+
+    size
+        The number of items
+    tree
+        Array storing the tree.  The root is at index 1, the children of node
+        i are at 2i and 2i+1, and the weight of item j is at capacity+j.
 
     """
 
-    return random.sample(items, k)
+    def __init__(self, weights):
+        """Build a SumTree
+
+        Parameters:
+
+        *weights*
+            A sequence of the (non-negative) weights of the items
+
+        """
+
+        weights = np.asarray(weights, dtype=np.float64)
+        self.size = len(weights)
+
+        self.capacity = 2
+        while self.capacity < self.size:
+            self.capacity *= 2
+
+        self.tree = np.zeros(2 * self.capacity)
+        self.tree[self.capacity:self.capacity + self.size] = weights
+
+        # Fill in the internal nodes one level at a time, bottom-up
+        level = self.capacity // 2
+        while level >= 1:
+            children = self.tree[2 * level:4 * level]
+            self.tree[level:2 * level] = children[0::2] + children[1::2]
+            level //= 2
+
+    def __len__(self):
+        """Return the number of items"""
+        return self.size
+
+    def total(self):
+        """Return the sum of all weights"""
+        return self.tree[1]
+
+    def weight(self, i):
+        """Return the weight of item i"""
+        return self.tree[self.capacity + i]
+
+    def update(self, items, weights):
+        """Set the weights of the given items
+
+        Internal sums are recomputed from their children rather than adjusted
+        by differences, so rounding errors do not accumulate.
+
+        Parameters:
+
+        *items*
+            An array of item indices
+        *weights*
+            An array of the new weights for those items
+
+        """
+
+        tree = self.tree
+        positions = np.asarray(items, dtype=np.intp) + self.capacity
+        tree[positions] = weights
+
+        # All leaves are at the same depth, so their ancestors can be updated
+        # one level at a time
+        while positions[0] > 1:
+            positions = np.unique(positions // 2)
+            tree[positions] = tree[2 * positions] + tree[2 * positions + 1]
+
+    def find(self, u):
+        """Return the index of the item selected by u, a number in [0, 1),
+        with each item selected with probability proportional to its weight
+
+        Parameters:
+
+        *u*
+            A uniform random number in [0, 1)
+
+        """
+
+        tree = self.tree
+        target = u * tree[1]
+        i = 1
+
+        while i < self.capacity:
+            left = tree[2 * i]
+            if target < left:
+                i = 2 * i
+            else:
+                target -= left
+                i = 2 * i + 1
+
+        # Guard against rounding leading to an item with no weight
+        while tree[i] <= 0 and i > self.capacity:
+            i -= 1
+
+        return i - self.capacity
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Support for parameter sweeps, in which an experiment is run at every point of
+a grid of configuration values.  The outcome of each point is kept in a local
+SQLite database keyed by a hash of the point's full configuration, seed, and
+SEEDS version, so that an interrupted sweep can be resumed without re-running
+the points that have already finished.
+"""
+
+__author__ = "Brian Connelly <bdc@bconnelly.net>"
+__credits__ = "Brian Connelly"
+
+import datetime
+import hashlib
+import itertools
+import json
+import sqlite3
+import sys
+
+if sys.version_info[0] == 3:
+    import configparser
+else:
+    import ConfigParser as configparser
+
+from seeds.utils.parsing import parse_sweep_spec
+
+
+def expand_sweep(specs):
+    """Expand a list of sweep definitions (see parse_sweep_spec) into the
+    list of all points on their grid.  Each point is a list of (section,
+    parameter, value) tuples, with one tuple per swept parameter.  Repeated
+    values are only used once, and definitions of a parameter that was
+    already defined add their values to it, so no two points are the same.
+
+    Parameters:
+
+    *specs*
+        A list of sweep definition strings
+
+    """
+
+    axes = []
+    index = {}
+    for s in specs:
+        (section, parameter, values) = parse_sweep_spec(s)
+        if (section, parameter) not in index:
+            index[(section, parameter)] = len(axes)
+            axes.append([])
+
+        axis = axes[index[(section, parameter)]]
+        for v in values:
+            if (section, parameter, v) not in axis:
+                axis.append((section, parameter, v))
+
+    return [list(p) for p in itertools.product(*axes)]
+
+def canonical_config(filename, overrides=[]):
+    """Return a canonical string representation of a configuration file with
+    the given values overridden.  Two configurations that define the same
+    values produce the same string, regardless of ordering or formatting.
+
+    Parameters:
+
+    *filename*
+        The name of the configuration file
+    *overrides*
+        A list of (section, parameter, value) tuples to apply
+
+    """
+
+    parser = configparser.RawConfigParser()
+    parser.optionxform = str
+    parser.read(filename)
+
+    for (section, parameter, value) in overrides:
+        if not parser.has_section(section):
+            parser.add_section(section)
+        parser.set(section, parameter, str(value))
+
+    sections = {}
+    for sec in parser.sections():
+        sections[sec] = dict((o, parser.get(sec, o).strip()) for o in parser.options(sec))
+
+    return json.dumps(sections, sort_keys=True, separators=(',', ':'))
+
+def point_key(config, label, seed, version):
+    """Return the key identifying one run: a SHA-256 hash of the canonical
+    configuration, the label of the experiment, the seed, and the SEEDS
+    version
+
+    Parameters:
+
+    *config*
+        The canonical configuration (see canonical_config)
+    *label*
+        The label of the experiment (or None)
+    *seed*
+        The seed for the run
+    *version*
+        The SEEDS version string
+
+    """
+
+    ident = json.dumps([config, label, seed, version], separators=(',', ':'))
+    return hashlib.sha256(ident.encode('utf-8')).hexdigest()
+
+
+class ResultStore(object):
+    """A SQLite database recording the outcome of each run of a sweep.  Only
+    the process that owns the store should write to it.
+
+    Properties:
+
+    filename
+        The name of the database file
+    connection
+        The sqlite3 connection to the database
+
+    """
+
+    def __init__(self, filename):
+        """Open (creating if needed) a ResultStore
+
+        Parameters:
+
+        *filename*
+            The name of the database file
+
+        """
+
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS results (
+                                       key TEXT PRIMARY KEY,
+                                       params TEXT,
+                                       seed INTEGER,
+                                       version TEXT,
+                                       data_dir TEXT,
+                                       status INTEGER,
+                                       error TEXT,
+                                       runtime REAL,
+                                       summary TEXT,
+                                       finished TEXT)""")
+        self.connection.commit()
+
+    def is_finished(self, key):
+        """Return whether or not the run with the given key finished
+        successfully
+
+        Parameters:
+
+        *key*
+            The key of the run (see point_key)
+
+        """
+
+        row = self.connection.execute("SELECT status FROM results WHERE key = ?",
+                                      (key,)).fetchone()
+        return row is not None and row[0] == 0
+
+    def record(self, key, params, seed, version, data_dir, status, error='',
+               runtime=0.0, summary=None):
+        """Record the outcome of a run, replacing any earlier record for it
+
+        Parameters:
+
+        *key*
+            The key of the run (see point_key)
+        *params*
+            A list of the (section, parameter, value) tuples for the point
+        *seed*
+            The seed used
+        *version*
+            The SEEDS version used
+        *data_dir*
+            The directory containing the data from the run
+        *status*
+            The exit status of the run (0 if it finished)
+        *error*
+            A description of any error that occurred
+        *runtime*
+            The duration of the run in seconds
+        *summary*
+            An optional JSON-serializable summary of the results
+
+        """
+
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (key, json.dumps(params), seed, version,
+                                 data_dir, status, error, runtime,
+                                 json.dumps(summary),
+                                 datetime.datetime.now().isoformat()))
+        self.connection.commit()
+
+    def close(self):
+        """Close the database"""
+        self.connection.close()
@@ -105,15 +105,19 @@ class TODO-CellTypeName(Cell):
         """
 
         # If state is updated based on the composition of the neighborhood,
-        # this code updates the list of neighboring Cell objects.
-        self.neighbors = self.get_neighbors()
+        # this code gets the list of neighboring Cell objects.
+        neighbors = self.neighbors
 
         # If a Cell's state depends on the level of some resource, at that
         # point in space, the following sample code gets the nearest cell for
-        # that resource and sets its value.
+        # that resource and sets its value.  ResourceCells are kept by the
+        # Resource, indexed by node ID, rather than in the topology's graph
+        # (which implicit topologies do not have).  Their levels are stored in
+        # the Resource's level array, so setting res_cell.level also updates
+        # res.field.levels.
         res = self.experiment.get_resource("RESOURCE_NAME")
         res_node = res.topology.get_nearest_node(coords=self.coords(), n=1)[0]
-        res_cell = res.topology.graph.node[res_node]['resource']
+        res_cell = res.cells[res_node]
         print("Current Resource Level: %f" % (res_cell.level))
 
         res_cell.level = max(0, res_cell.level - 1) # Consume up to 1 unit of resource
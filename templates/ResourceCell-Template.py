@@ -89,14 +89,11 @@ class TODO-ResourceCellName(ResourceCell):
         neighbors = self.get_neighbors()
 
         # TODO: calculate the new level
+        # NOTE: The levels of all ResourceCells are kept in one array owned by
+        # the Resource (see Resource.field), so setting the level here also
+        # makes it available to analytics without traversing the graph.
         self.level = TODO
 
-        # NOE: The levels of all ResourceCells are kept in a list.  This
-        # enables information about the distribution of resources to be
-        # retrieved without traversing the graph.  Here, we update the level
-        # associated with this cell.
-        self.experiment.data['resources'][self.resource.name]['levels'][self.id] = self.level
-
 
 # TODO: typically, any Actions associated with this ResourceCell type are also
 # defined in this file.  Refer to the Action template for more information.
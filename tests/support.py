@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the SEEDS test suite
+"""
+
+import os
+import shutil
+import tempfile
+import textwrap
+
+from seeds.Experiment import Experiment
+
+
+def make_experiment(config, seed=1, setup=True):
+    """Create an Experiment from the given configuration text, with its data
+    directory in a new temporary directory.  The [Experiment] section's
+    data_dir is set automatically.  The temporary directory is removed by
+    cleanup_experiment.
+
+    Parameters:
+
+    *config*
+        The contents of the configuration file
+    *seed*
+        The seed for the Experiment (default: 1)
+    *setup*
+        Whether or not to set up the Experiment (default: True)
+
+    """
+
+    tmpdir = tempfile.mkdtemp(prefix='seeds-test-')
+    config = textwrap.dedent(config)
+    data_dir = os.path.join(tmpdir, 'data')
+    config = config.replace('[Experiment]', '[Experiment]\ndata_dir = %s' % data_dir, 1)
+
+    filename = os.path.join(tmpdir, 'seeds.cfg')
+    with open(filename, 'w') as f:
+        f.write(config)
+
+    e = Experiment(configfile=filename, seed=seed)
+    e._test_dir = tmpdir
+    if setup:
+        try:
+            e.setup()
+        except Exception:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+    return e
+
+
+def cleanup_experiment(e):
+    """Tear down an Experiment created by make_experiment and remove its
+    temporary directory"""
+    if e.is_setup:
+        e.teardown()
+    shutil.rmtree(e._test_dir, ignore_errors=True)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the Actions included with SEEDS
+"""
+
+import os
+import unittest
+
+from seeds.SEEDSError import ConfigurationError
+from tests.support import make_experiment, cleanup_experiment
+
+
+IMPLICIT_CONFIG = """
+[Experiment]
+epochs = 2
+actions = {actions}
+
+[Population]
+topology = MooreTopology
+cell = RPSCell
+array_state = True
+
+[MooreTopology]
+size = 8
+periodic = True
+implicit = True
+
+[PrintCellLocations]
+frequency = 1
+
+[PrintPopulationTypeClusters]
+frequency = 1
+
+[PrintPopulationGraphProperties]
+frequency = 1
+"""
+
+
+class TestImplicitTopologyActions(unittest.TestCase):
+    """Actions on Populations whose topology has no graph"""
+
+    def run_experiment(self, actions):
+        e = make_experiment(IMPLICIT_CONFIG.format(actions=actions))
+        self.addCleanup(cleanup_experiment, e)
+        self.assertIsNone(e.population.topology.graph)
+        for epoch in e:
+            pass
+        return e
+
+    def test_print_cell_locations(self):
+        e = self.run_experiment('PrintCellLocations')
+        path = os.path.join(e.settings.data_dir, 'cell_locations-000001.csv')
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1 + 64)
+
+    def test_print_population_type_clusters(self):
+        e = self.run_experiment('PrintPopulationTypeClusters')
+        e.teardown()
+        path = os.path.join(e.settings.data_dir, 'population_type_clusters.csv')
+        with open(path) as f:
+            rows = [l.split(',') for l in f.read().splitlines()[1:]]
+        self.assertEqual(len(rows), 2)
+
+    def test_graph_properties_rejected(self):
+        self.assertRaises(ConfigurationError, self.run_experiment,
+                          'PrintPopulationGraphProperties')
+
+
+if __name__ == '__main__':
+    unittest.main()
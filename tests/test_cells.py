@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the Cell types included with SEEDS
+"""
+
+import unittest
+
+import numpy as np
+
+from tests.support import make_experiment, cleanup_experiment
+
+
+RPS_CONFIG = """
+[Experiment]
+epochs = 5
+
+[Population]
+topology = CartesianTopology
+cell = RPSCell
+array_state = {array_state}
+
+[CartesianTopology]
+size = 200
+expected_neighbors = 6
+
+[RPSCell]
+distance_dependent = True
+"""
+
+
+class TestRPSCell(unittest.TestCase):
+
+    def run_experiment(self, array_state):
+        e = make_experiment(RPS_CONFIG.format(array_state=array_state))
+        self.addCleanup(cleanup_experiment, e)
+        nodes = list(e.population.topology.nodes())
+        initial = [e.population.get_cell_type(n) for n in nodes]
+        for epoch in e:
+            pass
+        return (initial, [e.population.get_cell_type(n) for n in nodes])
+
+    def test_distance_dependent_cells_match_state(self):
+        """Cell objects choose the same distance-weighted competitors from
+        the adjacency index as the state-only update"""
+        (initial, cells) = self.run_experiment(array_state=False)
+        (_, state) = self.run_experiment(array_state=True)
+        self.assertNotEqual(initial, cells)
+        self.assertEqual(cells, state)
+
+
+LIFE_CONFIG = """
+[Experiment]
+epochs = 1
+
+[Population]
+topology = MooreTopology
+cell = GameOfLifeCell
+array_state = True
+update_mode = synchronous
+
+[MooreTopology]
+size = {size}
+periodic = {periodic}
+implicit = {implicit}
+"""
+
+
+class TestGameOfLifeCell(unittest.TestCase):
+
+    def population(self, size=12, periodic=True, implicit=False):
+        e = make_experiment(LIFE_CONFIG.format(size=size, periodic=periodic,
+                                               implicit=implicit))
+        self.addCleanup(cleanup_experiment, e)
+        return e.population
+
+    def test_synchronous_generation(self):
+        """One synchronous update applies the rules of Life to every node
+        at once"""
+        for periodic in (True, False):
+            for implicit in (False, True):
+                population = self.population(periodic=periodic, implicit=implicit)
+                alive = population.state.types == 0
+
+                population.update()
+
+                for n in range(len(alive)):
+                    live = sum(alive[m] for m in population.topology.get_neighbors(n))
+                    expected = live == 3 or (alive[n] and live == 2)
+                    self.assertEqual(population.state.types[n] == 0, expected)
+
+                counts = np.bincount(population.state.types, minlength=2).tolist()
+                self.assertEqual(population.experiment.data['population']['type_count'], counts)
+
+    def test_glider(self):
+        """A glider moves one row and one column every four generations"""
+        population = self.population(size=8, implicit=True)
+        (size, types) = (8, population.state.types)
+
+        cells = [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+        types[:] = 1
+        for (row, column) in cells:
+            types[row * size + column] = 0
+
+        for generation in range(4 * size):
+            population.update()
+            if generation % 4 == 3:
+                shift = generation // 4 + 1
+                expected = np.ones(size * size, dtype=types.dtype)
+                for (row, column) in cells:
+                    expected[((row + shift) % size) * size + (column + shift) % size] = 0
+                np.testing.assert_array_equal(population.state.types, expected)
+
+
+QUASISPECIES_CONFIG = """
+[Experiment]
+epochs = 5
+
+[Population]
+topology = MooreTopology
+cell = QuasispeciesCell
+array_state = {array_state}
+
+[MooreTopology]
+size = 12
+periodic = True
+
+[QuasispeciesCell]
+death_rate = 0.2
+genotype_length = 20
+site_mut_rate = 0.05
+narrow_polynomail_order = 4
+wide_max_value = 0.75
+"""
+
+
+class TestQuasispeciesCell(unittest.TestCase):
+
+    def run_experiment(self, array_state):
+        e = make_experiment(QUASISPECIES_CONFIG.format(array_state=array_state))
+        self.addCleanup(cleanup_experiment, e)
+        nodes = list(e.population.topology.nodes())
+        initial = [e.population.get_cell_type(n) for n in nodes]
+        for epoch in e:
+            pass
+        types = [e.population.get_cell_type(n) for n in nodes]
+        self.assertNotEqual(initial, types)
+        self.assertEqual(e.data['population']['type_count'],
+                         [types.count(t) for t in range(3)])
+        return e.population
+
+    def test_cells(self):
+        """Cells keep the type given by the peak bit of their genotype"""
+        population = self.run_experiment(array_state=False)
+        for n in population.topology.nodes():
+            cell = population.get_cell(n)
+            self.assertEqual(len(cell.genotype), 20)
+            if cell.type != cell.EMPTY:
+                self.assertEqual(cell.type, cell.genotype[0] + 1)
+
+    def test_state(self):
+        """Without Cell objects, the genotype is kept as the number of bits
+        set to 1"""
+        population = self.run_experiment(array_state=True)
+        ones = population.state.attributes['ones']
+        self.assertTrue(((ones >= 0) & (ones <= 19)).all())
+        self.assertGreater(len(np.unique(ones)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
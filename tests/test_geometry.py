@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the geometry utilities
+"""
+
+import unittest
+
+import numpy as np
+
+from seeds.utils.geometry import CellList
+
+
+def distances(a, b, periodic):
+    """Return the matrix of distances between the points of a and b"""
+    delta = np.abs(a[:, np.newaxis, :] - b[np.newaxis, :, :])
+    if periodic:
+        delta = np.minimum(delta, 1 - delta)
+    return np.sqrt((delta**2).sum(axis=2))
+
+
+class CellListTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.points = np.random.RandomState(3).random_sample((500, 2))
+
+
+class TestPairs(CellListTestCase):
+    """CellList.pairs finds the same pairs as comparing every pair"""
+
+    def check(self, radius, periodic, chunk_size=1<<22):
+        found = CellList(self.points, radius, periodic=periodic).pairs(chunk_size=chunk_size)
+        self.assertEqual(len(found), len(set(map(tuple, np.sort(found, axis=1).tolist()))))
+
+        d = distances(self.points, self.points, periodic)
+        expected = set(zip(*np.nonzero(np.triu(d < radius, k=1))))
+        self.assertEqual(set(map(tuple, np.sort(found, axis=1).tolist())), expected)
+
+    def test_pairs(self):
+        for periodic in (False, True):
+            for radius in (0.02, 0.07, 0.3, 0.6):
+                self.check(radius, periodic)
+
+    def test_small_chunks(self):
+        self.check(0.07, True, chunk_size=100)
+
+
+class TestQueries(CellListTestCase):
+    """CellList.nearest and within give the same points as measuring the
+    distance to every point"""
+
+    def setUp(self):
+        super(TestQueries, self).setUp()
+        random = np.random.RandomState(4)
+        self.queries = np.vstack((random.random_sample((200, 2)),
+                                  [[0.0, 0.0], [0.999, 0.5], [0.5, 0.5]]))
+
+    def test_nearest(self):
+        for periodic in (False, True):
+            for radius in (0, 0.05, 0.5):
+                cells = CellList(self.points, radius, periodic=periodic)
+                d = distances(self.queries, self.points, periodic)
+                for k in (1, 7, 40):
+                    expected = np.argsort(d, axis=1, kind='stable')[:, :k]
+                    np.testing.assert_array_equal(cells.nearest(self.queries, k=k), expected)
+
+    def test_nearest_small_chunks(self):
+        cells = CellList(self.points, 0, periodic=True)
+        expected = np.argsort(distances(self.queries, self.points, True), axis=1)[:, :5]
+        np.testing.assert_array_equal(cells.nearest(self.queries, k=5, chunk_size=50), expected)
+
+    def test_nearest_more_than_points(self):
+        cells = CellList(self.points[:10], 0)
+        found = cells.nearest(self.queries[:3], k=20)
+        self.assertEqual(found.shape, (3, 10))
+        for row in found:
+            self.assertEqual(sorted(row.tolist()), list(range(10)))
+
+    def test_within(self):
+        for periodic in (False, True):
+            cells = CellList(self.points, 0, periodic=periodic)
+            d = distances(self.queries, self.points, periodic)
+            for radius in (0.01, 0.08, 0.3):
+                found = cells.within(self.queries, radius)
+                self.assertEqual(len(found), len(self.queries))
+                for (row, points) in zip(d, found):
+                    np.testing.assert_array_equal(points, np.flatnonzero(row <= radius))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for Population
+"""
+
+import types
+import unittest
+
+import numpy as np
+
+from seeds.Topology import Topology
+from tests.support import make_experiment, cleanup_experiment
+
+
+POPULATION_CONFIG = """
+[Experiment]
+epochs = 1
+
+[Population]
+topology = MooreTopology
+cell = RPSCell
+
+[MooreTopology]
+size = 6
+periodic = True
+"""
+
+
+class TestCellNeighbors(unittest.TestCase):
+    """The neighbors of Cells follow the topology as it changes"""
+
+    def setUp(self):
+        self.e = make_experiment(POPULATION_CONFIG)
+        self.addCleanup(cleanup_experiment, self.e)
+        self.population = self.e.population
+        self.topology = self.population.topology
+
+        # MooreTopology is fixed, so use the generic Topology methods to
+        # change the graph
+        for name in ('add_node', 'remove_node', 'add_edge', 'remove_edge'):
+            setattr(self.topology, name,
+                    types.MethodType(getattr(Topology, name), self.topology))
+
+    def assertNeighborsMatchGraph(self):
+        for n in self.topology.graph.nodes():
+            cell = self.population.get_cell(n)
+            self.assertEqual(sorted(c.node for c in cell.neighbors),
+                             sorted(self.topology.graph.neighbors(n)))
+
+    def test_neighbors_from_adjacency(self):
+        self.assertIsNotNone(self.topology.adjacency)
+        self.assertNeighborsMatchGraph()
+
+    def test_connect_and_disconnect(self):
+        (a, b) = (self.population.get_cell(0), self.population.get_cell(21))
+        self.population.connect_cells(a, b)
+        self.assertIn(b, a.neighbors)
+        self.assertIn(a, b.neighbors)
+        self.assertNeighborsMatchGraph()
+
+        self.population.disconnect_cells(a, b)
+        self.assertNotIn(b, a.neighbors)
+        self.assertNotIn(a, b.neighbors)
+        self.assertNeighborsMatchGraph()
+
+    def test_add_and_remove_cell(self):
+        (a, b) = (self.population.get_cell(0), self.population.get_cell(21))
+        cell = self.population.add_cell(neighbors=[a, b], coords=(0.5, 0.5))
+        self.assertEqual(sorted(c.node for c in cell.neighbors), [0, 21])
+        self.assertIn(cell, a.neighbors)
+        self.assertNeighborsMatchGraph()
+
+        self.population.remove_cell(a)
+        self.assertEqual(cell.neighbors, [b])
+        self.assertNotIn(a, self.population.get_cell(1).neighbors)
+        self.assertNeighborsMatchGraph()
+
+        # The removed node's ID is reused
+        new = self.population.add_cell(neighbors=[cell], coords=(0.0, 0.0))
+        self.assertEqual(new.node, 0)
+        self.assertEqual(new.neighbors, [cell])
+        self.assertNeighborsMatchGraph()
+
+
+STATE_CONFIG = """
+[Experiment]
+epochs = 1
+
+[Population]
+topology = MooreTopology
+cell = {cell}
+array_state = True
+update_mode = {update_mode}
+batch_size = {batch_size}
+
+[MooreTopology]
+size = 20
+periodic = True
+
+[Kerr07Cell]
+death_sensitive = 0.25
+death_resistant = 0.2
+death_producer = 0.3
+toxicity = 0.6
+
+[QuasispeciesCell]
+death_rate = 0.2
+genotype_length = 20
+site_mut_rate = 0.05
+narrow_polynomail_order = 4
+wide_max_value = 0.75
+"""
+
+
+class StateTestCase(unittest.TestCase):
+    """Base class for tests of Populations that use array state"""
+
+    def population(self, cell='RPSCell', update_mode='random', batch_size=0, extra=''):
+        e = make_experiment(STATE_CONFIG.format(cell=cell, update_mode=update_mode,
+                                                batch_size=batch_size) + extra)
+        self.addCleanup(cleanup_experiment, e)
+        return e.population
+
+    def assertTypeCountsMatchState(self, population):
+        counts = np.bincount(population.state.types, minlength=population._cell_class.max_types)
+        type_count = population.experiment.data['population']['type_count']
+        self.assertEqual(list(type_count) + [0] * (len(counts) - len(type_count)),
+                         counts.tolist())
+
+
+class TestBatchedUpdates(StateTestCase):
+    """Batched updates give the same result as applying the same events one
+    at a time"""
+
+    def sequential(self, population, events):
+        """Draw the events of one batched update, and apply them one at a
+        time"""
+        kernel = population._cell_class.update_state_batch
+        rng = population._np_random
+        nodes = population._node_ids
+
+        for start in range(0, events, population.batch_size):
+            k = min(population.batch_size, events - start)
+            chunk = nodes[rng.randint(0, len(nodes), size=k)]
+            draws = rng.random_sample(k)
+            for i in range(k):
+                kernel(population, chunk[i:i+1], draws[i:i+1])
+
+    def check(self, cell, batch_size):
+        population = self.population(cell=cell, update_mode='batched',
+                                     batch_size=batch_size)
+        data = population.experiment.data['population']
+        initial = (population.state.types.copy(), list(data['type_count']),
+                   population._np_random.get_state())
+
+        for epoch in range(3):
+            population.update()
+        batched = (population.state.types.copy(), list(data['type_count']))
+
+        population.state.types[:] = initial[0]
+        data['type_count'][:] = initial[1]
+        population._np_random.set_state(initial[2])
+        for epoch in range(3):
+            self.sequential(population, len(population.state))
+
+        np.testing.assert_array_equal(batched[0], population.state.types)
+        self.assertEqual(batched[1], list(data['type_count']))
+        self.assertTypeCountsMatchState(population)
+
+    def test_rps(self):
+        for batch_size in (0, 1, 37, 400):
+            self.check('RPSCell', batch_size)
+
+    def test_kerr07(self):
+        for batch_size in (0, 50, 400):
+            self.check('Kerr07Cell', batch_size)
+
+
+class TestRateUpdates(StateTestCase):
+    """The rates kept for rate updates follow the state as it changes"""
+
+    def check(self, cell, extra=''):
+        population = self.population(cell=cell, update_mode='rate', extra=extra)
+        nodes = np.arange(len(population.state))
+        initial = population.state.types.copy()
+
+        for epoch in range(3):
+            population.update()
+            rates = population._cell_class.state_rates(population, nodes)
+            np.testing.assert_allclose([population._rates.weight(n) for n in nodes], rates)
+            self.assertTypeCountsMatchState(population)
+
+        self.assertFalse(np.array_equal(initial, population.state.types))
+
+    def test_rps(self):
+        self.check('RPSCell')
+        self.check('RPSCell', extra='[RPSCell]\ndistance_dependent = True\n')
+
+    def test_kerr07(self):
+        self.check('Kerr07Cell')
+
+    def test_quasispecies(self):
+        self.check('QuasispeciesCell')
+
+    def test_rps_rates(self):
+        """The rate of an RPSCell is the fraction of its neighbors of the
+        type that beats it"""
+        population = self.population()
+        types = population.state.types
+        rates = population._cell_class.state_rates(population, np.arange(len(types)))
+        for n in range(len(types)):
+            neighbors = population.topology.get_neighbors(n)
+            beats = [(types[m] - types[n]) % 3 == 1 for m in neighbors]
+            self.assertAlmostEqual(rates[n], sum(beats) / float(len(neighbors)))
+
+    def test_quasispecies_rates(self):
+        """An Empty node changes only if a neighbor has fitness, and any
+        other node changes when its Cell dies"""
+        population = self.population(cell='QuasispeciesCell')
+        (types, ones) = (population.state.types, population.state.attributes['ones'])
+        types[::3] = 0
+        ones[::4] = 0
+        rates = population._cell_class.state_rates(population, np.arange(len(types)))
+        for n in range(len(types)):
+            if types[n] == 0:
+                fit = [m for m in population.topology.get_neighbors(n) if types[m] and ones[m]]
+                self.assertEqual(rates[n], 1.0 if fit else 0.0)
+            else:
+                self.assertEqual(rates[n], 0.2)
+
+
+COUNT_CONFIG = """
+[Experiment]
+epochs = 1
+
+[Population]
+topology = WellMixedTopology
+cell = {cell}
+update_mode = count
+batch_size = {batch_size}
+events_per_epoch = {events}
+
+[WellMixedTopology]
+size = {size}
+
+[Kerr07Cell]
+death_sensitive = 0.25
+death_resistant = 0.2
+death_producer = 0.3
+toxicity = 0.6
+"""
+
+
+class TestCountUpdates(unittest.TestCase):
+
+    def population(self, cell='Kerr07Cell', batch_size=0, events=1000, size=1000):
+        e = make_experiment(COUNT_CONFIG.format(cell=cell, batch_size=batch_size,
+                                                events=events, size=size))
+        self.addCleanup(cleanup_experiment, e)
+        return e.population
+
+    def test_bookkeeping(self):
+        """Counts stay non-negative and sum to the size, and the recorded
+        transitions account for every change"""
+        for cell in ('RPSCell', 'Kerr07Cell'):
+            for batch_size in (0, 1, 7, 1000):
+                population = self.population(cell=cell, batch_size=batch_size)
+                data = population.experiment.data['population']
+
+                for epoch in range(5):
+                    before = population.counts.copy()
+                    population.update()
+                    moves = np.array(data['transitions'])
+
+                    self.assertEqual(population.counts.sum(), 1000)
+                    self.assertTrue((population.counts >= 0).all())
+                    np.testing.assert_array_equal(population.counts - before,
+                                                  moves.sum(axis=0) - moves.sum(axis=1))
+                    self.assertEqual(data['type_count'], population.counts.tolist())
+
+    def test_no_graph(self):
+        """Count mode needs only the number of nodes, so the topology never
+        builds its graph"""
+        population = self.population(size=10**7)
+        for epoch in range(3):
+            population.update()
+        self.assertIsNone(population.topology._graph)
+        self.assertEqual(population.topology.num_nodes(), 10**7)
+        self.assertEqual(population.counts.sum(), 10**7)
+
+    def test_expected_change(self):
+        """The mean change in the counts over a few events matches the
+        transition probabilities"""
+        for batch_size in (1, 20):
+            population = self.population(batch_size=batch_size, events=50, size=20000)
+            initial = population.counts.copy()
+
+            p = initial[:, np.newaxis] / 20000.0 * population._cell_class.count_transitions(population, initial)
+            np.fill_diagonal(p, 0)
+            expected = 50 * (p.sum(axis=0) - p.sum(axis=1))
+
+            change = np.zeros(len(initial))
+            for i in range(400):
+                population.counts[:] = initial
+                population.update()
+                change += population.counts - initial
+
+            np.testing.assert_allclose(change / 400, expected, atol=0.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for Resources and the ResourceCell types included with SEEDS
+"""
+
+import unittest
+
+import numpy as np
+
+from tests.support import make_experiment, cleanup_experiment
+
+
+RESOURCE_CONFIG = """
+[Experiment]
+epochs = {epochs}
+resources = {resources}
+resource_threads = {threads}
+
+[Population]
+topology = MooreTopology
+cell = RPSCell
+
+[MooreTopology]
+size = {size}
+periodic = {periodic}
+"""
+
+NORMAL_RESOURCE = """
+[Resource:{name}]
+topology = MooreTopology
+type = NormalResource
+initial = {initial}
+inflow = {inflow}
+decay = {decay}
+diffusion = {diffusion}
+update_mode = {update_mode}
+sample_events = {sample_events}
+dtype = {dtype}
+coupling_interval = {coupling_interval}
+"""
+
+
+class ResourceTestCase(unittest.TestCase):
+    """Base class for tests that need an Experiment with Resources"""
+
+    def experiment(self, resources, size=10, periodic=True, extra='', seed=1,
+                   epochs=1, threads=1):
+        """Create an Experiment with the given NormalResources, each given
+        as a dict of settings"""
+        config = RESOURCE_CONFIG.format(resources=','.join(r['name'] for r in resources),
+                                        size=size, periodic=periodic,
+                                        epochs=epochs, threads=threads)
+        for r in resources:
+            settings = dict(initial=0.0, inflow=0.0, decay=0.0, diffusion=0.5,
+                            update_mode='field', sample_events=False,
+                            dtype='float64', coupling_interval=1)
+            settings.update(r)
+            config += NORMAL_RESOURCE.format(**settings)
+        e = make_experiment(config + extra, seed=seed)
+        self.addCleanup(cleanup_experiment, e)
+        return e
+
+
+class TestNormalResourceField(ResourceTestCase):
+
+    def test_point_source(self):
+        e = self.experiment([dict(name='r', diffusion=0.3)])
+        r = e.resources['r']
+        r.cells[55].level = 100.0
+        r.update()
+
+        levels = r.field.levels
+        self.assertAlmostEqual(levels[55], 100.0 * (1 - 0.3 * 8 / 9.0))
+        for n in r.topology.get_neighbors(55):
+            self.assertAlmostEqual(levels[n], 100.0 * 0.3 / 9.0)
+        self.assertAlmostEqual(levels.sum(), 100.0)
+
+    def test_mass_balance(self):
+        e = self.experiment([dict(name='r', inflow=0.5, decay=0.1)], periodic=False)
+        r = e.resources['r']
+        r.field.levels[:] = np.random.RandomState(2).random_sample(100) * 10
+
+        for i in range(5):
+            before = r.field.levels.sum()
+            r.update()
+            self.assertAlmostEqual(r.field.levels.sum(), before * 0.9 + 100 * 0.5)
+        self.assertTrue((r.field.levels >= 0).all())
+
+
+FUSED_RESOURCES = [dict(name='a', diffusion=0.3, inflow=0.2, decay=0.05, sample_events=True),
+                   dict(name='b', diffusion=0.1, decay=0.2),
+                   dict(name='c', diffusion=0.5, inflow=1.0)]
+
+
+class TestResourceStage(ResourceTestCase):
+
+    def randomize(self, e, seed=3):
+        random = np.random.RandomState(seed)
+        for name in sorted(e.resources):
+            levels = e.resources[name].field.levels
+            levels[:] = random.random_sample(len(levels)) * 10
+
+    def check_fused(self, resources, epochs=6):
+        """Updating a fused group gives the same levels as updating each of
+        its Resources on its own"""
+        fused = self.experiment(resources)
+        separate = self.experiment(resources)
+        self.assertEqual([len(g) for g in fused.resource_stage.groups], [len(resources)])
+
+        self.randomize(fused)
+        self.randomize(separate)
+        for epoch in range(epochs):
+            fused.resource_stage.update()
+            for r in resources:
+                separate.resources[r['name']].update()
+
+        for r in resources:
+            np.testing.assert_allclose(fused.resources[r['name']].field.levels,
+                                       separate.resources[r['name']].field.levels,
+                                       rtol=1e-12)
+
+    def test_fused(self):
+        self.check_fused(FUSED_RESOURCES)
+
+    def test_fused_coupling_interval(self):
+        self.check_fused([dict(r, coupling_interval=3) for r in FUSED_RESOURCES], epochs=7)
+
+    def test_threads(self):
+        """The levels do not depend on the number of threads"""
+        resources = FUSED_RESOURCES + [dict(name='d', diffusion=0.2, dtype='float32'),
+                                       dict(name='e', inflow=0.3, coupling_interval=2,
+                                            sample_events=True),
+                                       dict(name='f', diffusion=0.4, update_mode='random')]
+        levels = []
+        for threads in (1, 4):
+            e = self.experiment(resources, epochs=5, threads=threads)
+            if threads > 1:
+                self.assertIsNotNone(e.resource_stage.executor)
+            self.assertEqual(len(e.resource_stage.groups), 4)
+            self.randomize(e)
+            for epoch in e:
+                pass
+            levels.append(dict((name, r.field.levels.copy()) for (name, r) in e.resources.items()))
+
+        for name in levels[0]:
+            np.testing.assert_array_equal(levels[0][name], levels[1][name])
+
+
+class TestNormalResourceAdvance(ResourceTestCase):
+    """Advancing a NormalResource by several epochs at once gives the same
+    levels as stepping through them"""
+
+    def check(self, e, epochs=7):
+        r = e.resources['r']
+        random = np.random.RandomState(4)
+        r.field.levels[:] = random.random_sample(len(r.field.levels)) * 10
+        initial = r.field.levels.copy()
+
+        r.advance(epochs)
+        advanced = r.field.levels.copy()
+
+        r.field.levels[:] = initial
+        for i in range(epochs):
+            r._resource_type_class.update_field(r, r.field_counts())
+
+        np.testing.assert_allclose(advanced, r.field.levels, rtol=1e-9, atol=1e-12)
+        self.assertFalse(np.allclose(advanced, initial))
+
+    def test_fft(self):
+        for settings in (dict(diffusion=0.3),
+                         dict(diffusion=0.7, inflow=0.4, decay=0.1),
+                         dict(diffusion=0.2, inflow=0.5)):
+            e = self.experiment([dict(name='r', **settings)])
+            self.assertIsNotNone(e.resources['r'].topology.diffusion_spectrum(0.5))
+            self.check(e)
+
+    def test_fft_odd_size(self):
+        self.check(self.experiment([dict(name='r', diffusion=0.4, decay=0.2)], size=9))
+
+    def test_stepped(self):
+        """Non-periodic lattices are stepped"""
+        e = self.experiment([dict(name='r', diffusion=0.4, inflow=0.1)], periodic=False)
+        self.assertIsNone(e.resources['r'].topology.diffusion_spectrum(0.5))
+        self.check(e)
+
+    def test_no_diffusion(self):
+        """Without diffusion, every node is solved on its own, even if their
+        parameters differ"""
+        e = self.experiment([dict(name='r', diffusion=0.0)])
+        field = e.resources['r'].field
+        random = np.random.RandomState(5)
+        field.array('inflow')[:] = random.random_sample(100)
+        field.array('decay')[:] = random.random_sample(100) * 0.3
+        field.array('decay')[::4] = 0
+        self.check(e)
+
+    def test_coupling_interval(self):
+        """A Resource with a coupling interval catches up every interval"""
+        resources = [dict(name='r', diffusion=0.3, inflow=0.2, decay=0.05)]
+        coupled = self.experiment([dict(resources[0], coupling_interval=4)])
+        stepped = self.experiment(resources)
+        for e in (coupled, stepped):
+            e.resources['r'].field.levels[:] = np.arange(100.0)
+
+        for epoch in range(8):
+            coupled.resources['r'].update()
+            stepped.resources['r'].update()
+            if epoch % 4 == 3:
+                np.testing.assert_allclose(coupled.resources['r'].field.levels,
+                                           stepped.resources['r'].field.levels,
+                                           rtol=1e-9)
+            else:
+                self.assertFalse(np.allclose(coupled.resources['r'].field.levels,
+                                             stepped.resources['r'].field.levels))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the sampling utilities
+"""
+
+import unittest
+
+import numpy as np
+
+from seeds.utils.sampling import BlockSampler, SumTree
+
+
+class TestBlockSampler(unittest.TestCase):
+
+    def test_stream_across_blocks(self):
+        """Numbers drawn in pieces that span several blocks are the
+        RandomState's stream, in order"""
+        sampler = BlockSampler(seed=7, block_size=10)
+        drawn = np.concatenate([sampler.uniform(k) for k in (3, 10, 1, 25, 0, 6)])
+        expected = np.random.RandomState(7).random_sample(len(drawn))
+        self.assertTrue(np.array_equal(drawn, expected))
+
+    def test_indices(self):
+        sampler = BlockSampler(seed=7, block_size=16)
+        indices = sampler.indices(5, 1000)
+        self.assertEqual(len(indices), 1000)
+        self.assertEqual(set(indices.tolist()), set(range(5)))
+
+
+class TestSumTree(unittest.TestCase):
+
+    def check(self, tree, weights):
+        """The tree selects the same items as a search of the cumulative
+        weights"""
+        self.assertAlmostEqual(tree.total(), weights.sum())
+        cumulative = np.cumsum(weights)
+        for u in np.random.RandomState(1).random_sample(2000):
+            expected = np.searchsorted(cumulative, u * cumulative[-1], side='right')
+            found = tree.find(u)
+            self.assertGreater(weights[found], 0)
+            if abs(cumulative[min(expected, len(weights) - 1)] - u * cumulative[-1]) > 1e-9:
+                self.assertEqual(found, expected)
+
+    def test_find(self):
+        for size in (1, 2, 5, 64, 100):
+            weights = np.random.RandomState(size).random_sample(size)
+            weights[::3] = 0
+            weights[-1] = 0.5
+            self.check(SumTree(weights), weights)
+
+    def test_update(self):
+        random = np.random.RandomState(2)
+        weights = random.random_sample(37)
+        tree = SumTree(weights)
+
+        for i in range(50):
+            items = np.unique(random.randint(0, 37, size=5))
+            weights[items] = random.random_sample(len(items)) * (random.random_sample() < 0.8)
+            tree.update(items, weights[items])
+            self.assertEqual([tree.weight(j) for j in range(37)], weights.tolist())
+
+        self.check(tree, weights)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for parameter sweeps
+"""
+
+import unittest
+
+from seeds.SEEDSError import ConfigurationError
+from seeds.utils.parsing import parse_sweep_spec
+from seeds.utils.sweep import expand_sweep
+
+
+class TestParseSweepSpec(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(parse_sweep_spec(' Kerr07Cell.toxicity = 0.1, 0.2 '),
+                         ('Kerr07Cell', 'toxicity', ['0.1', '0.2']))
+
+    def test_labeled_section(self):
+        self.assertEqual(parse_sweep_spec('Resource:glucose.inflow=1'),
+                         ('Resource:glucose', 'inflow', ['1']))
+
+    def test_int_grid(self):
+        self.assertEqual(parse_sweep_spec('Experiment.epochs=-2:4:2')[2],
+                         ['-2', '0', '2', '4'])
+
+    def test_float_grid(self):
+        self.assertEqual(parse_sweep_spec('Kerr07Cell.toxicity=0:0.5:0.25')[2],
+                         ['0.0', '0.25', '0.5'])
+
+    def test_invalid(self):
+        for s in ('toxicity=1', 'Kerr07Cell.toxicity=', 'A.b=0:1:0', 'A.b=1:0:1'):
+            self.assertRaises(ConfigurationError, parse_sweep_spec, s)
+
+
+class TestExpandSweep(unittest.TestCase):
+
+    def test_grid(self):
+        points = expand_sweep(['A.x=1,2', 'B.y=3,4,5'])
+        self.assertEqual(len(points), 6)
+        self.assertEqual(points[0], [('A', 'x', '1'), ('B', 'y', '3')])
+
+    def test_duplicate_values(self):
+        self.assertEqual(expand_sweep(['A.x=1,2,1']),
+                         [[('A', 'x', '1')], [('A', 'x', '2')]])
+
+    def test_repeated_parameter(self):
+        points = expand_sweep(['A.x=1,2', 'B.y=3', 'A.x=2,3'])
+        self.assertEqual(points, [[('A', 'x', v), ('B', 'y', '3')] for v in '123'])
+
+
+if __name__ == '__main__':
+    unittest.main()
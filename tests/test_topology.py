@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for Topology and the lattice topologies
+"""
+
+import unittest
+
+import numpy as np
+
+from seeds.Topology import Topology
+from tests.support import make_experiment, cleanup_experiment
+
+
+LATTICE_CONFIG = """
+[Experiment]
+epochs = 1
+
+[Population]
+topology = {topology}
+cell = RPSCell
+
+[{topology}]
+size = {size}
+periodic = {periodic}
+radius = {radius}
+"""
+
+
+class LatticeTestCase(unittest.TestCase):
+    """Base class for tests that need a lattice topology"""
+
+    def lattice(self, topology='MooreTopology', size=10, periodic=True, radius=1):
+        e = make_experiment(LATTICE_CONFIG.format(topology=topology, size=size,
+                                                  periodic=periodic, radius=radius))
+        self.addCleanup(cleanup_experiment, e)
+        return e.population.topology
+
+
+class TestNeighborSum(LatticeTestCase):
+
+    def check(self, topology, values):
+        expected = Topology.neighbor_sum(topology, values)
+        np.testing.assert_array_equal(topology.neighbor_sum(values), expected)
+
+    def test_large_integers(self):
+        t = self.lattice()
+        values = np.full(100, 300, dtype=np.int64)
+        np.testing.assert_array_equal(t.neighbor_sum(values), np.full(100, 2400))
+        self.check(t, values)
+
+    def test_negative_integers(self):
+        for periodic in (True, False):
+            t = self.lattice(periodic=periodic, radius=2)
+            values = np.arange(100, dtype=np.int32) - 50
+            self.check(t, values)
+            self.check(t, -np.ones(100, dtype=np.int8))
+
+    def test_booleans(self):
+        t = self.lattice(radius=3, size=12)
+        values = np.random.RandomState(0).random_sample(144) < 0.5
+        self.check(t, values)
+
+
+class TestDiffuse(LatticeTestCase):
+
+    def check(self, topology):
+        rng = np.random.RandomState(1)
+        n = topology.num_nodes()
+        values = rng.random_sample(n) * 10
+        rates = rng.random_sample(n)
+
+        expected = Topology.diffuse(topology, values, rates)
+        result = topology.diffuse(values, rates)
+        np.testing.assert_allclose(result, expected)
+        self.assertAlmostEqual(result.sum(), values.sum())
+        self.assertTrue((result >= 0).all())
+
+        # Fields stacked in rows are diffused independently
+        stacked = topology.diffuse(np.vstack((values, values[::-1])),
+                                   np.vstack((rates, rates[::-1])))
+        np.testing.assert_allclose(stacked[0], expected)
+        np.testing.assert_allclose(stacked[1], Topology.diffuse(topology, values[::-1], rates[::-1]))
+
+    def test_moore(self):
+        for periodic in (True, False):
+            for radius in (1, 2):
+                self.check(self.lattice(periodic=periodic, radius=radius))
+
+    def test_vonneumann(self):
+        for periodic in (True, False):
+            self.check(self.lattice(topology='VonNeumannTopology', periodic=periodic))
+
+
+CARTESIAN_CONFIG = """
+[Experiment]
+epochs = 1
+
+[Population]
+topology = CartesianTopology
+cell = RPSCell
+
+[CartesianTopology]
+size = {size}
+expected_neighbors = {expected_neighbors}
+periodic = {periodic}
+"""
+
+
+class TestCartesianTopology(unittest.TestCase):
+
+    def test_edges_within_radius(self):
+        """The graph connects exactly the nodes closer than the radius"""
+        for periodic in (False, True):
+            e = make_experiment(CARTESIAN_CONFIG.format(size=400, expected_neighbors=8,
+                                                        periodic=periodic))
+            self.addCleanup(cleanup_experiment, e)
+            t = e.population.topology
+            radius = t.neighbor_radius(400, 8)
+
+            nodes = sorted(t.graph.nodes())
+            coords = np.array([t.graph.node[n]['coords'] for n in nodes])
+            delta = np.abs(coords[:, np.newaxis, :] - coords[np.newaxis, :, :])
+            if periodic:
+                delta = np.minimum(delta, 1 - delta)
+            close = np.sqrt((delta**2).sum(axis=2)) < radius
+
+            expected = set((nodes[a], nodes[b]) for (a, b) in zip(*np.nonzero(np.triu(close, k=1))))
+            self.assertEqual(set(tuple(sorted(edge)) for edge in t.graph.edges()), expected)
+
+
+    def test_get_nearest_node(self):
+        e = make_experiment(CARTESIAN_CONFIG.format(size=300, expected_neighbors=6,
+                                                    periodic=False))
+        self.addCleanup(cleanup_experiment, e)
+        t = e.population.topology
+
+        nodes = t.graph.nodes()
+        coords = np.array([t.graph.node[n]['coords'] for n in nodes])
+        for point in np.random.RandomState(5).random_sample((50, 2)).tolist():
+            d = np.sqrt(((coords - point)**2).sum(axis=1))
+            expected = [nodes[i] for i in np.argsort(d)[:4]]
+            self.assertEqual(t.get_nearest_node(tuple(point), n=4), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()